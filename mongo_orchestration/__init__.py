@@ -14,23 +14,52 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
 import sys
 
 from mongo_orchestration._version import __version__
+from mongo_orchestration.connections import ClientPool
 from mongo_orchestration.servers import Servers
 from mongo_orchestration.replica_sets import ReplicaSets
 from mongo_orchestration.sharded_clusters import ShardedClusters
+from mongo_orchestration.state import StateStore
+from mongo_orchestration.trash import Trash
+from mongo_orchestration.versions import BinaryVersions
+from mongo_orchestration.warm_pool import WarmPool
+
+logger = logging.getLogger(__name__)
 
 
 def set_releases(releases=None, default_release=None):
     Servers().set_settings(releases, default_release)
     ReplicaSets().set_settings(releases, default_release)
     ShardedClusters().set_settings(releases, default_release)
+    BinaryVersions().prefetch(releases)
+
+
+def restore_storage(state_file):
+    """Journal state to state_file and re-adopt the objects recorded in it."""
+    states = StateStore().open(state_file)
+    Servers().restore(states.get(Servers._name, {}))
+    ReplicaSets().restore(states.get(ReplicaSets._name, {}))
+    ShardedClusters().restore(states.get(ShardedClusters._name, {}))
 
 
 def cleanup_storage(*args):
     """Clean up processes after SIGTERM or SIGINT is received."""
+    WarmPool().drain()
+    if StateStore().enabled:
+        # Leave processes running for the next daemon to re-adopt.
+        logger.info("Detaching from running processes, state is kept in %s",
+                    StateStore().path)
+        ShardedClusters().detach()
+        ReplicaSets().detach()
+        Servers().detach()
+        ClientPool().clear()
+        sys.exit(0)
     ShardedClusters().cleanup()
     ReplicaSets().cleanup()
     Servers().cleanup()
+    # Don't leave deleted dbpaths behind.
+    Trash().reap(throttle=False)
     sys.exit(0)
@@ -0,0 +1,337 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Admission control for requests that start processes.
+
+Every request that creates servers takes a ticket for the processes it
+starts. A ticket is admitted while the processes being started, all the
+processes managed and their memory fit in the budget. Other tickets wait
+in a queue that serves clients in turn, and are rejected when the queue is
+full or they waited too long, so that callers back off instead of timing
+out on an overloaded host.
+"""
+
+import collections
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from uuid import uuid4
+
+from mongo_orchestration.capacity import BASE_MEMORY_MB, topology_processes
+from mongo_orchestration.errors import AdmissionRejected
+from mongo_orchestration.jobs import report_phase
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+# The Ticket of the request whose processes are being started.
+_current_ticket = contextvars.ContextVar('ticket', default=None)
+
+
+def member_params(kind, params):
+    """return the list of procParams of the processes a request for a
+    kind of topology ('servers', 'replica_sets', 'sharded_clusters')
+    starts"""
+    return [proc_params
+            for _, proc_params in topology_processes(kind, params)]
+
+
+class Ticket(object):
+    """The processes a request is allowed to start."""
+
+    def __init__(self, client, processes, memory_mb, timeout=None):
+        self.id = str(uuid4())
+        self.client = client
+        # How long to wait in the queue, None for as long as it takes.
+        self.timeout = timeout
+        self.processes = processes
+        self.memory_mb = memory_mb
+        self.created = time.time()
+        self.admitted = None
+        self.released = False
+        # Servers already started, and their memory, which the budget
+        # counts as managed.
+        self.started = set()
+        self.started_memory_mb = 0
+        self._event = threading.Event()
+
+    @property
+    def remaining(self):
+        """return tuple (processes, memory) the ticket didn't start yet"""
+        return (max(0, self.processes - len(self.started)),
+                max(0, self.memory_mb - self.started_memory_mb))
+
+    def info(self):
+        return {'id': self.id, 'client': self.client,
+                'processes': self.processes, 'memory_mb': self.memory_mb,
+                'waiting': round(time.time() - self.created, 3)}
+
+
+class Admission(Singleton):
+    """Budget of processes, with a fair queue in front of it."""
+
+    # Processes being started at once, a larger request starts alone.
+    max_starting = max(4, 2 * (os.cpu_count() or 1))
+    # Processes managed, and their memory, None for no limit.
+    max_processes = None
+    max_memory_mb = None
+    # Memory of a process that doesn't set wiredTigerCacheSizeGB.
+    process_memory_mb = 1024
+    # Tickets waiting at most, and for how long a synchronous request waits.
+    max_queue = 100
+    queue_timeout = 60
+
+    _lock = threading.Lock()
+    # client -> deque of waiting tickets, clients are served in turn.
+    _queues = collections.OrderedDict()
+    _holding = set()
+    # Average time a ticket is held, for Retry-After.
+    _hold_time = 5.0
+    _admitted = 0
+    _rejected = 0
+
+    def configure(self, config):
+        """Set budgets from the 'admission' section of the config file."""
+        with self._lock:
+            for key in ('max_starting', 'max_processes', 'max_memory_mb',
+                        'process_memory_mb', 'max_queue', 'queue_timeout'):
+                if key in config:
+                    setattr(self, key, config[key])
+        self._admit_waiting()
+
+    def memory_estimate(self, proc_params, name='mongod'):
+        """return the memory in MB a process started with proc_params
+        may use"""
+        if name == 'mongos':
+            return BASE_MEMORY_MB
+        cache_gb = proc_params.get('wiredTigerCacheSizeGB')
+        if cache_gb is None:
+            return self.process_memory_mb
+        return int(float(cache_gb) * 1024) + BASE_MEMORY_MB
+
+    def enter(self, client, kind, params, timeout=None):
+        """Take a ticket for a request to create a topology.
+        Args:
+            client - who makes the request
+            kind - 'servers', 'replica_sets' or 'sharded_clusters'
+            params - parameters of the topology
+            timeout - how long the ticket may wait in the queue
+        return Ticket, admitted or queued
+        raise AdmissionRejected if the queue is full"""
+        procs = topology_processes(kind, params)
+        memory_mb = sum(self.memory_estimate(proc_params, name)
+                        for name, proc_params in procs)
+        ticket = Ticket(client, len(procs), memory_mb, timeout)
+        with self._lock:
+            if self.max_processes is not None and (
+                    ticket.processes > self.max_processes):
+                self._rejected += 1
+                raise AdmissionRejected(
+                    "Request starts %d processes, more than the %d allowed."
+                    % (ticket.processes, self.max_processes))
+            if not self._queues and self._fits(ticket):
+                self._admit(ticket)
+                return ticket
+            waiting = sum(len(queue) for queue in self._queues.values())
+            if waiting >= self.max_queue:
+                self._rejected += 1
+                raise AdmissionRejected(
+                    "Too many requests are waiting to start processes.",
+                    retry_after=self._retry_after(waiting))
+            self._queues.setdefault(client, collections.deque()).append(
+                ticket)
+        logger.info("Queued request of %s for %d processes",
+                    client, ticket.processes)
+        return ticket
+
+    def wait(self, ticket, timeout=None):
+        """Wait until ticket is admitted.
+        raise AdmissionRejected if timeout expires first"""
+        if ticket.admitted is None:
+            report_phase('queued at position %d' % self.position(ticket))
+        if not ticket._event.wait(timeout):
+            with self._lock:
+                if ticket.admitted is None:
+                    position = self.__position(ticket)
+                    self._dequeue(ticket)
+                    self._rejected += 1
+                    raise AdmissionRejected(
+                        "Waited %ss to start processes." % timeout,
+                        retry_after=self._retry_after(position))
+
+    def release(self, ticket):
+        """Give back the budget of ticket, or leave the queue."""
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.admitted is None:
+                self._dequeue(ticket)
+            else:
+                self._holding.discard(ticket)
+                held = time.time() - ticket.admitted
+                self._hold_time = 0.8 * self._hold_time + 0.2 * held
+        self._admit_waiting()
+
+    def run(self, ticket, func, *args, **kwargs):
+        """Wait for ticket, call func and release ticket.
+        A missing ticket calls func right away."""
+        if ticket is None:
+            return func(*args, **kwargs)
+        try:
+            self.wait(ticket, ticket.timeout)
+            token = _current_ticket.set(ticket)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_ticket.reset(token)
+        finally:
+            self.release(ticket)
+
+    def started(self, server_id, server):
+        """Record that the request being run created server, so that its
+        ticket stops counting it."""
+        ticket = _current_ticket.get()
+        if ticket is None:
+            return
+        memory_mb = self.memory_estimate(
+            server.cfg, 'mongos' if server.is_mongos else 'mongod')
+        with self._lock:
+            if server_id not in ticket.started:
+                ticket.started.add(server_id)
+                ticket.started_memory_mb += memory_mb
+        # Fewer processes are starting, the next ticket may fit.
+        self._admit_waiting()
+
+    def position(self, ticket):
+        """return how many tickets will be admitted before ticket"""
+        with self._lock:
+            return self.__position(ticket)
+
+    def __position(self, ticket):
+        # Called with the lock held. Clients are served in turn, so
+        # the ticket waits for as many rounds as it has tickets in front
+        # of it in its own queue, plus the turns of the clients before
+        # its own in the last round.
+        queue = self._queues.get(ticket.client)
+        if not queue or ticket not in queue:
+            return 0
+        rank = list(queue).index(ticket)
+        position = 0
+        before = True
+        for client, other in self._queues.items():
+            if client == ticket.client:
+                position += rank
+                before = False
+            else:
+                position += min(len(other), rank + int(before))
+        return position
+
+    def _managed(self):
+        """return tuple (servers managed, their memory)"""
+        # Avoid a circular import, servers report to admission.
+        from mongo_orchestration.servers import Servers
+        managed = memory = 0
+        servers = Servers()
+        for server in list(servers._storage.values()):
+            if servers.is_pooled(server):
+                continue
+            managed += 1
+            memory += self.memory_estimate(
+                server.cfg, 'mongos' if server.is_mongos else 'mongod')
+        return managed, memory
+
+    def _usage(self):
+        """return tuple (processes starting, processes managed, memory)"""
+        # What holders already started is managed, don't count it twice.
+        remaining = [ticket.remaining for ticket in self._holding]
+        starting = sum(processes for processes, _ in remaining)
+        managed, memory = self._managed()
+        memory += sum(memory_mb for _, memory_mb in remaining)
+        return starting, managed + starting, memory
+
+    def _fits(self, ticket):
+        # Called with the lock held.
+        starting, processes, memory = self._usage()
+        if starting and starting + ticket.processes > self.max_starting:
+            return False
+        if self.max_processes is not None and (
+                processes + ticket.processes > self.max_processes):
+            return False
+        # Like for max_starting, a ticket larger than the memory budget
+        # is admitted when nothing else runs.
+        if self.max_memory_mb is not None and memory and (
+                memory + ticket.memory_mb > self.max_memory_mb):
+            return False
+        return True
+
+    def _admit(self, ticket):
+        # Called with the lock held.
+        ticket.admitted = time.time()
+        self._holding.add(ticket)
+        self._admitted += 1
+        ticket._event.set()
+
+    def _dequeue(self, ticket):
+        # Called with the lock held.
+        queue = self._queues.get(ticket.client)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.client]
+
+    def _admit_waiting(self):
+        """Admit queued tickets in turn while they fit."""
+        with self._lock:
+            while self._queues:
+                client, queue = next(iter(self._queues.items()))
+                ticket = queue[0]
+                # Nobody jumps the queue, a large ticket that doesn't fit
+                # waits for the budget to free up.
+                if not self._fits(ticket):
+                    break
+                queue.popleft()
+                del self._queues[client]
+                if queue:
+                    # The client goes to the back of the line.
+                    self._queues[client] = queue
+                self._admit(ticket)
+
+    def _retry_after(self, position):
+        """return seconds after which a ticket at position may be admitted"""
+        rounds = math.ceil((position + 1) / float(max(1, self.max_starting)))
+        return max(1, int(math.ceil(rounds * self._hold_time)))
+
+    def info(self, client=None):
+        """return the state of the budget and of the queue, only the
+        tickets of client if given"""
+        with self._lock:
+            starting, processes, memory = self._usage()
+            queue = [dict(ticket.info(), position=self.__position(ticket))
+                     for tickets in self._queues.values()
+                     for ticket in tickets
+                     if client is None or ticket.client == client]
+            return {'starting': starting,
+                    'processes': processes,
+                    'memory_mb': memory,
+                    'max_starting': self.max_starting,
+                    'max_processes': self.max_processes,
+                    'max_memory_mb': self.max_memory_mb,
+                    'admitted': self._admitted,
+                    'rejected': self._rejected,
+                    'queue': sorted(queue, key=lambda t: t['position'])}
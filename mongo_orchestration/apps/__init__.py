@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import json
 import logging
 import sys
@@ -21,12 +22,18 @@ from bson import json_util
 
 from collections import namedtuple
 
-from bottle import route, response
+from bottle import request, route, response
 
 sys.path.insert(0, '..')
 
+from mongo_orchestration.admission import Admission
+from mongo_orchestration.coalescing import Coalescer
+from mongo_orchestration.apps.links import job_link
+from mongo_orchestration.capacity import Capacity
 from mongo_orchestration.compat import reraise, PY3
-from mongo_orchestration.errors import RequestError
+from mongo_orchestration.errors import AdmissionRejected, RequestError
+from mongo_orchestration.projection import parse_fields, project
+from mongo_orchestration.scheduler import Scheduler
 
 if PY3:
     unicode = str
@@ -41,7 +48,10 @@ def setup_versioned_routes(routes, version=None):
     prefix = '/' + version if version else ""
     for r in routes:
         path, method = r
-        route(prefix + path, method, routes[r])
+        handler = routes[r]
+        if method != 'GET':
+            handler = writes(handler)
+        route(prefix + path, method, handler)
 
 
 def send_result(code, result=None):
@@ -57,6 +67,86 @@ def send_result(code, result=None):
     return result
 
 
+def async_requested():
+    """Return True if the client asked for an asynchronous response."""
+    return request.query.get('async', '').lower() in ('1', 'true')
+
+
+def fast_requested():
+    """Return True if the client asked to kill processes instead of shutting
+    them down."""
+    return request.query.get('fast', '').lower() in ('1', 'true')
+
+
+def expand_requested():
+    """Return True if the client asked for the info of every resource of a
+    list."""
+    return request.query.get('expand', '').lower() in ('1', 'true')
+
+
+def fields_requested():
+    """Return the projection the client asked for with ?fields=, None for
+    every field."""
+    return parse_fields(request.query.get('fields'))
+
+
+def gather_info(containers, fields=None):
+    """Return dict {name: {id: info}} of every resource of the containers,
+    e.g. {'servers': Servers()}, with only the fields of the projection.
+
+    The info of all the resources is gathered in parallel. Resources removed
+    in the meantime are left out.
+    """
+    tasks = []
+    for name, container in containers.items():
+        for resource_id in container.listed():
+            tasks.append((name, resource_id, Scheduler().submit(
+                None, container.info, resource_id, fields)))
+    result = dict((name, {}) for name in containers)
+    for name, resource_id, task in tasks:
+        try:
+            result[name][resource_id] = project(task.result(), fields)
+        except KeyError:
+            logger.debug("%s %s went away", name, resource_id)
+    return result
+
+
+def client_id():
+    """Return who makes the request, for admission control."""
+    return request.get_header('X-Client-Id') or request.remote_addr
+
+
+def admission_ticket(kind, params):
+    """Take an admission ticket for a request that creates a topology.
+
+    Asynchronous requests wait in the queue for as long as it takes,
+    synchronous ones at most Admission.queue_timeout seconds.
+    """
+    timeout = None if async_requested() else Admission().queue_timeout
+    # Estimate with the caches the topology would get, on a copy: the
+    # warm pool matches the request body as the client sent it.
+    sized = copy.deepcopy(params)
+    Capacity().apply(kind, sized)
+    return Admission().enter(client_id(), kind, sized, timeout)
+
+
+def create_sized(kind, create, params):
+    """Return create(params) with the WiredTiger caches of the mongods of
+    the topology sized from the budget left, params stay as they are."""
+    params = copy.deepcopy(params)
+    Capacity().apply(kind, params)
+    return create(params)
+
+
+def send_job(job):
+    """Respond with 202 Accepted and the handle of a submitted Job."""
+    result = job.info()
+    result['links'] = [job_link('get-job-info', job.id),
+                       job_link('get-jobs')]
+    response.set_header('Location', '/v1/jobs/' + job.id)
+    return send_result(202, result)
+
+
 def error_wrap(f):
     def wrap(*arg, **kwd):
         f_name = f.__name__
@@ -64,6 +154,11 @@ def error_wrap(f):
             f_name=f_name, arg=arg, kwd=kwd))
         try:
             return f(*arg, **kwd)
+        except AdmissionRejected as exc:
+            logger.info("%s rejected: %s", f_name, exc)
+            if exc.retry_after is not None:
+                response.set_header('Retry-After', str(exc.retry_after))
+            return send_result(429, str(exc))
         except Exception:
             logger.exception(str(f))
             err_message = ''.join(traceback.format_exception(*sys.exc_info()))
@@ -72,6 +167,42 @@ def error_wrap(f):
     return wrap
 
 
+def coalesce(f):
+    """Share the response of a read handler between the identical GET
+    requests that arrive while it runs.
+
+    Wraps handlers that return a body from send_result, so the response is
+    serialized once for all of them.
+    """
+    def compute(*arg, **kwd):
+        body = f(*arg, **kwd)
+        return response.status_line, response.content_type, body
+
+    def wrap(*arg, **kwd):
+        if request.method != 'GET':
+            return f(*arg, **kwd)
+        key = (request.path, request.query_string)
+        status, content_type, body = Coalescer().run(
+            key, compute, *arg, **kwd)
+        response.status = status
+        response.content_type = content_type
+        return body
+
+    return wrap
+
+
+def writes(f):
+    """Make the reads that follow f see what it changed, instead of
+    joining a coalesced read that started before it finished."""
+    def wrap(*arg, **kwd):
+        try:
+            return f(*arg, **kwd)
+        finally:
+            Coalescer().wrote()
+
+    return wrap
+
+
 def get_json(req_body):
     try:
         str_body = req_body.read()
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import sys
+
+from bottle import request
+
+sys.path.insert(0, '..')
+
+from mongo_orchestration.apps import (error_wrap, Route, send_result,
+                                      setup_versioned_routes)
+from mongo_orchestration.apps.links import base_link, job_link
+from mongo_orchestration.errors import RequestError
+from mongo_orchestration.jobs import Jobs
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long a single long-poll request may block.
+MAX_WAIT = 60
+
+
+@error_wrap
+def job_list():
+    logger.debug("job_list()")
+    jobs = []
+    for job_id in Jobs():
+        job = Jobs().get(job_id)
+        if job is None:
+            continue
+        jobs.append({'id': job_id, 'kind': job.kind, 'state': job.state,
+                     'links': [job_link('get-job-info', job_id)]})
+    result = {'jobs': jobs,
+              'links': [base_link('service'),
+                        job_link('get-jobs', self_rel=True)]}
+    return send_result(200, result)
+
+
+@error_wrap
+def job_info(job_id):
+    logger.debug("job_info({job_id})".format(**locals()))
+    job = Jobs().get(job_id)
+    if job is None:
+        return send_result(404)
+    try:
+        wait = float(request.query.get('wait', 0))
+    except ValueError:
+        raise RequestError("'wait' must be a number of seconds.")
+    if wait > 0:
+        job.wait(min(wait, MAX_WAIT))
+    result = job.info()
+    result['links'] = [job_link('get-job-info', job_id, self_rel=True),
+                       job_link('get-jobs')]
+    return send_result(200, result)
+
+
+ROUTES = {
+    Route('/jobs', method='GET'): job_list,
+    Route('/jobs/<job_id>', method='GET'): job_info
+}
+
+setup_versioned_routes(ROUTES, version='v1')
+# Assume v1 if no version is specified.
+setup_versioned_routes(ROUTES)
@@ -27,6 +27,8 @@ _SERVER_LINKS = {
     'add-server-by-id': {'method': 'PUT', 'href': '{servers_href}/{server_id}'},
     'delete-server': {'method': 'DELETE', 'href': '{servers_href}/{server_id}'},
     'get-server-info': {'method': 'GET', 'href': '{servers_href}/{server_id}'},
+    'get-server-log': {'method': 'GET',
+                       'href': '{servers_href}/{server_id}/log'},
     'server-command': {'method': 'POST', 'href': '{servers_href}/{server_id}',
                        'template': {'action': "<action name>"},
                        'actions': ['start', 'stop', 'restart', 'freeze',
@@ -100,6 +102,10 @@ _SHARDED_CLUSTER_LINKS = {
         'method': 'DELETE',
         'href': '{clusters_href}/{cluster_id}/shards/{shard_id}'}
 }
+_JOB_LINKS = {
+    'get-jobs': {'method': 'GET', 'href': '{jobs_href}'},
+    'get-job-info': {'method': 'GET', 'href': '{jobs_href}/{job_id}'}
+}
 
 
 def base_link(rel, self_rel=False):
@@ -119,7 +125,8 @@ def all_base_links(rel_to=None):
         replica_set_link('add-replica-set'),
         replica_set_link('get-replica-sets'),
         sharded_cluster_link('add-sharded-cluster'),
-        sharded_cluster_link('get-sharded-clusters')
+        sharded_cluster_link('get-sharded-clusters'),
+        job_link('get-jobs')
     ]
     for link in links:
         if link['rel'] == rel_to:
@@ -140,7 +147,8 @@ def all_server_links(server_id, rel_to=None):
     """Get a list of all links to be included with Servers."""
     return [
         server_link(rel, server_id, self_rel=(rel == rel_to))
-        for rel in ('delete-server', 'get-server-info', 'server-command')
+        for rel in ('delete-server', 'get-server-info', 'server-command',
+                    'get-server-log')
     ]
 
 
@@ -191,3 +199,12 @@ def all_sharded_cluster_links(cluster_id, shard_id=None,
             'get-routers', 'add-router'
         )
     ]
+
+
+def job_link(rel, job_id=None, self_rel=False):
+    """Helper for getting a Job link document, given a rel."""
+    jobs_href = '/v1/jobs'
+    link = _JOB_LINKS[rel].copy()
+    link['href'] = link['href'].format(**locals())
+    link['rel'] = 'self' if self_rel else rel
+    return link
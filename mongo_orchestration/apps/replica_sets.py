@@ -21,20 +21,32 @@ from bottle import request, run
 
 sys.path.insert(0, '..')
 
-from mongo_orchestration.apps import (error_wrap, get_json, Route,
-                                      send_result, setup_versioned_routes)
+from mongo_orchestration.admission import Admission
+from mongo_orchestration.apps import (admission_ticket, async_requested,
+                                      coalesce, create_sized, error_wrap,
+                                      expand_requested, fast_requested,
+                                      fields_requested, gather_info,
+                                      get_json, Route, send_job, send_result,
+                                      setup_versioned_routes, writes)
 from mongo_orchestration.apps.links import (
     replica_set_link, server_link, all_replica_set_links,
     sharded_cluster_link, base_link)
 from mongo_orchestration.common import *
 from mongo_orchestration.errors import RequestError
+from mongo_orchestration.jobs import Jobs
 from mongo_orchestration.replica_sets import ReplicaSets
+from mongo_orchestration.warm_pool import WarmPool
 
 logger = logging.getLogger(__name__)
 
 
-def _rs_create(params):
-    rs_id = ReplicaSets().create(params)
+# Asynchronous requests return before the topology exists.
+@writes
+def _rs_create(params, ticket=None, rs_id=None):
+    """rs_id - claimed from the warm pool, None to create it"""
+    if rs_id is None:
+        rs_id = Admission().run(
+            ticket, create_sized, 'replica_sets', ReplicaSets().create, params)
     result = ReplicaSets().info(rs_id)
     result['links'] = all_replica_set_links(rs_id)
     # Add GET link to corresponding Server resource.
@@ -77,7 +89,13 @@ def rs_create():
     logger.debug("rs_create()")
     data = get_json(request.body)
     data = preset_merge(data, 'replica_sets')
-    result = _rs_create(data)
+    # A ready cluster of the warm pool is taken without admission.
+    rs_id = WarmPool().claim('replica_sets', data)
+    ticket = None if rs_id else admission_ticket('replica_sets', data)
+    if async_requested():
+        return send_job(
+            Jobs().submit('replica_sets', _rs_create, data, ticket, rs_id))
+    result = _rs_create(data, ticket, rs_id)
     result['links'].extend([
         base_link('service'),
         base_link('get-releases'),
@@ -89,12 +107,20 @@ def rs_create():
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def rs_list():
     logger.debug("rs_list()")
     replica_sets = []
-    for rs_id in ReplicaSets():
-        repl_info = {'id': rs_id}
+    ids = ReplicaSets().listed()
+    if expand_requested():
+        infos = gather_info({'replica_sets': ReplicaSets()},
+                            fields_requested())['replica_sets']
+        ids = [rs_id for rs_id in ids if rs_id in infos]
+    else:
+        infos = {}
+    for rs_id in ids:
+        repl_info = dict(infos.get(rs_id, {}), id=rs_id)
         repl_info['links'] = all_replica_set_links(rs_id, 'get-replica-sets')
         replica_sets.append(repl_info)
     response = {'links': [
@@ -109,6 +135,7 @@ def rs_list():
     return send_result(200, response)
 
 
+@coalesce
 @error_wrap
 def rs_info(rs_id):
     logger.debug("rs_info({rs_id})".format(**locals()))
@@ -148,7 +175,11 @@ def rs_create_by_id(rs_id):
     data = get_json(request.body)
     data = preset_merge(data, 'replica_sets')
     data['id'] = rs_id
-    result = _rs_create(data)
+    ticket = admission_ticket('replica_sets', data)
+    if async_requested():
+        return send_job(
+            Jobs().submit('replica_sets', _rs_create, data, ticket))
+    result = _rs_create(data, ticket)
     result['links'].extend([
         base_link('service'),
         base_link('get-releases'),
@@ -166,7 +197,7 @@ def rs_del(rs_id):
     logger.debug("rs_del({rs_id})".format(**locals()))
     if rs_id not in ReplicaSets():
         return send_result(404)
-    result = ReplicaSets().remove(rs_id)
+    result = ReplicaSets().remove(rs_id, fast_requested())
     return send_result(204, result)
 
 
@@ -186,6 +217,7 @@ def member_add(rs_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def members(rs_id):
     logger.debug("members({rs_id})".format(**locals()))
@@ -202,6 +234,7 @@ def members(rs_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def secondaries(rs_id):
     logger.debug("secondaries({rs_id})".format(**locals()))
@@ -219,6 +252,7 @@ def secondaries(rs_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def arbiters(rs_id):
     logger.debug("arbiters({rs_id})".format(**locals()))
@@ -235,6 +269,7 @@ def arbiters(rs_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def hidden(rs_id):
     logger.debug("hidden({rs_id})".format(**locals()))
@@ -252,6 +287,7 @@ def hidden(rs_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def passives(rs_id):
     logger.debug("passives({rs_id})".format(**locals()))
@@ -269,6 +305,7 @@ def passives(rs_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def servers(rs_id):
     logger.debug("hosts({rs_id})".format(**locals()))
@@ -285,6 +322,7 @@ def servers(rs_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def rs_member_primary(rs_id):
     logger.debug("rs_member_primary({rs_id})".format(**locals()))
@@ -297,6 +335,7 @@ def rs_member_primary(rs_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def member_info(rs_id, member_id):
     logger.debug("member_info({rs_id}, {member_id})".format(**locals()))
@@ -15,20 +15,36 @@
 # limitations under the License.
 
 import logging
+import os
 import sys
 
-from bottle import request, run
+from bottle import request, response, run
 
 sys.path.insert(0, '..')
 
-from mongo_orchestration.apps import (error_wrap, get_json, Route,
+from mongo_orchestration.admission import Admission
+from mongo_orchestration.apps import (admission_ticket, coalesce,
+                                      error_wrap, expand_requested,
+                                      fast_requested, fields_requested,
+                                      gather_info, get_json, Route,
                                       send_result, setup_versioned_routes)
 from mongo_orchestration.apps.links import (
     base_link, server_link, all_server_links, all_base_links,
-    sharded_cluster_link, replica_set_link)
+    all_replica_set_links, all_sharded_cluster_links, sharded_cluster_link,
+    replica_set_link)
+from mongo_orchestration.capacity import Capacity
+from mongo_orchestration.coalescing import Coalescer
 from mongo_orchestration.common import *
 from mongo_orchestration.errors import RequestError
+from mongo_orchestration.logs import iter_range, tail_offset
+from mongo_orchestration.orphans import Orphans
+from mongo_orchestration.placement import Placement
+from mongo_orchestration.replica_sets import ReplicaSets
+from mongo_orchestration.scheduler import Scheduler
 from mongo_orchestration.servers import Servers
+from mongo_orchestration.sharded_clusters import ShardedClusters
+from mongo_orchestration.trash import Trash
+from mongo_orchestration.warm_pool import WarmPool
 
 
 logger = logging.getLogger(__name__)
@@ -37,20 +53,22 @@ logger = logging.getLogger(__name__)
 __version__ = '0.9'
 
 
-def _host_create(params):
+def _host_create(params, ticket=None):
     host_id = params.get('id')
-    host_id = Servers().create(params['name'],
-                               params.get('procParams', {}),
-                               params.get('sslParams', {}),
-                               params.get('auth_key', ''),
-                               params.get('login', ''),
-                               params.get('password', ''),
-                               params.get('authSource', 'admin'),
-                               params.get('timeout', 300),
-                               params.get('autostart', True),
-                               host_id,
-                               params.get('version', ''),
-                               params.get('requireApiVersion', ''))
+    host_id = Admission().run(
+        ticket, Servers().create, params['name'],
+        params.get('procParams', {}),
+        params.get('sslParams', {}),
+        params.get('auth_key', ''),
+        params.get('login', ''),
+        params.get('password', ''),
+        params.get('authSource', 'admin'),
+        params.get('timeout', 300),
+        params.get('autostart', True),
+        host_id,
+        params.get('version', ''),
+        params.get('requireApiVersion', ''),
+        params.get('authBootstrap'))
     result = Servers().info(host_id)
     server_id = result['id']
     result['links'] = all_server_links(server_id)
@@ -77,11 +95,82 @@ def releases_list():
     return send_result(200, response)
 
 
+@error_wrap
+def warm_pool_info():
+    response = {
+        'pools': WarmPool().info(),
+        'links': [base_link('service')]
+    }
+    return send_result(200, response)
+
+
+@error_wrap
+def capacity_info():
+    response = Capacity().info()
+    response['links'] = [base_link('service')]
+    return send_result(200, response)
+
+
+@error_wrap
+def placement_info():
+    response = Placement().info()
+    response['links'] = [base_link('service')]
+    return send_result(200, response)
+
+
+@error_wrap
+def plan():
+    data = get_json(request.body)
+    kind = data.pop('kind', None)
+    if kind not in ('servers', 'replica_sets', 'sharded_clusters'):
+        raise RequestError('Expected body with a "kind" of "servers", '
+                           '"replica_sets" or "sharded_clusters".')
+    data = preset_merge(data, kind)
+    response = Capacity().plan(kind, data)
+    response['links'] = [base_link('service')]
+    return send_result(200, response)
+
+
+@error_wrap
+def orphans_info():
+    response = Orphans().info()
+    response['links'] = [base_link('service')]
+    return send_result(200, response)
+
+
+@error_wrap
+def scheduler_info():
+    response = Scheduler().info()
+    response['links'] = [base_link('service')]
+    return send_result(200, response)
+
+
+@error_wrap
+def admission_info():
+    response = Admission().info(request.query.get('client'))
+    response['links'] = [base_link('service')]
+    return send_result(200, response)
+
+
+@error_wrap
+def coalescing_info():
+    response = Coalescer().info()
+    response['links'] = [base_link('service')]
+    return send_result(200, response)
+
+
+@error_wrap
+def trash_info():
+    response = Trash().info()
+    response['links'] = [base_link('service')]
+    return send_result(200, response)
+
+
 @error_wrap
 def host_create():
     data = get_json(request.body)
     data = preset_merge(data, 'servers')
-    result = _host_create(data)
+    result = _host_create(data, admission_ticket('servers', data))
     result['links'].extend([
         base_link('service'),
         base_link('get-releases'),
@@ -93,12 +182,43 @@ def host_create():
     return send_result(200, result)
 
 
+@coalesce
+@error_wrap
+def overview():
+    """Info of every server, replica set and sharded cluster.
+
+    ?fields= keeps only some fields of each, like the lists with ?expand=1.
+    """
+    logger.debug("overview()")
+    infos = gather_info({'servers': Servers(),
+                         'replica_sets': ReplicaSets(),
+                         'sharded_clusters': ShardedClusters()},
+                        fields_requested())
+    response = {'links': [base_link('service')]}
+    for name, links in (('servers', all_server_links),
+                        ('replica_sets', all_replica_set_links),
+                        ('sharded_clusters', all_sharded_cluster_links)):
+        response[name] = [dict(info, id=resource_id,
+                               links=links(resource_id))
+                          for resource_id, info in sorted(infos[name].items())]
+    return send_result(200, response)
+
+
+@coalesce
 @error_wrap
 def host_list():
     logger.debug("host_list()")
     servers = []
-    for server_id in Servers():
-        server_info = {'id': server_id}
+    server_ids = Servers().listed()
+    if expand_requested():
+        infos = gather_info({'servers': Servers()},
+                            fields_requested())['servers']
+        server_ids = [server_id for server_id in server_ids
+                      if server_id in infos]
+    else:
+        infos = {}
+    for server_id in server_ids:
+        server_info = dict(infos.get(server_id, {}), id=server_id)
         server_info['links'] = all_server_links(
             server_id, rel_to='get-servers')
         servers.append(server_info)
@@ -114,6 +234,7 @@ def host_list():
     return send_result(200, response)
 
 
+@coalesce
 @error_wrap
 def host_info(host_id):
     logger.debug("host_info({host_id})".format(**locals()))
@@ -130,7 +251,7 @@ def host_create_by_id(host_id):
     data = get_json(request.body)
     data = preset_merge(data, 'servers')
     data['id'] = host_id
-    result = _host_create(data)
+    result = _host_create(data, admission_ticket('servers', data))
     result['links'].extend([
         base_link('service'),
         base_link('get-releases'),
@@ -148,7 +269,7 @@ def host_del(host_id):
     logger.debug("host_del({host_id})")
     if host_id not in Servers():
         return send_result(404)
-    Servers().remove(host_id)
+    Servers().remove(host_id, fast_requested())
     return send_result(204)
 
 
@@ -168,15 +289,75 @@ def host_command(host_id):
     return send_result(200, result)
 
 
+def _query_int(name, default=None):
+    """return the query parameter name as a non-negative integer"""
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise RequestError('%s must be an integer.' % name)
+    if value < 0:
+        raise RequestError('%s must not be negative.' % name)
+    return value
+
+
+@error_wrap
+def host_log(host_id):
+    """Stream the log of a server.
+
+    ?tail=N returns the last N lines (100 by default), ?since=offset what
+    was written after the X-Log-Offset of a previous response.
+    ?source=stdout returns what the process printed instead.
+    """
+    logger.debug("host_log({host_id})".format(**locals()))
+    if host_id not in Servers():
+        return send_result(404)
+    if request.query.get('source') == 'stdout':
+        response.content_type = 'text/plain; charset=utf-8'
+        return Servers().output(host_id)
+    try:
+        since = _query_int('since')
+        lines = _query_int('tail', 100 if since is None else None)
+    except RequestError as exc:
+        return send_result(400, str(exc))
+    logpath = Servers().logpath(host_id)
+    if not (logpath and os.path.exists(logpath)):
+        return send_result(404)
+    end = os.path.getsize(logpath)
+    start = 0
+    if since is not None and since <= end:
+        start = since
+    # A log smaller than 'since' was rotated, start over.
+    if lines is not None:
+        start = max(start, tail_offset(logpath, lines))
+    response.content_type = 'text/plain; charset=utf-8'
+    response.set_header('X-Log-Offset', str(end))
+    response.set_header('Content-Length', str(end - start))
+    return iter_range(logpath, start, end)
+
+
 ROUTES = {
     Route('/', method='GET'): base_uri,
     Route('/releases', method='GET'): releases_list,
+    Route('/warm_pool', method='GET'): warm_pool_info,
+    Route('/admission', method='GET'): admission_info,
+    Route('/capacity', method='GET'): capacity_info,
+    Route('/placement', method='GET'): placement_info,
+    Route('/plan', method='POST'): plan,
+    Route('/orphans', method='GET'): orphans_info,
+    Route('/scheduler', method='GET'): scheduler_info,
+    Route('/trash', method='GET'): trash_info,
+    Route('/coalescing', method='GET'): coalescing_info,
+    Route('/overview', method='GET'): overview,
     Route('/servers', method='POST'): host_create,
     Route('/servers', method='GET'): host_list,
     Route('/servers/<host_id>', method='GET'): host_info,
     Route('/servers/<host_id>', method='PUT'): host_create_by_id,
     Route('/servers/<host_id>', method='DELETE'): host_del,
-    Route('/servers/<host_id>', method='POST'): host_command
+    Route('/servers/<host_id>', method='POST'): host_command,
+    Route('/servers/<host_id>/log', method='GET'): host_log
 }
 
 setup_versioned_routes(ROUTES, version='v1')
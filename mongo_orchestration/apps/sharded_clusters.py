@@ -21,14 +21,21 @@ from bottle import request, run
 
 sys.path.insert(0, '..')
 
-from mongo_orchestration.apps import (error_wrap, get_json, Route,
-                                      send_result, setup_versioned_routes)
+from mongo_orchestration.admission import Admission
+from mongo_orchestration.apps import (admission_ticket, async_requested,
+                                      coalesce, create_sized, error_wrap,
+                                      expand_requested, fast_requested,
+                                      fields_requested, gather_info,
+                                      get_json, Route, send_job, send_result,
+                                      setup_versioned_routes, writes)
 from mongo_orchestration.apps.links import (
     sharded_cluster_link, all_sharded_cluster_links, base_link,
     server_link, replica_set_link)
 from mongo_orchestration.common import *
 from mongo_orchestration.errors import RequestError
+from mongo_orchestration.jobs import Jobs
 from mongo_orchestration.sharded_clusters import ShardedClusters
+from mongo_orchestration.warm_pool import WarmPool
 
 logger = logging.getLogger(__name__)
 
@@ -40,8 +47,14 @@ def _server_or_rs_link(shard_doc):
     return server_link('get-server-info', resource_id)
 
 
-def _sh_create(params):
-    cluster_id = ShardedClusters().create(params)
+# Asynchronous requests return before the topology exists.
+@writes
+def _sh_create(params, ticket=None, cluster_id=None):
+    """cluster_id - claimed from the warm pool, None to create it"""
+    if cluster_id is None:
+        cluster_id = Admission().run(
+            ticket, create_sized, 'sharded_clusters',
+            ShardedClusters().create, params)
     result = ShardedClusters().info(cluster_id)
     result['links'] = all_sharded_cluster_links(cluster_id)
     for router in result['routers']:
@@ -65,7 +78,15 @@ def sh_create():
     logger.debug("sh_create()")
     data = get_json(request.body)
     data = preset_merge(data, 'sharded_clusters')
-    result = _sh_create(data)
+    # A ready cluster of the warm pool is taken without admission.
+    cluster_id = WarmPool().claim('sharded_clusters', data)
+    ticket = (None if cluster_id
+              else admission_ticket('sharded_clusters', data))
+    if async_requested():
+        return send_job(
+            Jobs().submit('sharded_clusters', _sh_create, data, ticket,
+                          cluster_id))
+    result = _sh_create(data, ticket, cluster_id)
     result['links'].extend([
         base_link('service'),
         base_link('get-releases'),
@@ -77,12 +98,20 @@ def sh_create():
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def sh_list():
     logger.debug("sh_list()")
     sharded_clusters = []
-    for cluster_id in ShardedClusters():
-        cluster_info = {'id': cluster_id}
+    ids = ShardedClusters().listed()
+    if expand_requested():
+        infos = gather_info({'sharded_clusters': ShardedClusters()},
+                            fields_requested())['sharded_clusters']
+        ids = [cluster_id for cluster_id in ids if cluster_id in infos]
+    else:
+        infos = {}
+    for cluster_id in ids:
+        cluster_info = dict(infos.get(cluster_id, {}), id=cluster_id)
         cluster_info['links'] = all_sharded_cluster_links(
             cluster_id, rel_to='get-sharded-clusters')
         sharded_clusters.append(cluster_info)
@@ -98,6 +127,7 @@ def sh_list():
     return send_result(200, response)
 
 
+@coalesce
 @error_wrap
 def info(cluster_id):
     logger.debug("info({cluster_id})".format(**locals()))
@@ -144,7 +174,11 @@ def sh_create_by_id(cluster_id):
     data = get_json(request.body)
     data = preset_merge(data, 'sharded_clusters')
     data['id'] = cluster_id
-    result = _sh_create(data)
+    ticket = admission_ticket('sharded_clusters', data)
+    if async_requested():
+        return send_job(
+            Jobs().submit('sharded_clusters', _sh_create, data, ticket))
+    result = _sh_create(data, ticket)
     result['links'].extend([
         sharded_cluster_link('add-sharded-cluster-by-id',
                              cluster_id, self_rel=True),
@@ -163,7 +197,7 @@ def sh_del(cluster_id):
     logger.debug("sh_del({cluster_id})".format(**locals()))
     if cluster_id not in ShardedClusters():
         return send_result(404)
-    result = ShardedClusters().remove(cluster_id)
+    result = ShardedClusters().remove(cluster_id, fast_requested())
     return send_result(204, result)
 
 
@@ -187,6 +221,7 @@ def shard_add(cluster_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def shards(cluster_id):
     logger.debug("shards({cluster_id})".format(**locals()))
@@ -215,6 +250,7 @@ def shards(cluster_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def configsvrs(cluster_id):
     logger.debug("configsvrs({cluster_id})".format(**locals()))
@@ -239,6 +275,7 @@ def configsvrs(cluster_id):
     return send_result(200, result)
 
 
+@coalesce
 @error_wrap
 def routers(cluster_id):
     logger.debug("routers({cluster_id})".format(**locals()))
@@ -294,6 +331,7 @@ def router_del(cluster_id, router_id):
     return send_result(204, result)
 
 
+@coalesce
 @error_wrap
 def shard_info(cluster_id, shard_id):
     logger.debug("shard_info({cluster_id}, {shard_id})".format(**locals()))
@@ -0,0 +1,290 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Memory and CPU of the host, shared by the processes we manage.
+
+By default WiredTiger takes half of the host memory minus 1GB for its
+cache, in every mongod. The mongods we start share the host, so each gets
+a share of a budget for all of their caches instead. A share is sized for
+the mongods expected to run at once, not from what happens to be left, so
+that the first topology doesn't take the whole budget. A request whose
+mongods can't get min_cache_gb from what is left is rejected.
+"""
+
+import copy
+import logging
+import math
+import os
+import threading
+
+from mongo_orchestration.errors import AdmissionRejected
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+# Memory used by a mongod/mongos besides the WiredTiger cache.
+BASE_MEMORY_MB = 256
+# Smallest cache WiredTiger accepts.
+MIN_CACHE_GB = 0.25
+# Mongods the budget is shared by when nothing tells how many to expect.
+EXPECTED_MONGODS = 16
+
+
+def host_memory_mb():
+    """return the memory available to us in MB, the cgroup limit if
+    there is one, None if unknown"""
+    try:
+        memory = (os.sysconf('SC_PAGE_SIZE') *
+                  os.sysconf('SC_PHYS_PAGES')) // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        memory = None
+    for path in ('/sys/fs/cgroup/memory.max',
+                 '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as fd:
+                limit = int(fd.read().strip()) // (1024 * 1024)
+        except (IOError, OSError, ValueError):
+            # No such cgroup, or 'max'.
+            continue
+        if memory is None or limit < memory:
+            memory = limit
+    return memory
+
+
+def host_cpus():
+    """return the number of CPUs we may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def topology_processes(kind, params):
+    """return the list of (name, procParams) of the processes a request
+    for a kind of topology ('servers', 'replica_sets', 'sharded_clusters')
+    starts, name is 'mongod' or 'mongos'. The procParams are the ones in
+    params, added where missing."""
+    if kind == 'servers':
+        name = os.path.split(params.get('name', 'mongod'))[1].lower()
+        return [('mongos' if name.startswith('mongos') else 'mongod',
+                 params.setdefault('procParams', {}))]
+    if kind == 'replica_sets':
+        return [('mongod', member.setdefault('procParams', {}))
+                for member in params.get('members', [])]
+    if kind == 'sharded_clusters':
+        result = []
+        for shard in params.get('shards', []):
+            shard_params = shard.setdefault('shardParams', {})
+            if 'members' in shard_params:
+                result.extend(topology_processes('replica_sets', shard_params))
+            else:
+                result.append(
+                    ('mongod', shard_params.setdefault('procParams', {})))
+        configsvrs = params.setdefault('configsvrs', [{}])
+        if len(configsvrs) == 1:
+            # A config server replica set.
+            result.extend(
+                ('mongod', member.setdefault('procParams', {}))
+                for member in configsvrs[0].setdefault('members', [{}]))
+        else:
+            result.extend(('mongod', cfg) for cfg in configsvrs)
+        result.extend(('mongos', router)
+                      for router in params.setdefault('routers', [{}]))
+        return result
+    return []
+
+
+def uses_wired_tiger(proc_params):
+    return proc_params.get('storageEngine', 'wiredTiger') == 'wiredTiger'
+
+
+class Capacity(Singleton):
+    """Budget of memory for the WiredTiger caches of the mongods."""
+
+    # Size the caches of the mongods that don't set wiredTigerCacheSizeGB.
+    enabled = True
+    # Share of the host memory for all the caches.
+    cache_fraction = 0.5
+    # Bounds of the cache of a mongod, None for the WiredTiger default.
+    min_cache_gb = MIN_CACHE_GB
+    max_cache_gb = None
+    # Mongods the budget is shared by, None for the max_processes of
+    # admission, or EXPECTED_MONGODS without a limit.
+    expected_mongods = None
+    # Host memory in MB, None to detect it.
+    memory_mb = None
+
+    _lock = threading.Lock()
+
+    def configure(self, config):
+        """Set the budget from the 'capacity' section of the config file."""
+        with self._lock:
+            for key in ('enabled', 'cache_fraction', 'min_cache_gb',
+                        'max_cache_gb', 'expected_mongods', 'memory_mb'):
+                if key in config:
+                    setattr(self, key, config[key])
+
+    def host_memory_mb(self):
+        return self.memory_mb or host_memory_mb()
+
+    def budget_gb(self):
+        """return the memory for all the caches in GB, None if unknown"""
+        memory = self.host_memory_mb()
+        if memory is None:
+            return None
+        return memory * self.cache_fraction / 1024.0
+
+    def managed(self):
+        """return tuple (mongods, caches in GB, mongos) of the servers
+        we manage"""
+        # Avoid a circular import, servers size their caches here.
+        from mongo_orchestration.servers import Servers
+        mongods = mongos = 0
+        cache = 0.0
+        servers = Servers()
+        for server in list(servers._storage.values()):
+            if servers.is_pooled(server):
+                # Left out until claimed from the warm pool.
+                continue
+            if server.is_mongos:
+                mongos += 1
+                continue
+            mongods += 1
+            cache += float(server.cfg.get('wiredTigerCacheSizeGB') or 0)
+        return mongods, cache, mongos
+
+    def expected(self):
+        """return the number of mongods the budget is shared by"""
+        if self.expected_mongods:
+            return self.expected_mongods
+        # Avoid a circular import, admission estimates memory with us.
+        from mongo_orchestration.admission import Admission
+        return Admission().max_processes or EXPECTED_MONGODS
+
+    def cache_size_gb(self, mongods=1):
+        """return the cache of each of mongods new mongods, in GB: a share
+        of the budget for the expected mongods, at most what the managed
+        mongods left of it, at least min_cache_gb
+        raise AdmissionRejected if what is left can't give min_cache_gb
+        to each"""
+        budget = self.budget_gb()
+        if budget is None:
+            return None
+        managed, cache, _ = self.managed()
+        # The caches of running mongods are fixed, only the rest is shared.
+        remaining = max(0.0, budget - cache)
+        share = min(remaining / mongods,
+                    budget / max(self.expected(), managed + mongods))
+        upper = self.max_cache_gb
+        if upper is None:
+            # The WiredTiger default.
+            upper = max(MIN_CACHE_GB, (self.host_memory_mb() / 1024.0 - 1) / 2)
+        size = min(share, upper)
+        # Two decimals are enough, round down to stay in the budget.
+        size = math.floor(size * 100) / 100.0
+        if size >= self.min_cache_gb:
+            return size
+        if remaining + 0.005 < self.min_cache_gb * mongods:
+            raise AdmissionRejected(
+                "%d mongods need %sGB of cache, %.2fGB of the budget is left."
+                % (mongods, self.min_cache_gb * mongods, remaining))
+        return self.min_cache_gb
+
+    def size_cache(self, proc_params, mongods=1, size=None):
+        """Set wiredTigerCacheSizeGB in the procParams of a mongod that
+        doesn't set it.
+        return the cache size in GB, None if left to mongod"""
+        if 'wiredTigerCacheSizeGB' in proc_params:
+            return proc_params['wiredTigerCacheSizeGB']
+        if not self.enabled or not uses_wired_tiger(proc_params):
+            return None
+        if size is None:
+            size = self.cache_size_gb(mongods)
+        if size is not None:
+            proc_params['wiredTigerCacheSizeGB'] = size
+        return size
+
+    def apply(self, kind, params, size=None):
+        """Size the caches of the mongods of a topology, all of them
+        equally, size GB each or their share of the budget if None.
+        return list of (name, procParams, cache size in GB)
+        raise AdmissionRejected if the budget is spent"""
+        processes = topology_processes(kind, params)
+        sized = [p for name, p in processes
+                 if name == 'mongod' and uses_wired_tiger(p) and
+                 'wiredTigerCacheSizeGB' not in p]
+        if size is None and sized:
+            size = self.cache_size_gb(len(sized))
+        return [(name, p, self.size_cache(p, size=size)
+                 if name == 'mongod' else None)
+                for name, p in processes]
+
+    def plan(self, kind, params):
+        """return the resources a topology would take, without
+        starting anything"""
+        try:
+            processes = self.apply(kind, copy.deepcopy(params))
+            rejected = False
+        except AdmissionRejected:
+            # What the topology would take with the smallest caches.
+            processes = self.apply(kind, copy.deepcopy(params),
+                                   size=self.min_cache_gb)
+            rejected = True
+        memory = self.host_memory_mb()
+        budget = self.budget_gb()
+        managed, managed_cache, managed_mongos = self.managed()
+        cache = sum(float(size or 0) for _, _, size in processes)
+        # Memory of processes that leave their cache to mongod.
+        unknown = [name for name, _, size in processes
+                   if name == 'mongod' and size is None]
+        memory_mb = int(cache * 1024) + BASE_MEMORY_MB * len(processes)
+        cpus = host_cpus()
+        total = managed + managed_mongos + len(processes)
+        return {
+            'processes': [{'name': name, 'wiredTigerCacheSizeGB': size}
+                          for name, _, size in processes],
+            'mongod': sum(1 for name, _, _ in processes if name == 'mongod'),
+            'mongos': sum(1 for name, _, _ in processes if name == 'mongos'),
+            'cache_gb': round(cache, 2),
+            'memory_mb': memory_mb,
+            'unsized': len(unknown),
+            'host': {'memory_mb': memory, 'cpus': cpus},
+            'managed': {'mongod': managed, 'mongos': managed_mongos,
+                        'cache_gb': round(managed_cache, 2)},
+            'budget': {
+                'cache_gb': None if budget is None else round(budget, 2),
+                'cache_gb_after': round(managed_cache + cache, 2),
+                'fits': (budget is None or not (unknown or rejected) and
+                         managed_cache + cache <= budget + 0.01)},
+            'processes_per_cpu': round(total / float(cpus), 2),
+        }
+
+    def info(self):
+        budget = self.budget_gb()
+        if budget is not None:
+            budget = round(budget, 2)
+        managed, cache, mongos = self.managed()
+        try:
+            next_cache = self.cache_size_gb() if self.enabled else None
+        except AdmissionRejected:
+            # The budget is spent.
+            next_cache = 0.0
+        return {'enabled': self.enabled,
+                'host': {'memory_mb': self.host_memory_mb(),
+                         'cpus': host_cpus()},
+                'budget_cache_gb': budget,
+                'managed': {'mongod': managed, 'mongos': mongos,
+                            'cache_gb': round(cache, 2)},
+                'expected_mongods': self.expected(),
+                'next_cache_gb': next_cache}
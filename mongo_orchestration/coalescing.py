@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Coalescing of identical requests that arrive at the same time.
+
+The first request for a key computes the result, the ones that arrive
+while it runs wait for it and share its result instead of computing it
+again. Nothing is kept once the computation is over, the next request
+computes a fresh result.
+
+A request only joins a computation that started after the last write
+finished, so that a client that reads after its own write sees it. Writes
+bump a generation that is part of the key of the computations.
+"""
+
+import logging
+import threading
+
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class Flight(object):
+    """A computation in progress and the requests waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer(Singleton):
+    """Computations in progress, by key."""
+
+    _lock = threading.Lock()
+    # (generation, key) -> Flight
+    _flights = {}
+    _generation = 0
+    _stats = {'requests': 0, 'computed': 0, 'merged': 0, 'failed': 0}
+
+    def wrote(self):
+        """Record a finished write, computations in progress may not have
+        seen it."""
+        with self._lock:
+            self._generation += 1
+
+    def run(self, key, func, *args, **kwargs):
+        """return func(*args, **kwargs), or the result of the call with
+        the same key that started after the last write"""
+        with self._lock:
+            self._stats['requests'] += 1
+            key = (self._generation, key)
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+            else:
+                self._stats['merged'] += 1
+        if not leader:
+            logger.debug("Waiting for %r in progress", key)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = func(*args, **kwargs)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                self._stats['computed'] += 1
+                self._stats['failed'] += int(flight.error is not None)
+            flight.done.set()
+        return flight.result
+
+    def info(self):
+        with self._lock:
+            info = dict(self._stats)
+            info['in_flight'] = len(self._flights)
+            info['generation'] = self._generation
+        requests = info['requests']
+        info['merge_ratio'] = (round(info['merged'] / float(requests), 3)
+                               if requests else 0.0)
+        return info
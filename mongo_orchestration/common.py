@@ -14,8 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import collections
+import collections.abc
 import copy
+import ipaddress
 import json
 import os
 import ssl
@@ -25,6 +26,13 @@ import tempfile
 WORK_DIR = os.environ.get('MONGO_ORCHESTRATION_HOME', os.getcwd())
 PID_FILE = os.path.join(WORK_DIR, 'server.pid')
 LOG_FILE = os.path.join(WORK_DIR, 'server.log')
+# Rotate LOG_FILE when it reaches LOG_MAX_BYTES, keep LOG_BACKUP_COUNT files.
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+VERSIONS_FILE = os.path.join(WORK_DIR, 'versions.json')
+STATE_FILE = os.path.join(WORK_DIR, 'state.jsonl')
+PIDS_FILE = os.path.join(WORK_DIR, 'pids.json')
+TEMPLATES_DIR = os.path.join(WORK_DIR, 'templates')
 TMP_DIR = os.environ.get('MONGO_ORCHESTRATION_TMP')
 
 LOGGING_FORMAT = '%(asctime)s [%(levelname)s] %(name)s:%(lineno)d - %(message)s'
@@ -64,6 +72,29 @@ class BaseModel(object):
         {'role': 'backup', 'db': 'admin'}
     ]
     socket_timeout = DEFAULT_SOCKET_TIMEOUT
+    # Start processes with auth right away and create the first user through
+    # the localhost exception, instead of restarting every process with auth.
+    auth_bootstrap = False
+    # Attributes saved by to_state() and restored by from_state().
+    _state_attrs = ()
+
+    def to_state(self):
+        """Return a JSON-serializable snapshot for the state journal."""
+        return dict((attr, getattr(self, attr, None))
+                    for attr in self._state_attrs)
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild an object from to_state() without starting processes."""
+        obj = cls.__new__(cls)
+        for attr in cls._state_attrs:
+            setattr(obj, attr, state.get(attr))
+        obj._restore_state()
+        return obj
+
+    def _restore_state(self):
+        """Recreate attributes that are not part of the saved state."""
+        pass
 
     @property
     def key_file(self):
@@ -75,6 +106,19 @@ class BaseModel(object):
             os.chmod(key_file_path, stat.S_IRUSR)
             return key_file_path
 
+    def _auth_bootstrap_enabled(self, requested=None):
+        """Can the users of this object be created through the localhost
+        exception?
+        Args:
+            requested - 'authBootstrap' from the request, None for the default
+        """
+        if requested is None:
+            requested = BaseModel.auth_bootstrap
+        # With MONGODB-X509 as the only mechanism the login user is created
+        # by the x509 user, the localhost exception only allows the first one.
+        return bool(requested and (self.login or self.auth_key) and
+                    not self.x509_extra_user and is_localhost(DEFAULT_BIND))
+
     def _strip_auth(self, proc_params):
         """Remove options from parameters that cause auth to be enabled."""
         params = proc_params.copy()
@@ -125,6 +169,23 @@ def create_user(db, mongo_version, user, password, roles):
                writeConcern=db.write_concern.document)
 
 
+def only_x509(proc_params):
+    """Is MONGODB-X509 the only authentication mechanism in proc_params?"""
+    set_params = proc_params.get('setParameter', {})
+    auth_mechs = set_params.get('authenticationMechanisms', '').split(',')
+    return len(auth_mechs) == 1 and auth_mechs[0] == 'MONGODB-X509'
+
+
+def is_localhost(host):
+    """Do connections to host come from the localhost interface?"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
 def connected(client):
     # Await connection in PyMongo.
     client.admin.command('isMaster')
@@ -133,7 +194,7 @@ def connected(client):
 
 def update(d, u):
     for k, v in u.items():
-        if isinstance(v, collections.Mapping):
+        if isinstance(v, collections.abc.Mapping):
             r = update(d.get(k, {}), v)
             d[k] = r
         else:
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+import threading
+import time
+
+from pymongo.errors import PyMongoError
+from pymongo.server_api import ServerApi
+
+from mongo_orchestration.common import connected
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+def split_hosts(servers):
+    """Return the list of 'host:port' strings in a seed list or URI."""
+    if servers.startswith('mongodb://'):
+        servers = servers[len('mongodb://'):]
+        servers = servers.split('/', 1)[0]
+        servers = servers.rsplit('@', 1)[-1]
+    return [host.lower() for host in servers.split(',') if host]
+
+
+def client_key(servers, kwargs):
+    """Build a hashable cache key for a MongoClient.
+
+    The key covers the target hosts and every option passed to the
+    client, so that a change of auth mode, API version or read preference
+    yields a different client. It is a digest, so that passwords don't
+    stay around in the keys of the pool.
+    """
+    items = []
+    for name, value in sorted(kwargs.items()):
+        if isinstance(value, ServerApi):
+            value = ('ServerApi', value.version,
+                     value.strict, value.deprecation_errors)
+        elif hasattr(value, 'document'):
+            # Read preferences and write concerns.
+            value = repr(value.document)
+        elif isinstance(value, (dict, list)):
+            value = repr(value)
+        items.append((name, value))
+    return hashlib.sha256(
+        repr((servers, tuple(items))).encode('utf-8')).hexdigest()
+
+
+class ClientPool(Singleton):
+    """ClientPool caches MongoClients for Server, ReplicaSet and
+    ShardedCluster so that one client is reused per target.
+
+    Cached clients are health checked with 'isMaster' when handed out, at
+    most every check_interval seconds, and closed whenever one of their
+    hosts is stopped, restarted or removed.
+    """
+    # How long a client that passed its health check is handed out without
+    # another one, in seconds.
+    check_interval = 5.0
+
+    _clients = {}
+    _hosts = {}
+    # key -> time of the last health check
+    _checked = {}
+    _lock = threading.Lock()
+
+    def get(self, servers, kwargs, factory):
+        """Return a live client for the given target and options.
+
+        Args:
+            servers - seed list or URI the client connects to
+            kwargs - options the client is created with, used as cache key
+            factory - callable creating and verifying a new client
+
+        A cached client that fails its health check is replaced by a new
+        one. Raises PyMongoError if the factory cannot create it.
+        """
+        key = client_key(servers, kwargs)
+        with self._lock:
+            client = self._clients.get(key)
+            checked = self._checked.get(key, 0)
+        if client is not None:
+            if time.time() - checked < self.check_interval:
+                return client
+            try:
+                connected(client)
+            except PyMongoError:
+                logger.debug("Replacing unhealthy client for %s", servers)
+                self._discard(key, client)
+            else:
+                with self._lock:
+                    if self._clients.get(key) is client:
+                        self._checked[key] = time.time()
+                return client
+        client = factory()
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is None:
+                self._clients[key] = client
+                self._hosts[key] = set(split_hosts(servers))
+                self._checked[key] = time.time()
+                return client
+        # Another thread created the same client concurrently.
+        client.close()
+        return existing
+
+    def _discard(self, key, client):
+        with self._lock:
+            if self._clients.get(key) is client:
+                self._clients.pop(key)
+                self._hosts.pop(key, None)
+                self._checked.pop(key, None)
+        client.close()
+
+    def invalidate(self, *hosts):
+        """Close and forget every client connected to one of 'hosts'."""
+        hosts = set(host.lower() for host in hosts if host)
+        if not hosts:
+            return
+        with self._lock:
+            keys = [key for key, key_hosts in self._hosts.items()
+                    if key_hosts & hosts]
+            clients = [self._clients.pop(key) for key in keys]
+            for key in keys:
+                self._hosts.pop(key)
+                self._checked.pop(key, None)
+        for client in clients:
+            client.close()
+
+    def clear(self):
+        """Close all cached clients."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._hosts.clear()
+            self._checked.clear()
+        for client in clients:
+            client.close()
+
+    def __len__(self):
+        return len(self._clients)
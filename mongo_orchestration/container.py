@@ -15,8 +15,10 @@
 # limitations under the License.
 
 import logging
+import threading
 
 from mongo_orchestration.errors import MongoOrchestrationError
+from mongo_orchestration.state import StateStore
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +28,20 @@ class Container(object):
     _storage = {}
     _name = 'container'
     _obj_type = object
+    # Attributes of the stored objects to look them up by, see find().
+    _indexed_attrs = ()
+    _index_lock = threading.RLock()
+    # attribute -> {value: set of keys}
+    _indexes = None
+    # key -> (id of the object, tuple of the values of _indexed_attrs)
+    # when last indexed
+    _records = None
+    # id of a stored object -> key
+    _keys = None
+    # Process groups of the clusters the warm pool keeps ready, shared by
+    # every container. Their servers and shards are not listed nor counted
+    # in the budgets until somebody claims the cluster.
+    _pooled_groups = set()
 
     def set_settings(self, releases=None, default_release=None):
         """set path to storage"""
@@ -33,6 +49,7 @@ class Container(object):
                 getattr(self, 'releases', {}) != releases or
                 getattr(self, 'default_release', '') != default_release):
             self._storage = {}
+            self._reset_indexes()
             self.releases = releases or {}
             self.default_release = default_release
 
@@ -56,12 +73,19 @@ class Container(object):
     def __setitem__(self, key, value):
         if isinstance(value, self._obj_type):
             self._storage[key] = value
+            self.reindex(key)
+            self.save_state(key)
         else:
             raise ValueError("Can only store objects of type %s, not %s"
                              % (self._obj_type, type(value)))
 
     def __delitem__(self, key):
-        return self._storage.pop(key)
+        value = self._storage.pop(key)
+        self.__unindex(key)
+        store = StateStore()
+        if store.enabled:
+            store.delete(self._name, key)
+        return value
 
     def __del__(self):
         self.cleanup()
@@ -85,6 +109,108 @@ class Container(object):
 
     def cleanup(self):
         self._storage.clear()
+        self._reset_indexes()
+
+    def set_pooled(self, group, pooled=True):
+        """Hide the objects of process group while the warm pool owns
+        them, or show them again."""
+        if pooled:
+            self._pooled_groups.add(group)
+        else:
+            self._pooled_groups.discard(group)
+
+    def is_pooled(self, obj):
+        """return True if obj belongs to a cluster of the warm pool"""
+        return getattr(obj, 'process_group', None) in self._pooled_groups
+
+    def listed(self):
+        """return the keys of the objects to show, not those of the
+        clusters waiting in the warm pool"""
+        return [key for key, obj in list(self._storage.items())
+                if not self.is_pooled(obj)]
+
+    def save_state(self, key):
+        """Record the object stored under key in the state journal."""
+        store = StateStore()
+        if store.enabled and key in self._storage:
+            store.save(self._name, key, self._storage[key].to_state())
+
+    def restore(self, states):
+        """Re-adopt objects from the state journal ({key: state})."""
+        for key, state in states.items():
+            logger.info("Restoring %s %s", self._name, key)
+            self._storage[key] = self._obj_type.from_state(state)
+            self.reindex(key)
+
+    def detach(self):
+        """Forget all objects, leaving their processes running."""
+        self._storage.clear()
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        with self._index_lock:
+            self._indexes = dict((attr, {}) for attr in self._indexed_attrs)
+            self._records = {}
+            self._keys = {}
+
+    def reindex(self, key):
+        """Update the indexes of the object stored under key, after it was
+        stored or its indexed attributes changed."""
+        if not self._indexed_attrs:
+            return
+        with self._index_lock:
+            if self._indexes is None:
+                self._reset_indexes()
+            self.__unindex(key)
+            obj = self._storage.get(key)
+            if obj is None:
+                return
+            values = tuple(getattr(obj, attr, None)
+                           for attr in self._indexed_attrs)
+            for attr, value in zip(self._indexed_attrs, values):
+                if value is not None:
+                    self._indexes[attr].setdefault(value, set()).add(key)
+            self._records[key] = (id(obj), values)
+            self._keys[id(obj)] = key
+
+    def __unindex(self, key):
+        with self._index_lock:
+            if not self._records:
+                return
+            record = self._records.pop(key, None)
+            if record is None:
+                return
+            obj_id, values = record
+            for attr, value in zip(self._indexed_attrs, values):
+                keys = self._indexes[attr].get(value)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._indexes[attr][value]
+            if self._keys.get(obj_id) == key:
+                del self._keys[obj_id]
+
+    def find(self, attr, value):
+        """return the set of keys of the objects whose attribute attr,
+        one of _indexed_attrs, equals value"""
+        with self._index_lock:
+            if self._indexes is None:
+                return set()
+            return set(self._indexes[attr].get(value, ()))
+
+    def find_one(self, attr, value):
+        """return the key of an object whose attribute attr equals value,
+        None if there's none"""
+        keys = self.find(attr, value)
+        return min(keys) if keys else None
+
+    def key_of(self, obj):
+        """return the key obj is stored under, None if it isn't"""
+        with self._index_lock:
+            key = (self._keys or {}).get(id(obj))
+        if key is not None and self._storage.get(key) is obj:
+            return key
+        return None
 
     def create(self):
         raise NotImplementedError("Please Implement this method")
@@ -27,6 +27,22 @@ class ServersError(MongoOrchestrationError):
     """Base class for all Server exceptions."""
 
 
+class StartupError(ServersError):
+    """Raised when a mongod or mongos process fails to start."""
+
+    def __init__(self, error, address_in_use=False):
+        self.address_in_use = address_in_use
+        ServersError.__init__(self, error)
+
+
+class AdmissionRejected(MongoOrchestrationError):
+    """Raised when a request can't start processes now."""
+
+    def __init__(self, error, retry_after=None):
+        self.retry_after = retry_after
+        MongoOrchestrationError.__init__(self, error)
+
+
 class ReplicaSetError(MongoOrchestrationError):
     """Base class for all ReplicaSet exceptions."""
 
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextvars
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from collections import OrderedDict
+from uuid import uuid4
+
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+# The Job being run, Scheduler tasks see the one of the thread that
+# submitted them.
+_current_job = contextvars.ContextVar('job', default=None)
+
+
+def current_job():
+    """Return the Job running in this thread, if any."""
+    return _current_job.get()
+
+
+def report_phase(phase):
+    """Record that the job running in this thread has reached 'phase'.
+
+    Does nothing when called outside of a job, so cluster code may report
+    progress unconditionally.
+    """
+    job = current_job()
+    if job is not None:
+        job.report_phase(phase)
+
+
+class Job(object):
+    """Creation of a cluster running in a background thread."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, kind, func, args=(), kwargs=None):
+        self.id = str(uuid4())
+        self.kind = kind
+        self.state = self.PENDING
+        self.phases = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs or {}
+        self._done = threading.Event()
+
+    def report_phase(self, phase):
+        logger.debug("job %s: %s", self.id, phase)
+        self.phases.append(
+            {'phase': phase, 'elapsed': round(time.time() - self.created, 3)})
+
+    def run(self):
+        token = _current_job.set(self)
+        self.state = self.RUNNING
+        try:
+            self.result = self._func(*self._args, **self._kwargs)
+            self.state = self.DONE
+        except Exception:
+            logger.exception("job %s failed", self.id)
+            self.error = ''.join(
+                traceback.format_exception(*sys.exc_info()))
+            self.state = self.FAILED
+        finally:
+            _current_job.reset(token)
+            self.finished = time.time()
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait up to 'timeout' seconds for the job to finish.
+        return True if the job is finished"""
+        return self._done.wait(timeout)
+
+    def info(self):
+        info = {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'phases': list(self.phases),
+            'created': self.created,
+            'finished': self.finished
+        }
+        if self.state == self.DONE:
+            info['result'] = self.result
+        elif self.state == self.FAILED:
+            info['error'] = self.error
+        return info
+
+
+class Jobs(Singleton):
+    """Registry of asynchronous jobs."""
+
+    _jobs = OrderedDict()
+    _lock = threading.Lock()
+    # How many finished jobs to remember.
+    max_finished = 100
+
+    def submit(self, kind, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a new thread.
+        return the Job tracking it"""
+        job = Job(kind, func, args, kwargs)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        thread = threading.Thread(target=job.run, name='job-' + job.id)
+        thread.daemon = True
+        thread.start()
+        return job
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._jobs))
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def clear(self):
+        with self._lock:
+            self._jobs.clear()
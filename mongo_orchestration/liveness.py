@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Track which processes are alive from a background thread.
+
+The thread sleeps until a watched process exits, through a pidfd where the
+platform has them, and collects its exit code. Request handlers read
+liveness from a table instead of polling every process. Where select.poll
+is missing (Windows), the thread polls the processes every interval.
+"""
+
+import logging
+import os
+import select
+import threading
+
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+def pidfd_open(pid):
+    """return a file descriptor that becomes readable when pid exits,
+    None if the platform doesn't have them"""
+    if not hasattr(os, 'pidfd_open') or not hasattr(select, 'poll'):
+        return None
+    try:
+        return os.pidfd_open(pid)
+    except OSError:
+        # ENOSYS on old kernels, ESRCH if the process is already gone.
+        return None
+
+
+class ProcessWatcher(Singleton):
+    """Table of the live processes, kept up to date by a thread."""
+
+    _lock = threading.Lock()
+    _thread = None
+    _wakeup_fds = None
+    _wakeup_event = None
+    # pid -> (Popen-like object, pidfd or None)
+    _watched = {}
+    _exited = 0
+    # How often to poll processes that have no pidfd.
+    interval = 0.5
+    # Sleep in select.poll, on pidfds and a wakeup pipe. Without it the
+    # thread wakes up every interval.
+    use_poll = hasattr(select, 'poll')
+
+    def watch(self, proc):
+        """Track proc until it exits."""
+        if proc is None:
+            return
+        pidfd = pidfd_open(proc.pid) if self.use_poll else None
+        with self._lock:
+            old = self._watched.get(proc.pid)
+            self._watched[proc.pid] = (proc, pidfd)
+            if self._thread is None:
+                self._start()
+        if old is not None and old[1] is not None:
+            os.close(old[1])
+        self._wake()
+
+    def alive(self, proc):
+        """return True if proc is running, False if it exited,
+        None if proc isn't watched"""
+        if proc.returncode is not None:
+            # Someone waited for it before the thread noticed.
+            return False
+        with self._lock:
+            entry = self._watched.get(proc.pid)
+        if entry is not None and entry[0] is proc:
+            return True
+        return None
+
+    def pids(self):
+        """return the pids of the live processes"""
+        with self._lock:
+            return list(self._watched)
+
+    def info(self):
+        with self._lock:
+            return {'watched': len(self._watched),
+                    'exited': self._exited,
+                    'pidfd': any(pidfd is not None
+                                 for _, pidfd in self._watched.values())}
+
+    def _start(self):
+        # Called with the lock held.
+        if self.use_poll:
+            read_fd, write_fd = os.pipe()
+            os.set_blocking(read_fd, False)
+            self._wakeup_fds = (read_fd, write_fd)
+            target = self._run
+        else:
+            self._wakeup_event = threading.Event()
+            target = self._run_polling
+        self._thread = threading.Thread(target=target,
+                                        name='process-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _wake(self):
+        if self._wakeup_fds is None:
+            self._wakeup_event.set()
+            return
+        try:
+            os.write(self._wakeup_fds[1], b'x')
+        except OSError:
+            pass
+
+    def _forget(self, pid, proc):
+        with self._lock:
+            entry = self._watched.get(pid)
+            if entry is None or entry[0] is not proc:
+                return
+            del self._watched[pid]
+            self._exited += 1
+        if entry[1] is not None:
+            os.close(entry[1])
+        logger.debug("process %d exited with code %r", pid, proc.returncode)
+
+    def _collect(self, pid, proc):
+        """Forget proc if it exited.
+        return its exit code, None if it's still running"""
+        try:
+            returncode = proc.poll()
+        except OSError:
+            returncode = -1
+        if returncode is not None:
+            self._forget(pid, proc)
+        return returncode
+
+    def _run_polling(self):
+        while True:
+            self._wakeup_event.wait(self.interval)
+            self._wakeup_event.clear()
+            with self._lock:
+                entries = list(self._watched.items())
+            for pid, (proc, _) in entries:
+                self._collect(pid, proc)
+
+    def _run(self):
+        # Processes whose pidfd fired but whose exit code someone else is
+        # collecting right now.
+        retry = set()
+        while True:
+            with self._lock:
+                entries = list(self._watched.items())
+            poller = select.poll()
+            poller.register(self._wakeup_fds[0], select.POLLIN)
+            pidfds = {}
+            timeout = None
+            for pid, (proc, pidfd) in entries:
+                if pidfd is None or pid in retry:
+                    timeout = self.interval
+                else:
+                    poller.register(pidfd, select.POLLIN)
+                    pidfds[pidfd] = pid
+            try:
+                events = poller.poll(
+                    None if timeout is None else timeout * 1000)
+            except InterruptedError:
+                continue
+            try:
+                while os.read(self._wakeup_fds[0], 4096):
+                    pass
+            except BlockingIOError:
+                pass
+            exited = set(pidfds[fd] for fd, _ in events if fd in pidfds)
+            for pid, (proc, pidfd) in entries:
+                if pidfd is not None and pid not in exited | retry:
+                    continue
+                if self._collect(pid, proc) is None:
+                    if pid in exited:
+                        # Popen.wait() holds the exit code lock.
+                        retry.add(pid)
+                    continue
+                retry.discard(pid)
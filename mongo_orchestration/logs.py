@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Bounded access to the logs of mongod/mongos processes."""
+
+import collections
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Lines of a server log copied into the orchestration log on failure.
+FAILURE_TAIL_LINES = 100
+# Never read more than this many bytes from the end of a log for a tail.
+MAX_TAIL_BYTES = 1024 * 1024
+# Lines of stdout/stderr kept for every process.
+OUTPUT_LINES = 200
+# Size of the blocks read from a log.
+BLOCK_SIZE = 64 * 1024
+
+
+def tail_offset(path, lines, max_bytes=MAX_TAIL_BYTES):
+    """return the offset where the last 'lines' lines of path start,
+    reading at most max_bytes backwards from the end"""
+    with open(path, 'rb') as fd:
+        fd.seek(0, os.SEEK_END)
+        end = fd.tell()
+        if lines <= 0:
+            return end
+        position = end
+        newlines = 0
+        while position > 0 and end - position < max_bytes:
+            size = min(BLOCK_SIZE, position, max_bytes - (end - position))
+            position -= size
+            fd.seek(position)
+            block = fd.read(size)
+            # A trailing newline ends the last line, it doesn't start one.
+            if position + size == end and block.endswith(b'\n'):
+                block = block[:-1]
+            count = block.count(b'\n')
+            if newlines + count >= lines:
+                index = len(block)
+                for _ in range(lines - newlines):
+                    index = block.rindex(b'\n', 0, index)
+                return position + index + 1
+            newlines += count
+        return position
+
+
+def tail(path, lines=FAILURE_TAIL_LINES, max_bytes=MAX_TAIL_BYTES):
+    """return the last 'lines' lines of path as a string"""
+    offset = tail_offset(path, lines, max_bytes)
+    with open(path, 'rb') as fd:
+        fd.seek(offset)
+        return fd.read(max_bytes).decode('utf-8', 'replace')
+
+
+def iter_range(path, start, end):
+    """Yield the bytes of path between offsets start and end in blocks."""
+    with open(path, 'rb') as fd:
+        fd.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = fd.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+class OutputBuffer(object):
+    """Keep the last lines a process writes to its stdout and stderr."""
+
+    def __init__(self, stream, maxlen=OUTPUT_LINES):
+        self._lines = collections.deque(maxlen=maxlen)
+        self._thread = threading.Thread(
+            target=self._read, args=(stream,), name='output-buffer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read(self, stream):
+        try:
+            for line in iter(stream.readline, b''):
+                self._lines.append(line.decode('utf-8', 'replace'))
+        except (OSError, ValueError):
+            pass
+        finally:
+            stream.close()
+
+    def wait(self, timeout=None):
+        """Wait until the process closed its output."""
+        self._thread.join(timeout)
+
+    def text(self):
+        return ''.join(list(self._lines))
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Terminate the processes a previous run left behind when it crashed."""
+
+import logging
+import os
+import signal
+import threading
+import time
+
+from mongo_orchestration import process
+from mongo_orchestration.liveness import ProcessWatcher
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+def is_orphan(pid, config_path):
+    """Is pid still running mongod/mongos with an options file of ours?
+
+    Only processes whose command line can be read are considered, so that
+    a pid reused by an unrelated process is never killed.
+    """
+    if not config_path or not os.path.basename(config_path).startswith(
+            process.CONFIG_PREFIX):
+        return False
+    cmdline = process.proc_cmdline(pid)
+    return cmdline is not None and config_path in cmdline
+
+
+class Orphans(Singleton):
+    """Sweep of the processes recorded in the pid registry by a previous
+    run that no Server re-adopted."""
+
+    _lock = threading.Lock()
+    # How long orphans get to shut down after SIGTERM before SIGKILL.
+    timeout = 10
+    _report = {}
+
+    def reap(self, recorded):
+        """Terminate orphans and reclaim their dbpaths and ports.
+        Args:
+            recorded - dict {pid: options file}, see PidRegistry.open
+        return a report of what was reclaimed"""
+        # Processes re-adopted from the state journal are watched.
+        adopted = set(ProcessWatcher().pids())
+        orphans = dict((pid, config_path)
+                       for pid, config_path in recorded.items()
+                       if pid not in adopted and is_orphan(pid, config_path))
+        configs = {}
+        for pid, config_path in orphans.items():
+            try:
+                configs[pid] = process.read_config(config_path)
+            except (IOError, OSError):
+                configs[pid] = {}
+            logger.info("Terminating orphaned process %d (%s)",
+                        pid, config_path)
+            self._signal(pid, signal.SIGTERM)
+        # All orphans shut down in parallel.
+        killed = self._wait(orphans)
+        for pid in killed:
+            logger.warning("Orphaned process %d didn't exit, killing it", pid)
+            self._signal(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        self._wait(killed)
+
+        report = {'processes': sorted(orphans), 'killed': sorted(killed),
+                  'dbpaths': [], 'ports': []}
+        for pid, config_path in orphans.items():
+            cfg = configs[pid]
+            process.cleanup_mprocess(config_path, cfg)
+            if cfg.get('dbpath'):
+                report['dbpaths'].append(cfg['dbpath'])
+            if cfg.get('port'):
+                port = int(cfg['port'])
+                process.PortPool().release_port(port)
+                report['ports'].append(port)
+        process.PidRegistry().discard(*orphans)
+        report['time'] = time.time()
+        if orphans:
+            logger.info("Reclaimed %d orphaned processes, dbpaths %s and "
+                        "ports %s", len(orphans), report['dbpaths'],
+                        report['ports'])
+        with self._lock:
+            self._report = report
+        return report
+
+    @staticmethod
+    def _signal(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except OSError:
+            pass
+
+    def _wait(self, pids):
+        """Wait for pids to exit.
+        return the pids still alive after timeout"""
+        deadline = time.time() + self.timeout
+        alive = [pid for pid in pids if process.pid_alive(pid)]
+        while alive and time.time() < deadline:
+            time.sleep(0.05)
+            alive = [pid for pid in alive if process.pid_alive(pid)]
+        return alive
+
+    def info(self):
+        with self._lock:
+            return dict(self._report)
@@ -0,0 +1,311 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Placement of the processes we start on the CPUs of the host.
+
+Each cluster gets a set of CPUs, on one NUMA node when it fits, that the
+least other clusters use. Its processes are bound to it as soon as they
+are spawned, together with an I/O priority and resource limits, so that
+clusters running side by side don't compete for the same cores. Binding
+happens in the daemon, not in a preexec_fn: the daemon spawns processes
+from many threads, where running Python code between fork and exec is
+unsafe.
+"""
+
+import collections
+import ctypes
+import glob
+import logging
+import os
+import platform
+import re
+import threading
+from uuid import uuid4
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from mongo_orchestration.liveness import ProcessWatcher
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+NODES_GLOB = '/sys/devices/system/node/node[0-9]*'
+
+IOPRIO_CLASSES = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+# Number of the ioprio_set system call, Python doesn't wrap it.
+_IOPRIO_SET = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30}
+
+
+def parse_cpulist(cpulist):
+    """return the CPUs of a list like '0-3,8,10-11'"""
+    cpus = []
+    for part in cpulist.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def allowed_cpus():
+    """return the CPUs we may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_nodes():
+    """return dict {node: CPUs} of the NUMA nodes, limited to the CPUs
+    we may run on, a single node 0 if there's no NUMA information"""
+    allowed = set(allowed_cpus())
+    nodes = {}
+    for path in glob.glob(NODES_GLOB):
+        try:
+            with open(os.path.join(path, 'cpulist')) as fd:
+                cpus = parse_cpulist(fd.read())
+        except (IOError, OSError, ValueError):
+            continue
+        cpus = sorted(allowed.intersection(cpus))
+        if cpus:
+            node = int(re.search(r'(\d+)$', path).group(1))
+            nodes[node] = cpus
+    return nodes or {0: sorted(allowed)}
+
+
+def ioprio_value(ioprio):
+    """return the value for ioprio_set of a dict
+    {'class': 'best-effort', 'level': 0-7}"""
+    ioprio_class = IOPRIO_CLASSES[ioprio.get('class', 'best-effort')]
+    level = 0 if ioprio_class == IOPRIO_CLASSES['idle'] else int(
+        ioprio.get('level', 4))
+    return (ioprio_class << IOPRIO_CLASS_SHIFT) | level
+
+
+def rlimit_values(rlimits):
+    """return list of (resource, (soft, hard)) of a dict like
+    {'nofile': 64000, 'core': [0, 0]}, hard limits are kept when
+    only a number is given"""
+    values = []
+    if resource is None:
+        return values
+    for name, limits in rlimits.items():
+        rlimit = getattr(resource, 'RLIMIT_' + name.upper().replace(
+            'RLIMIT_', ''))
+        if isinstance(limits, (list, tuple)):
+            soft, hard = limits
+        else:
+            soft, hard = limits, resource.getrlimit(rlimit)[1]
+        values.append((rlimit, (soft, hard)))
+    return values
+
+
+def process_threads(pid):
+    """return the ids of the threads of process pid, just pid where they
+    can't be listed"""
+    try:
+        return [int(tid) for tid in os.listdir('/proc/%d/task' % pid)]
+    except (OSError, ValueError):
+        return [pid]
+
+
+class Slot(object):
+    """CPUs, I/O priority and limits of the processes of a cluster."""
+
+    def __init__(self, key, cpus, node, ioprio, rlimits, single=False):
+        self.key = key
+        # A slot of a single process goes away with it.
+        self.single = single
+        self.cpus = cpus
+        self.node = node
+        self.ioprio = ioprio
+        self.rlimits = rlimits
+        self.pids = set()
+        self._ioprio_value = ioprio and ioprio_value(ioprio)
+        self._rlimit_values = rlimit_values(rlimits)
+        self._syscall = None
+        self._ioprio_nr = _IOPRIO_SET.get(platform.machine())
+        if self._ioprio_value and self._ioprio_nr:
+            try:
+                self._syscall = ctypes.CDLL(None, use_errno=True).syscall
+            except (OSError, AttributeError):
+                pass
+
+    def apply(self, pid):
+        """Bind the process pid, just spawned, to the slot.
+
+        CPUs and the I/O priority are set on each thread, the ones the
+        process starts afterwards inherit them. Failures leave the
+        default."""
+        threads = process_threads(pid)
+        if self.cpus and hasattr(os, 'sched_setaffinity'):
+            for tid in threads:
+                try:
+                    os.sched_setaffinity(tid, self.cpus)
+                except OSError as exc:
+                    logger.debug("Could not bind %d to CPUs %s: %s",
+                                 tid, self.cpus, exc)
+        if self._syscall is not None:
+            for tid in threads:
+                if self._syscall(self._ioprio_nr, IOPRIO_WHO_PROCESS,
+                                 tid, self._ioprio_value) != 0:
+                    logger.debug("Could not set the I/O priority of %d: %s",
+                                 tid, os.strerror(ctypes.get_errno()))
+        if resource is None or not hasattr(resource, 'prlimit'):
+            return
+        for rlimit, limits in self._rlimit_values:
+            try:
+                resource.prlimit(pid, rlimit, limits)
+            except (OSError, ValueError) as exc:
+                logger.debug("Could not set limit %d of %d: %s",
+                             rlimit, pid, exc)
+
+    def info(self):
+        return {'cpus': self.cpus, 'node': self.node,
+                'ioprio': self.ioprio, 'rlimits': self.rlimits}
+
+
+class Placement(Singleton):
+    """CPU sets of the clusters."""
+
+    # Placement is off unless the daemon is started with --placement.
+    enabled = False
+    # CPUs of a cluster, None for a quarter of the CPUs.
+    cpus_per_cluster = None
+    # I/O priority and resource limits of every process, e.g.
+    # {'class': 'best-effort', 'level': 7} and {'nofile': 64000}.
+    ioprio = None
+    rlimits = {}
+
+    _lock = threading.Lock()
+    _nodes = None
+    # key -> Slot, key is the process group of a cluster.
+    _slots = {}
+    # CPU -> number of slots using it.
+    _users = collections.Counter()
+
+    def configure(self, config):
+        """Set placement from the 'placement' section of the config file."""
+        with self._lock:
+            for key in ('enabled', 'cpus_per_cluster', 'ioprio', 'rlimits'):
+                if key in config:
+                    setattr(self, key, config[key])
+            self._nodes = numa_nodes()
+        # Fail on startup rather than in the child.
+        if self.ioprio:
+            ioprio_value(self.ioprio)
+        rlimit_values(self.rlimits)
+        if self.enabled:
+            logger.info("Placing processes on NUMA nodes %s",
+                        sorted(self._nodes))
+
+    def place(self, group=None):
+        """return the Slot of the processes of group, one for a single
+        process if group is None, None when placement is off"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if group is not None and group in self._slots:
+                return self._slots[group]
+            self.__prune()
+            if self._nodes is None:
+                self._nodes = numa_nodes()
+            cpus, node = self.__choose()
+            slot = Slot(group if group is not None else str(uuid4()),
+                        cpus, node, self.ioprio, self.rlimits,
+                        single=group is None)
+            self._slots[slot.key] = slot
+            self._users.update(cpus)
+        logger.debug("Placed %s on CPUs %s of node %s", slot.key, cpus, node)
+        return slot
+
+    def started(self, slot, pid):
+        """Bind pid, just spawned, to slot and record that it runs
+        there."""
+        if slot is not None:
+            slot.apply(pid)
+            with self._lock:
+                slot.pids.add(pid)
+
+    def release(self, group):
+        """Give back the CPUs of group."""
+        with self._lock:
+            self.__release(group)
+
+    def of(self, pid):
+        """return the placement of pid, None if it isn't placed"""
+        with self._lock:
+            for slot in self._slots.values():
+                if pid in slot.pids:
+                    return slot.info()
+        return None
+
+    def __release(self, key):
+        # Called with the lock held.
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        for cpu in slot.cpus:
+            self._users[cpu] -= 1
+            if self._users[cpu] <= 0:
+                del self._users[cpu]
+
+    def __prune(self):
+        # Called with the lock held. Clusters release their slots when
+        # they go away.
+        alive = set(ProcessWatcher().pids())
+        for key, slot in list(self._slots.items()):
+            if slot.single and slot.pids and not slot.pids & alive:
+                self.__release(key)
+
+    def __choose(self):
+        """return tuple (CPUs, NUMA node) of the least used CPUs, on a
+        single node if the slot fits in one"""
+        all_cpus = [cpu for cpus in self._nodes.values() for cpu in cpus]
+        size = self.cpus_per_cluster or max(1, len(all_cpus) // 4)
+        size = min(size, len(all_cpus))
+        best = None
+        for node, cpus in sorted(self._nodes.items()):
+            if len(cpus) < size:
+                continue
+            chosen = sorted(cpus, key=lambda cpu: (self._users[cpu], cpu))
+            chosen = chosen[:size]
+            load = sum(self._users[cpu] for cpu in chosen)
+            if best is None or load < best[0]:
+                best = (load, sorted(chosen), node)
+        if best is None:
+            # Larger than any node.
+            chosen = sorted(all_cpus, key=lambda cpu: (self._users[cpu], cpu))
+            return sorted(chosen[:size]), None
+        return best[1], best[2]
+
+    def info(self):
+        with self._lock:
+            return {'enabled': self.enabled,
+                    'nodes': dict((str(node), cpus) for node, cpus in
+                                  (self._nodes or numa_nodes()).items()),
+                    'cpus_per_cluster': self.cpus_per_cluster,
+                    'ioprio': self.ioprio,
+                    'rlimits': self.rlimits,
+                    'slots': dict((key, dict(slot.info(),
+                                             pids=sorted(slot.pids)))
+                                  for key, slot in self._slots.items())}
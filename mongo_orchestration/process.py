@@ -20,30 +20,57 @@ import logging
 import os
 import platform
 import shutil
+import signal
 import stat
 import socket
 import subprocess
+import sys
 import time
 import tempfile
+import threading
 
 try:
     from subprocess import DEVNULL
 except ImportError:
     DEVNULL = open(os.devnull, 'wb')
 
-from mongo_orchestration.common import DEFAULT_BIND, LOG_FILE
+from mongo_orchestration.common import DEFAULT_BIND
 from mongo_orchestration.compat import reraise, PY3
-from mongo_orchestration.errors import TimeoutError, RequestError
+from mongo_orchestration import logs, startup
+from mongo_orchestration.errors import (
+    TimeoutError, RequestError, StartupError)
+from mongo_orchestration.liveness import ProcessWatcher
+from mongo_orchestration.placement import Placement
+from mongo_orchestration.readiness import Backoff, wait_until
 from mongo_orchestration.singleton import Singleton
+from mongo_orchestration.trash import Trash
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Prefix of the options files written by write_config.
+CONFIG_PREFIX = 'mongo-'
+
 
 class PortPool(Singleton):
+    """Thread-safe pool of TCP ports for mongod/mongos processes.
+
+    The state of every port is kept in a bytearray indexed by port number.
+    Ports are probed lazily, when they are handed out, instead of probing
+    the whole range up front.
+    """
 
-    __ports = set()
-    __closed = set()
+    # Port states.
+    UNUSED = 0  # not part of the pool
+    FREE = 1  # not allocated, and free when last probed (or never probed)
+    IN_USE = 2  # allocated by this pool
+    CLOSED = 3  # taken by some other process
+
+    __states = bytearray(65536)
+    __range = []
+    __next = 0
+    __placeholders = {}
+    __lock = threading.RLock()
     __id = None
 
     def __init__(self, min_port=1025, max_port=2000, port_sequence=None):
@@ -58,12 +85,31 @@ class PortPool(Singleton):
             self.__init_range(min_port, max_port, port_sequence)
 
     def __init_range(self, min_port=1025, max_port=2000, port_sequence=None):
-        if port_sequence:
-            self.__ports = set(port_sequence)
-        else:
-            self.__ports = set(range(min_port, max_port + 1))
-        self.__closed = set()
-        self.refresh()
+        with self.__lock:
+            for port in list(self.__placeholders):
+                self.release_placeholder(port)
+            if port_sequence:
+                self.__range = sorted(set(port_sequence))
+            else:
+                self.__range = list(range(min_port, max_port + 1))
+            self.__states = bytearray(65536)
+            for port in self.__range:
+                self.__states[port] = self.FREE
+            self.__next = 0
+
+    @property
+    def __ports(self):
+        """set of ports which may be handed out"""
+        with self.__lock:
+            return set(port for port in self.__range
+                       if self.__states[port] == self.FREE)
+
+    @property
+    def __closed(self):
+        """set of ports allocated by the pool or taken by other processes"""
+        with self.__lock:
+            return set(port for port in self.__range
+                       if self.__states[port] in (self.IN_USE, self.CLOSED))
 
     def __check_port(self, port):
         """check port status
@@ -78,50 +124,315 @@ class PortPool(Singleton):
         finally:
             s.close()
 
+    def __reserve(self, port):
+        """Bind a placeholder socket to the port until the process binds it.
+
+        The placeholder uses SO_REUSEADDR and never listens, so mongod
+        (which also sets SO_REUSEADDR) can still bind the port while any
+        other process gets EADDRINUSE. Only Linux lets SO_REUSEADDR bind the
+        same address twice, elsewhere the port is not reserved.
+        """
+        if platform.system() != 'Linux':
+            # BSD and macOS also want SO_REUSEPORT, so mongod would fail to
+            # bind, and SO_REUSEADDR lets any process steal the port on
+            # Windows.
+            return
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind((DEFAULT_BIND, port))
+        except socket.error:
+            s.close()
+            return
+        self.__placeholders[port] = s
+
+    def release_placeholder(self, port):
+        """close the placeholder socket reserving port, if any"""
+        with self.__lock:
+            s = self.__placeholders.pop(port, None)
+        if s is not None:
+            s.close()
+
     def release_port(self, port):
         """release port"""
-        if port in self.__closed:
-            self.__closed.remove(port)
-        self.__ports.add(port)
+        with self.__lock:
+            self.release_placeholder(port)
+            if self.__states[port] != self.UNUSED:
+                self.__states[port] = self.FREE
+
+    def mark_closed(self, port):
+        """mark port as taken by some other process"""
+        with self.__lock:
+            self.release_placeholder(port)
+            if self.__states[port] != self.UNUSED:
+                self.__states[port] = self.CLOSED
+
+    def claim(self, port):
+        """mark port as allocated, e.g. by a re-adopted process"""
+        with self.__lock:
+            if self.__states[port] != self.UNUSED:
+                self.__states[port] = self.IN_USE
+
+    def __take(self, port, check):
+        """Try to allocate a single FREE port. Return True on success."""
+        if check and not self.__check_port(port):
+            self.__states[port] = self.CLOSED
+            return False
+        self.__states[port] = self.IN_USE
+        return True
 
-    def port(self, check=False):
+    def __allocate(self, check):
+        """Allocate the next FREE port, starting from the cursor."""
+        size = len(self.__range)
+        for i in range(size):
+            idx = (self.__next + i) % size
+            port = self.__range[idx]
+            if self.__states[port] == self.FREE and self.__take(port, check):
+                self.__next = (idx + 1) % size
+                return port
+        return None
+
+    def port(self, check=False, reserve=False):
         """return next opened port
         Args:
           check - check is port realy free
+          reserve - keep a placeholder socket bound to the port on
+                    Linux, see release_placeholder
         """
-        if not self.__ports:  # refresh ports if sequence is empty
-            self.refresh()
-
-        try:
-            port = self.__ports.pop()
-            if check:
-                while not self.__check_port(port):
-                    self.release_port(port)
-                    port = self.__ports.pop()
-        except (IndexError, KeyError):
-            raise IndexError("Could not find a free port,\nclosed ports: {closed}".format(closed=self.__closed))
-        self.__closed.add(port)
-        return port
+        with self.__lock:
+            port = self.__allocate(check)
+            if port is None:
+                # refresh ports if sequence is empty
+                self.refresh()
+                port = self.__allocate(check)
+            if port is None:
+                raise IndexError("Could not find a free port,\nclosed ports: {closed}".format(closed=self.__closed))
+            if reserve:
+                self.__reserve(port)
+            return port
+
+    def ports(self, count, check=False, reserve=False):
+        """return a list of 'count' ports, contiguous when possible
+        Args:
+          count - number of ports
+          check - check are ports realy free
+          reserve - keep placeholder sockets bound to the ports
+        """
+        if count <= 0:
+            return []
+        with self.__lock:
+            block = self.__allocate_block(count, check)
+            if block is None:
+                block = [self.port(check) for _ in range(count)]
+            if reserve:
+                for port in block:
+                    self.__reserve(port)
+            return block
+
+    def __allocate_block(self, count, check):
+        """Allocate 'count' consecutive FREE ports, or return None."""
+        ports = self.__range
+        i = 0
+        while i + count <= len(ports):
+            block = ports[i:i + count]
+            if (block[-1] - block[0] != count - 1 or
+                    any(self.__states[port] != self.FREE for port in block)):
+                i += 1
+                continue
+            taken = []
+            for port in block:
+                if not self.__take(port, check):
+                    break
+                taken.append(port)
+            if len(taken) == count:
+                self.__next = (i + count) % len(ports)
+                return block
+            # Give back what we took and continue after the busy port.
+            for port in taken:
+                self.__states[port] = self.FREE
+            i += len(taken) + 1
+        return None
 
     def refresh(self, only_closed=False):
         """refresh ports status
         Args:
           only_closed - check status only for closed ports
         """
-        if only_closed:
-            opened = filter(self.__check_port, self.__closed)
-            self.__closed = self.__closed.difference(opened)
-            self.__ports = self.__ports.union(opened)
-        else:
-            ports = self.__closed.union(self.__ports)
-            self.__ports = set(filter(self.__check_port, ports))
-            self.__closed = ports.difference(self.__ports)
+        with self.__lock:
+            for port in self.__range:
+                state = self.__states[port]
+                if only_closed and state == self.FREE:
+                    continue
+                if port in self.__placeholders:
+                    continue
+                if self.__check_port(port):
+                    self.__states[port] = self.FREE
+                else:
+                    self.__states[port] = self.CLOSED
 
     def change_range(self, min_port=1025, max_port=2000, port_sequence=None):
         """change Pool port range"""
         self.__init_range(min_port, max_port, port_sequence)
 
 
+def _process_group_kwargs(pgid, preexec_fn=None):
+    """return Popen keyword arguments to start a process in process group
+    pgid, or in a new process group if pgid is 0, calling preexec_fn in
+    the child before exec
+
+    Before Python 3.11 joining the group needs a preexec_fn, which Python
+    documents as unsafe when other threads run, as they do in the daemon.
+    It is kept to os.setpgid, from 3.11 on process_group does without."""
+    if sys.version_info >= (3, 11):
+        return {'process_group': pgid, 'preexec_fn': preexec_fn}
+
+    def preexec():
+        os.setpgid(0, pgid)
+        if preexec_fn is not None:
+            preexec_fn()
+    return {'preexec_fn': preexec}
+
+
+class ProcessGroups(Singleton):
+    """Process groups shared by the processes of a cluster.
+
+    Processes started for the same group name share a process group,
+    outside of ours, so that a whole cluster can be killed at once and
+    doesn't get signals sent to the terminal's foreground group.
+    """
+
+    _lock = threading.Lock()
+    # group name -> list of process group ids, new processes join the last
+    _groups = {}
+
+    def popen(self, cmd, group=None, **kwargs):
+        """start cmd in the process group of group, or in a new one
+        return Popen object"""
+        if not hasattr(os, 'setpgid'):
+            return subprocess.Popen(cmd, **kwargs)
+        with self._lock:
+            pgid = self._joinable(group)
+            kwargs.update(_process_group_kwargs(
+                pgid or 0, kwargs.pop('preexec_fn', None)))
+            proc = subprocess.Popen(cmd, **kwargs)
+            if group is not None and pgid is None:
+                self._groups.setdefault(group, []).append(proc.pid)
+        return proc
+
+    def _joinable(self, group):
+        """return the process group id new processes of group join"""
+        pgids = self._groups.get(group)
+        if not pgids:
+            return None
+        try:
+            # A process group can only be joined from its session, and
+            # while its leader is alive we know it still exists.
+            if os.getsid(pgids[-1]) == os.getsid(0):
+                return pgids[-1]
+        except OSError:
+            pass
+        return None
+
+    def adopt(self, group, pid):
+        """Record the process group of pid, started by a previous run."""
+        if group is None or not hasattr(os, 'getpgid'):
+            return
+        try:
+            pgid = os.getpgid(pid)
+        except OSError:
+            return
+        if pgid == os.getpgid(0):
+            return
+        with self._lock:
+            pgids = self._groups.setdefault(group, [])
+            if pgid not in pgids:
+                pgids.insert(0, pgid)
+
+    def forget(self, group):
+        with self._lock:
+            self._groups.pop(group, None)
+        Placement().release(group)
+
+    def kill(self, group):
+        """Send SIGKILL to all the processes of group at once.
+        return the number of process groups signalled"""
+        with self._lock:
+            pgids = set(self._groups.pop(group, []))
+        Placement().release(group)
+        if not pgids:
+            return 0
+        # Only signal groups that still hold a process of ours, a process
+        # group id can be reused once the group is empty.
+        live = set()
+        for pid in ProcessWatcher().pids():
+            try:
+                live.add(os.getpgid(pid))
+            except OSError:
+                pass
+        pgids &= live
+        pgids.discard(os.getpgid(0))
+        for pgid in pgids:
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except OSError:
+                pass
+        return len(pgids)
+
+
+class PidRegistry(Singleton):
+    """Pids and options files of the processes we started, kept on disk so
+    that the next run can find the processes a crash left behind."""
+
+    _lock = threading.Lock()
+    path = None
+    # pid -> options file
+    _pids = {}
+
+    def open(self, path):
+        """Start recording to path.
+        return the processes recorded by the previous run as
+        dict {pid: options file}"""
+        try:
+            with open(path, 'r') as fd:
+                recorded = dict((int(pid), config_path) for pid, config_path
+                                in json.load(fd).items())
+        except (IOError, OSError, ValueError, AttributeError):
+            recorded = {}
+        with self._lock:
+            self.path = path
+            self._pids = dict(recorded)
+        return recorded
+
+    def add(self, pid, config_path):
+        with self._lock:
+            if self.path is None:
+                return
+            # Forget processes that have exited since.
+            self._pids = dict(
+                (old_pid, old_path) for old_pid, old_path in self._pids.items()
+                if pid_matches(old_pid, old_path))
+            self._pids[pid] = config_path
+            self._write()
+
+    def discard(self, *pids):
+        with self._lock:
+            if self.path is None:
+                return
+            for pid in pids:
+                self._pids.pop(pid, None)
+            self._write()
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as fd:
+                json.dump(dict((str(pid), config_path) for pid, config_path
+                               in self._pids.items()), fd)
+            os.replace(tmp_path, self.path)
+        except (IOError, OSError):
+            logger.exception("Could not write pids to %s", self.path)
+
+
 def connect_port(port):
     """waits while process starts.
     Args:
@@ -151,16 +462,14 @@ def wait_for(proc, port_num, timeout):
     return True if process started, return False if not
     """
     logger.debug("wait for {port_num}".format(**locals()))
-    t_start = time.time()
-    sleeps = 0.1
-    while time.time() - t_start < timeout:
+
+    def started():
         if proc.poll() is not None:
             logger.debug("process is not alive")
             raise OSError("Process started, but died immediately")
-        if connect_port(port_num):
-            return True
-        time.sleep(sleeps)
-    return False
+        return connect_port(port_num)
+
+    return wait_until(started, timeout, backoff=Backoff(initial=0.01))
 
 
 def repair_mongo(name, dbpath):
@@ -189,7 +498,8 @@ def repair_mongo(name, dbpath):
                     "check log file: %s" % (timeout, log_file))
 
 
-def mprocess(name, config_path, port=None, timeout=180):
+def mprocess(name, config_path, port=None, timeout=180, logpath=None,
+             group=None):
     """start 'name' process with params from config_path.
     Args:
         name - process name or path
@@ -197,7 +507,12 @@ def mprocess(name, config_path, port=None, timeout=180):
         port - process's port
         timeout - specify how long, in seconds, a command can take before times out.
                   if timeout <=0 - doesn't wait for complete start process
+        logpath - log file of the process, followed to detect when it is
+                  ready or has failed
+        group - name of the process group to start the process in, see
+                ProcessGroups
     return tuple (Popen object, host) if process started, return (None, None) if not
+    raise StartupError if the log or exit code tell the start failed
     """
 
     logger.debug(
@@ -213,24 +528,53 @@ def mprocess(name, config_path, port=None, timeout=180):
         port = port or PortPool().port(check=True)
         cmd.extend(['--port', str(port)])
     host = "{host}:{port}".format(host=DEFAULT_BIND, port=port)
+    # Only lines written after this point belong to this start.
+    monitor = logpath and startup.StartupMonitor(logpath)
     try:
         logger.debug("execute process: %s", ' '.join(cmd))
-        # Redirect server startup errors (written to stdout/stderr) to our log
-        with open(LOG_FILE, 'a+') as outfile:
-            proc = subprocess.Popen(
-                cmd,
-                stdout=outfile,
+        # Keep the last lines of stdout/stderr, where startup errors go,
+        # in memory. Popen doesn't own the pipe so that communicate()
+        # doesn't compete with the buffer for it.
+        read_fd, write_fd = os.pipe()
+        slot = Placement().place(group)
+        try:
+            proc = ProcessGroups().popen(
+                cmd, group,
+                stdout=write_fd,
                 stderr=subprocess.STDOUT)
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        proc.output = logs.OutputBuffer(os.fdopen(read_fd, 'rb'))
+        Placement().started(slot, proc.pid)
+        ProcessWatcher().watch(proc)
+        PidRegistry().add(proc.pid, config_path)
 
-            if proc.poll() is not None:
-                logger.debug("process is not alive")
-                raise OSError("Process started, but died immediately.")
+        if proc.poll() is not None:
+            logger.debug("process is not alive")
+            raise OSError("Process started, but died immediately.")
     except (OSError, TypeError) as err:
         message = "exception while executing process: {err}".format(err=err)
         logger.debug(message)
         raise OSError(message)
     if timeout > 0:
-        if wait_for(proc, port, timeout):
+        if monitor:
+            state = monitor.wait(proc, timeout, lambda: connect_port(port))
+            if state == startup.FAILED:
+                logger.debug("process '{name}' failed to start: "
+                             "{monitor.reason}".format(**locals()))
+                kill_mprocess(proc)
+                log_output(proc)
+                raise StartupError(
+                    "Process failed to start: %s" % monitor.reason,
+                    address_in_use=monitor.address_in_use)
+            # A log that never said anything, e.g. not written to logpath.
+            started = state == startup.READY or connect_port(port)
+        else:
+            started = wait_for(proc, port, timeout)
+        if started:
             logger.debug("process '{name}' has started: pid={proc.pid},"
                          " host={host}".format(**locals()))
             return (proc, host)
@@ -240,6 +584,7 @@ def mprocess(name, config_path, port=None, timeout=180):
             logger.debug("terminate process with"
                          " pid={proc.pid}".format(**locals()))
             kill_mprocess(proc)
+            log_output(proc)
             proc_alive(proc) and time.sleep(3)  # wait while process stoped
             message = ("Could not connect to process during "
                        "{timeout} seconds".format(timeout=timeout))
@@ -247,6 +592,17 @@ def mprocess(name, config_path, port=None, timeout=180):
     return (proc, host)
 
 
+def log_output(proc):
+    """Copy what a process that failed to start printed into our log."""
+    output = getattr(proc, 'output', None)
+    if output is None:
+        return
+    output.wait(1)
+    text = output.text()
+    if text:
+        logger.error("Output of process %d:\n%s", proc.pid, text)
+
+
 def wait_mprocess(process, timeout):
     """Compatibility function for waiting on a process with a timeout.
 
@@ -270,14 +626,19 @@ def wait_mprocess(process, timeout):
         time.sleep(0.05)
 
 
-def kill_mprocess(process):
+def kill_mprocess(process, fast=False):
     """kill process
     Args:
         process - Popen object for process
+        fast - kill with SIGKILL instead of letting the process shut down
     """
     if process and proc_alive(process):
-        process.terminate()
-        process.communicate()
+        if fast:
+            process.kill()
+            process.wait()
+        else:
+            process.terminate()
+            process.communicate()
     return not proc_alive(process)
 
 
@@ -287,8 +648,9 @@ def cleanup_mprocess(config_path, cfg):
        config_path - process's options file
        cfg - process's config
     """
-    for key in ('keyFile', 'dbpath'):
-        remove_path(cfg.get(key, None))
+    remove_path(cfg.get('keyFile', None))
+    # The dbpath can be large, delete it in the background.
+    Trash().put(cfg.get('dbpath', None))
     isinstance(config_path, str) and os.path.exists(config_path) and remove_path(config_path)
 
 
@@ -318,7 +680,7 @@ def write_config(params, config_path=None):
        where config_path - path to mongo*'s options file
     """
     if config_path is None:
-        config_path = tempfile.mktemp(prefix="mongo-")
+        config_path = tempfile.mktemp(prefix=CONFIG_PREFIX)
 
     cfg = params.copy()
     if 'setParameter' in cfg:
@@ -359,4 +721,88 @@ def read_config(config_path):
 
 def proc_alive(process):
     """Check if process is alive. Return True or False."""
-    return process.poll() is None if process else False
+    if not process:
+        return False
+    alive = ProcessWatcher().alive(process)
+    if alive is None:
+        return process.poll() is None
+    return alive
+
+
+def pid_alive(pid):
+    """Check if a process with the given pid exists."""
+    if platform.system() == 'Windows':
+        # os.kill() would terminate the process on Windows.
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as exc:
+        # EPERM: the process exists but belongs to someone else.
+        return exc.errno == errno.EPERM
+    return True
+
+
+def proc_cmdline(pid):
+    """Return the command line of process pid as a list, or None when it
+    cannot be read (process is gone or /proc is not available)."""
+    try:
+        with open('/proc/%d/cmdline' % pid, 'rb') as fd:
+            cmdline = fd.read()
+    except (IOError, OSError):
+        return None
+    return [arg.decode('utf-8', 'replace')
+            for arg in cmdline.split(b'\0') if arg]
+
+
+def pid_matches(pid, config_path):
+    """Check that pid is alive and runs with the options file config_path.
+
+    Guards against re-adopting an unrelated process that reused the pid.
+    Where /proc is not available only liveness is checked.
+    """
+    if not pid or not pid_alive(pid):
+        return False
+    cmdline = proc_cmdline(pid)
+    if cmdline is None:
+        return not os.path.exists('/proc/self')
+    return config_path in cmdline
+
+
+class AdoptedProcess(object):
+    """Popen-like handle for a process started by a previous daemon run.
+
+    The process is not our child, so its exit code can't be collected;
+    poll() and wait() report 0 once the process is gone.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+        self.stdout = None
+
+    def poll(self):
+        if self.returncode is None and not pid_alive(self.pid):
+            self.returncode = 0
+        return self.returncode
+
+    def wait(self, timeout=None):
+        start = time.time()
+        while self.poll() is None:
+            if timeout is not None and time.time() - start > timeout:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+    def communicate(self):
+        self.wait()
+        return None, None
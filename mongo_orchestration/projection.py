@@ -0,0 +1,60 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Projection of the info of servers, replica sets and sharded clusters.
+
+A projection like 'mongodb_uri,members.state' is parsed into a tree
+{'mongodb_uri': None, 'members': {'state': None}}, where None stands for
+the whole field. Dotted paths reach into embedded documents and into the
+documents of lists. The info methods take the tree and skip the work
+behind the fields nobody asked for, None stands for every field.
+"""
+
+
+def parse_fields(spec):
+    """return the projection tree of a comma separated list of fields,
+    None if spec is empty"""
+    if not spec:
+        return None
+    tree = {}
+    for path in spec.split(','):
+        parts = [part for part in path.strip().split('.') if part]
+        node = tree
+        for i, part in enumerate(parts):
+            if part in node and node[part] is None:
+                # The whole field is already asked for.
+                break
+            if i == len(parts) - 1:
+                node[part] = None
+            else:
+                node = node.setdefault(part, {})
+    return tree or None
+
+
+def wants(fields, *names):
+    """return True if the projection asks for any of names"""
+    return fields is None or any(name in fields for name in names)
+
+
+def project(doc, fields):
+    """return doc with only the fields of the projection"""
+    if fields is None:
+        return doc
+    if isinstance(doc, list):
+        return [project(item, fields) for item in doc]
+    if not isinstance(doc, dict):
+        return doc
+    return dict((name, project(doc[name], sub))
+                for name, sub in fields.items() if name in doc)
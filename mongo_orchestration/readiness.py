@@ -0,0 +1,109 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Event-driven waits for servers and replica sets to become ready."""
+
+import logging
+import threading
+import time
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+
+class Backoff(object):
+    """Exponentially growing delays, used between readiness checks when no
+    topology event arrives."""
+
+    def __init__(self, initial=0.05, maximum=1.0, factor=2):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.delay = initial
+
+    def next(self):
+        """return the next delay in seconds"""
+        delay = self.delay
+        self.delay = min(self.delay * self.factor, self.maximum)
+        return delay
+
+
+class TopologyListener(monitoring.ServerListener,
+                       monitoring.TopologyListener):
+    """SDAM listener waking up waiters whenever PyMongo observes a change in
+    the state of a server, e.g. a member becoming PRIMARY or SECONDARY or
+    reporting a new replica set config version."""
+
+    def __init__(self):
+        self.generation = 0
+        self._condition = threading.Condition()
+
+    def notify(self):
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """Block until an event newer than 'generation' arrives or
+        'timeout' seconds elapse.
+
+        return True if an event arrived
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.generation != generation, timeout)
+
+    def opened(self, event):
+        self.notify()
+
+    def description_changed(self, event):
+        logger.debug("description of %s changed: %s -> %s",
+                     getattr(event, 'server_address', 'topology'),
+                     event.previous_description, event.new_description)
+        self.notify()
+
+    def closed(self, event):
+        self.notify()
+
+
+def wait_until(predicate, timeout, listener=None, backoff=None):
+    """Wait until predicate() returns a truthy value.
+
+    The predicate is re-evaluated as soon as 'listener' reports a topology
+    change; exponential backoff only bounds the time between checks when
+    no event arrives.
+    Args:
+        predicate - callable checking the awaited condition
+        timeout - specify how long, in seconds, to wait
+        listener - optional TopologyListener to wake up on
+        backoff - optional Backoff instance
+
+    return True if the condition was met, False on timeout
+    """
+    backoff = backoff or Backoff()
+    t_start = time.time()
+    while True:
+        generation = listener.generation if listener else None
+        if predicate():
+            return True
+        remaining = timeout - (time.time() - t_start)
+        if remaining <= 0:
+            return False
+        delay = min(backoff.next(), remaining)
+        if listener is not None:
+            listener.wait(generation, delay)
+        else:
+            time.sleep(delay)
@@ -15,23 +15,33 @@
 # limitations under the License.
 
 import logging
+import os
 import tempfile
 import time
 
 from uuid import uuid4
 
-from concurrent.futures import ThreadPoolExecutor
-
 import pymongo
 from pymongo.server_api import ServerApi
 
 from mongo_orchestration.common import (
     BaseModel, connected, DEFAULT_SUBJECT, DEFAULT_SSL_OPTIONS,
-    ipv6_enabled_repl, enable_ipv6_single)
+    ipv6_enabled_repl, enable_ipv6_single, only_x509)
+from mongo_orchestration.connections import ClientPool
 from mongo_orchestration.singleton import Singleton
 from mongo_orchestration.container import Container
 from mongo_orchestration.errors import ReplicaSetError
+from mongo_orchestration.jobs import report_phase
+from mongo_orchestration.process import PortPool, ProcessGroups
+from mongo_orchestration.projection import wants
+from mongo_orchestration.readiness import TopologyListener, wait_until
+from mongo_orchestration.scheduler import (
+    Scheduler, COMMAND, SHUTDOWN, SPAWN)
 from mongo_orchestration.servers import Servers
+from mongo_orchestration.templates import (
+    DbpathTemplates, templatable, template_host)
+from mongo_orchestration.topology import SnapshotCache
+from mongo_orchestration.versions import BinaryVersions
 
 logger = logging.getLogger(__name__)
 Servers()
@@ -59,6 +69,9 @@ class ReplicaSet(BaseModel):
         self.password = rs_params.get('password', '')
         self.admin_added = False
         self.repl_id = rs_params.get('id', None) or str(uuid4())
+        # Members share a process group, with the rest of the sharded
+        # cluster for shards and config servers.
+        self.process_group = rs_params.get('processGroup') or self.repl_id
         self._version = rs_params.get('version')
         self._require_api_version = rs_params.get('requireApiVersion', '')
         if self._require_api_version:
@@ -67,19 +80,33 @@ class ReplicaSet(BaseModel):
         self.sslParams = rs_params.get('sslParams', {})
         self.kwargs = {}
         self.restart_required = self.login or self.auth_key
-        self.x509_extra_user = False
+        members = rs_params.get('members', [])
+        self._members = members
+        # If the only authentication mechanism enabled is MONGODB-X509,
+        # we'll need to add our own user using SSL certificates we already
+        # have. Otherwise, the user of MO would have to copy their own
+        # certificates to wherever MO happens to be running so that MO
+        # might authenticate.
+        self.x509_extra_user = bool(self.login) and any(
+            only_x509(member.get('procParams', {})) for member in members)
+        self.auth_bootstrap = self._auth_bootstrap_enabled(
+            rs_params.get('authBootstrap'))
 
         if self.sslParams:
             self.kwargs.update(DEFAULT_SSL_OPTIONS)
+        # Wakes up readiness waits on every topology change seen by PyMongo.
+        self._topology_listener = TopologyListener()
+        self._snapshots = SnapshotCache(self._take_snapshot,
+                                        self._topology_listener)
 
-        members = rs_params.get('members', [])
-        self._members = members
         # Enable ipv6 on all members if any have it enabled.
         self.enable_ipv6 = ipv6_enabled_repl(rs_params)
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(self.member_create, member, i)
-                       for i, member in enumerate(members)]
-            config_members = [f.result() for f in futures]
+        template_key = self._template_key(rs_params)
+        template = template_key and DbpathTemplates().get(template_key)
+        results = self._spawn_members(members, autostart=not template)
+        config_members = [member_config for member_config, _ in results]
+        if not template:
+            report_phase('processes spawned')
         config = {"_id": self.repl_id, "members": config_members}
         if 'rsSettings' in rs_params:
             config['settings'] = rs_params['rsSettings']
@@ -92,28 +119,23 @@ class ReplicaSet(BaseModel):
         )
 
         logger.debug("replica config: {config}".format(**locals()))
-        if not self.repl_init(config):
+        if template:
+            if not self._clone_template(
+                    template, config, [server_id for _, server_id in results]):
+                self.cleanup()
+                raise ReplicaSetError(
+                    "Could not create replica set from template.")
+            report_phase('processes spawned from template')
+        elif not self.repl_init(config):
             self.cleanup()
             raise ReplicaSetError("Could not create replica set.")
+        else:
+            report_phase('replSetInitiate')
 
         if not self.waiting_config_state():
             raise ReplicaSetError(
                 "Could not actualize replica set configuration.")
         if self.login:
-            # If the only authentication mechanism enabled is MONGODB-X509,
-            # we'll need to add our own user using SSL certificates we already
-            # have. Otherwise, the user of MO would have to copy their own
-            # certificates to wherever MO happens to be running so that MO
-            # might authenticate.
-            for member in members:
-                proc_params = member.get('procParams', {})
-                set_params = proc_params.get('setParameter', {})
-                auth_mechs = set_params.get('authenticationMechanisms', '')
-                auth_mechs = auth_mechs.split(',')
-                if len(auth_mechs) == 1 and auth_mechs[0] == 'MONGODB-X509':
-                    self.x509_extra_user = True
-                    break
-
             if config["members"]:
                 server_id = self._servers.host_to_server_id(
                     self.member_id_to_host(0))
@@ -122,21 +144,66 @@ class ReplicaSet(BaseModel):
                 version = (2, 4, 0)
 
             self._add_users(self.connection()[self.auth_source], version)
+            report_phase('users added')
 
-        if self.restart_required:
+        if self.restart_required and self.auth_bootstrap:
+            # Members run with auth since they started.
+            self.set_credentials()
+        elif self.restart_required:
             self.restart_with_auth()
+            report_phase('auth restart')
 
         if not self.waiting_member_state() and self.waiting_config_state():
             raise ReplicaSetError(
                 "Could not actualize replica set configuration.")
-        for i in range(100):
-            if self.connection().primary:
-                break
-            time.sleep(0.1)
-        else:
+        if not wait_until(lambda: self.connection().primary, 10,
+                          self._topology_listener):
             raise ReplicaSetError("No primary was ever elected.")
 
-    def restart_with_auth(self, cluster_auth_mode=None):
+        if template_key and not template:
+            try:
+                DbpathTemplates().capture(
+                    template_key, self._servers._storage[
+                        self._servers.host_to_server_id(self.primary())])
+            except Exception:
+                logger.exception("Could not capture dbpath template")
+
+    def _template_key(self, rs_params):
+        """return the dbpath template key for rs_params, or None if this
+        replica set can't use templates"""
+        templates = DbpathTemplates()
+        if not (templates.enabled and templatable(rs_params)):
+            return None
+        mongod = os.path.join(self._servers.bin_path(self._version), 'mongod')
+        if BinaryVersions().version(mongod) < templates.min_version:
+            return None
+        return templates.key(mongod, rs_params)
+
+    def _clone_template(self, template, config, server_ids):
+        """Start members from copies of a template dbpath.
+        return True if all members reached an acceptable state"""
+        servers = [self._servers._storage[server_id]
+                   for server_id in server_ids]
+        DbpathTemplates().clone(template, self.repl_id, config, servers)
+        self.update_server_map(config)
+        Scheduler().map(SPAWN, lambda server: server.start(), servers)
+        if not self.wait_while_reachable(list(self.server_map.values())):
+            return False
+        # The members would wait for an election timeout before electing
+        # a primary, ask the member that replSetInitiate would have used.
+        electable = [(member, server)
+                     for member, server in zip(config['members'], servers)
+                     if not (member.get('arbiterOnly', False) or
+                             member.get('priority', 1) == 0)]
+        if electable:
+            try:
+                electable[0][1].run_command('replSetStepUp')
+            except pymongo.errors.PyMongoError:
+                logger.info("replSetStepUp failed, waiting for an election")
+        return self.waiting_member_state()
+
+    def set_credentials(self):
+        """Make this replica set and its members connect with the user."""
         for server in self.server_instances():
             server.restart_required = False
         self.restart_required = False
@@ -154,6 +221,9 @@ class ReplicaSet(BaseModel):
                 server.password = self.password
                 server.auth_key = self.auth_key
 
+    def restart_with_auth(self, cluster_auth_mode=None):
+        self.set_credentials()
+
         def add_auth(config):
             if self.auth_key:
                 config['keyFile'] = self.key_file
@@ -165,17 +235,41 @@ class ReplicaSet(BaseModel):
         # Restart all the servers with auth flags and ssl.
         self.restart(config_callback=add_auth)
 
+    _state_attrs = ('repl_id', 'server_map', '_members', 'login', 'password',
+                    'auth_source', 'auth_key', 'admin_added', 'sslParams',
+                    'kwargs', 'restart_required', 'x509_extra_user',
+                    '_write_concern', 'enable_ipv6', '_version',
+                    '_require_api_version', 'auth_bootstrap',
+                    'process_group')
+
+    def _restore_state(self):
+        # JSON object keys are strings, member ids are ints.
+        self.server_map = dict((int(member_id), host)
+                               for member_id, host in self.server_map.items())
+        self._topology_listener = TopologyListener()
+        self._snapshots = SnapshotCache(self._take_snapshot,
+                                        self._topology_listener)
+
     def __len__(self):
         return len(self.server_map)
 
-    def cleanup(self):
-        """remove all members without reconfig"""
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(self.member_del, item, reconfig=False)
-                       for item in self.server_map]
-            for f in futures:
-                f.result()
+    def cleanup(self, fast=False):
+        """remove all members without reconfig
+        Args:
+            fast - kill all members at once instead of shutting them down
+        """
+        self.invalidate()
+        owns_group = self.process_group == self.repl_id
+        if fast and owns_group:
+            ProcessGroups().kill(self.process_group)
+        tasks = [Scheduler().submit(SHUTDOWN, self.member_del, item,
+                                    reconfig=False, fast=fast)
+                 for item in self.server_map]
+        for task in tasks:
+            task.result()
         self.server_map.clear()
+        if owns_group:
+            ProcessGroups().forget(self.process_group)
 
     def member_id_to_host(self, member_id):
         """return hostname by member id"""
@@ -190,6 +284,42 @@ class ReplicaSet(BaseModel):
     def update_server_map(self, config):
         """update server_map ({member_id:hostname})"""
         self.server_map = dict([(member['_id'], member['host']) for member in config['members']])
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the last snapshot, after a lifecycle action."""
+        self._snapshots.invalidate()
+
+    def snapshot(self):
+        """return a recent Snapshot of the status, config and hello of the
+        members"""
+        return self._snapshots.get()
+
+    def _take_snapshot(self):
+        """return tuple (status, config, hellos) from one parallel sweep"""
+        status = Scheduler().submit(
+            COMMAND, self.run_command, 'replSetGetStatus')
+        config = Scheduler().submit(COMMAND, lambda: self.config)
+        status = status.result()
+        # Members down for the primary would only time out, and arbiters
+        # can't authenticate us (SERVER-5479).
+        skip_arbiters = bool(self.login or self.auth_key)
+        hosts = [member['name'] for member in status['members']
+                 if member.get('health', 1) == 1 and not (
+                     skip_arbiters and member['state'] == ARBITER_STATE)]
+        hellos = [Scheduler().submit(COMMAND, self._hello, host)
+                  for host in hosts]
+        return (status, config.result(),
+                dict(zip(hosts, [task.result() for task in hellos])))
+
+    def _hello(self, host):
+        """return the hello reply of host, None if it doesn't answer"""
+        try:
+            return self.connection(
+                hostname=host, timeout=0).admin.command('ismaster')
+        except pymongo.errors.PyMongoError:
+            logger.debug("%s didn't answer hello", host, exc_info=True)
+            return None
 
     def repl_init(self, config):
         """create replica set by config
@@ -219,6 +349,7 @@ class ReplicaSet(BaseModel):
 
     def reset(self):
         """Ensure all members are running and available."""
+        self.invalidate()
         # Need to use self.server_map, in case no Servers are left running.
         for member_id in self.server_map:
             host = self.member_id_to_host(member_id)
@@ -230,6 +361,7 @@ class ReplicaSet(BaseModel):
         self.waiting_member_state()
         # Wait for Server states to match the config from the primary.
         self.waiting_config_state()
+        self.invalidate()
         return self.info()
 
     def repl_update(self, config):
@@ -242,19 +374,31 @@ class ReplicaSet(BaseModel):
                 return False
         except pymongo.errors.AutoReconnect:
             self.update_server_map(cfg)  # use new server_map
+        finally:
+            self.invalidate()
         self.waiting_member_state()
         self.waiting_config_state()
         return self.connection() and True
 
-    def info(self):
-        """return information about replica set"""
-        hosts = ','.join(x['host'] for x in self.members())
-        mongodb_uri = 'mongodb://' + hosts + '/?replicaSet=' + self.repl_id
+    def info(self, fields=None):
+        """return information about replica set
+        Args:
+            fields - projection of the info, None for all of it
+        """
         result = {"id": self.repl_id,
                   "auth_key": self.auth_key,
-                  "members": self.members(),
-                  "mongodb_uri": mongodb_uri,
                   "orchestration": 'replica_sets'}
+        # Everything else comes from a snapshot.
+        if not wants(fields, 'members', 'mongodb_uri', 'mongodb_auth_uri',
+                     'snapshot'):
+            return result
+        snapshot = self.snapshot()
+        members = self.members(snapshot)
+        hosts = ','.join(x['host'] for x in members)
+        mongodb_uri = 'mongodb://' + hosts + '/?replicaSet=' + self.repl_id
+        result.update({"members": members,
+                       "mongodb_uri": mongodb_uri,
+                       "snapshot": snapshot.info()})
         if self.login:
             # Add replicaSet URI parameter.
             uri = ('%s&replicaSet=%s'
@@ -310,41 +454,101 @@ class ReplicaSet(BaseModel):
             config = self.connection().local.system.replset.find_one()
         return config
 
-    def member_create(self, params, member_id):
+    def member_create(self, params, member_id, port=None):
         """start new mongod instances as part of replica set
         Args:
             params - member params
             member_id - member index
+            port - port to use if params don't specify one
 
         return member config
         """
+        return self._member_server(params, member_id, port)[0]
+
+    def _spawn_members(self, members, autostart=True):
+        """create the Servers of members in parallel
+        return list of tuples (member config, server id)"""
+        # Give members without an explicit port a contiguous block of ports.
+        block = PortPool().ports(
+            len([m for m in members
+                 if 'port' not in m.get('procParams', {})]),
+            check=True, reserve=True)
+        ports = iter(block)
+        report_phase('ports allocated')
+        tasks = []
+        failed = True
+        try:
+            for i, member in enumerate(members):
+                tasks.append(Scheduler().submit(
+                    SPAWN, self._member_server, member, i,
+                    None if 'port' in member.get('procParams', {})
+                    else next(ports),
+                    autostart=autostart))
+            results = [task.result() for task in tasks]
+            failed = False
+            return results
+        finally:
+            if failed:
+                self.__abort_members(tasks, block)
+
+    def __abort_members(self, tasks, ports):
+        """Remove the members that started and give back their ports."""
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                _, server_id = task.result()
+            except Exception:
+                # Cancelled, or failed and cleaned up after itself.
+                continue
+            try:
+                self._servers.remove(server_id, fast=True)
+            except Exception:
+                logger.exception("Could not remove member %s", server_id)
+        for port in ports:
+            PortPool().release_port(port)
+
+    def _member_server(self, params, member_id, port=None, autostart=True):
+        """create the Server of a replica set member
+        return tuple (member config, server id)"""
         member_config = params.get('rsParams', {})
         server_id = params.pop('server_id', None)
         version = params.pop('version', self._version)
         proc_params = {'replSet': self.repl_id}
+        if port is not None:
+            proc_params['port'] = port
         proc_params.update(params.get('procParams', {}))
         if self.enable_ipv6:
             enable_ipv6_single(proc_params)
-        # Make sure that auth isn't set the first time we start the servers.
-        proc_params = self._strip_auth(proc_params)
+        if self.auth_bootstrap:
+            if self.auth_key:
+                proc_params['keyFile'] = self.key_file
+        else:
+            # Make sure that auth isn't set the first time we start the servers.
+            proc_params = self._strip_auth(proc_params)
 
         # Don't pass in auth_key the first time we start the servers.
         server_id = self._servers.create(
             name='mongod',
             procParams=proc_params,
             sslParams=self.sslParams,
+            autostart=autostart,
             version=version,
-            server_id=server_id
+            server_id=server_id,
+            process_group=self.process_group
         )
-        member_config.update({"_id": member_id,
-                              "host": self._servers.hostname(server_id)})
-        return member_config
+        member_config.update({
+            "_id": member_id,
+            "host": (self._servers.hostname(server_id) or
+                     template_host(proc_params['port']))})
+        return member_config, server_id
 
-    def member_del(self, member_id, reconfig=True):
+    def member_del(self, member_id, reconfig=True, fast=False):
         """remove member from replica set
         Args:
             member_id - member index
             reconfig - is need reconfig replica
+            fast - kill the member instead of shutting it down
 
         return True if operation success otherwise False
         """
@@ -354,7 +558,8 @@ class ReplicaSet(BaseModel):
             config = self.config
             config['members'].pop(member_id)
             self.repl_update(config)
-        self._servers.remove(server_id)
+        self._servers.remove(server_id, fast=fast)
+        self.invalidate()
         return True
 
     def member_update(self, member_id, params):
@@ -383,15 +588,18 @@ class ReplicaSet(BaseModel):
                 self._servers.hostname(server_id))
         result['rsInfo'] = {}
         if server_info['procInfo']['alive']:
-            # Can't call serverStatus on arbiter when running with auth enabled.
-            # (SERVER-5479)
+            snapshot = self.snapshot()
+            # Can't authenticate to an arbiter when running with auth
+            # enabled. (SERVER-5479)
             if self.login or self.auth_key:
-                arbiter_ids = [member['_id'] for member in self.arbiters()]
+                arbiter_ids = [member['_id']
+                               for member in self.arbiters(snapshot)]
                 if member_id in arbiter_ids:
                     result['rsInfo'] = {
                         'arbiterOnly': True, 'secondary': False, 'primary': False}
                     return result
-            repl = self.run_command('serverStatus', arg=None, is_eval=False, member_id=member_id)['repl']
+            # The hello reply holds what serverStatus reports in 'repl'.
+            repl = snapshot.hello(self.member_id_to_host(member_id))
             logger.debug("member {member_id} repl info: {repl}".format(**locals()))
             for key in ('votes', 'tags', 'arbiterOnly', 'buildIndexes', 'hidden', 'priority', 'slaveDelay', 'secondaryDelaySecs', 'secondary'):
                 if key in repl:
@@ -410,12 +618,16 @@ class ReplicaSet(BaseModel):
         """
         server_id = self._servers.host_to_server_id(
             self.member_id_to_host(member_id))
-        return self._servers.command(server_id, command)
+        try:
+            return self._servers.command(server_id, command)
+        finally:
+            self.invalidate()
 
-    def members(self):
+    def members(self, snapshot=None):
         """return list of members information"""
+        snapshot = snapshot or self.snapshot()
         result = list()
-        for member in self.run_command(command="replSetGetStatus", is_eval=False)['members']:
+        for member in snapshot.members():
             result.append({
                 "_id": member['_id'],
                 "host": member["name"],
@@ -429,10 +641,9 @@ class ReplicaSet(BaseModel):
         host, port = self.connection().primary
         return "{host}:{port}".format(**locals())
 
-    def get_members_in_state(self, state):
+    def get_members_in_state(self, state, snapshot=None):
         """return all members of replica set in specific state"""
-        members = self.run_command(command='replSetGetStatus', is_eval=False)['members']
-        return [member['name'] for member in members if member['state'] == state]
+        return (snapshot or self.snapshot()).in_state(state)
 
     def connection(self, hostname=None, read_preference=pymongo.ReadPreference.PRIMARY, timeout=60):
         """Return MongoClient object, if hostname is given it is a directly connected client
@@ -457,27 +668,32 @@ class ReplicaSet(BaseModel):
         if self._require_api_version:
             kwargs["server_api"] = ServerApi(self._require_api_version)
         if hostname is None:
-            c = pymongo.MongoClient(
-                servers, replicaSet=self.repl_id,
-                read_preference=read_preference,
-                socketTimeoutMS=self.socket_timeout,
-                w=self._write_concern, fsync=True, **kwargs)
+            kwargs.update(replicaSet=self.repl_id,
+                          read_preference=read_preference)
         else:
-            c = pymongo.MongoClient(
-                servers, socketTimeoutMS=self.socket_timeout,
-                directConnection=True,
-                w=self._write_concern, fsync=True, **kwargs)
+            kwargs.update(directConnection=True)
+        kwargs.update(socketTimeoutMS=self.socket_timeout,
+                      w=self._write_concern, fsync=True,
+                      event_listeners=[self._topology_listener])
+
+        def create_client():
+            c = pymongo.MongoClient(servers, **kwargs)
+            try:
+                return connected(c)
+            except pymongo.errors.PyMongoError:
+                c.close()
+                raise
+
         while True:
             try:
-                connected(c)
-                return c
+                return ClientPool().get(servers, kwargs, create_client)
             except pymongo.errors.PyMongoError:
                 logger.exception("Error attempting to connect to: {servers}".format(**locals()))
                 if time.time() - t_start > timeout:
                     raise pymongo.errors.AutoReconnect("Couldn't connect while timeout {timeout} second".format(**locals()))
                 time.sleep(1)
 
-    def secondaries(self):
+    def secondaries(self, snapshot=None):
         """return list of secondaries members"""
         return [
             {
@@ -485,10 +701,10 @@ class ReplicaSet(BaseModel):
                 "host": member,
                 "server_id": self._servers.host_to_server_id(member)
             }
-            for member in self.get_members_in_state(SECONDARY_STATE)
+            for member in self.get_members_in_state(SECONDARY_STATE, snapshot)
         ]
 
-    def arbiters(self):
+    def arbiters(self, snapshot=None):
         """return list of arbiters"""
         return [
             {
@@ -496,39 +712,44 @@ class ReplicaSet(BaseModel):
                 "host": member,
                 "server_id": self._servers.host_to_server_id(member)
             }
-            for member in self.get_members_in_state(ARBITER_STATE)
+            for member in self.get_members_in_state(ARBITER_STATE, snapshot)
         ]
 
-    def hidden(self):
+    def hidden(self, snapshot=None):
         """return list of hidden members"""
-        members = [self.member_info(item["_id"]) for item in self.members()]
+        snapshot = snapshot or self.snapshot()
+        status = dict((member['_id'], member)
+                      for member in snapshot.members())
         result = []
-        for member in members:
-            if member['rsInfo'].get('hidden'):
-                server_id = member['server_id']
+        for member in snapshot.config_members():
+            if member.get('hidden') and member['_id'] in status:
+                server_id = self._servers.host_to_server_id(member['host'])
                 result.append({
                     '_id': member['_id'],
                     'host': self._servers.hostname(server_id),
                     'server_id': server_id})
         return result
 
-    def passives(self):
+    def passives(self, snapshot=None):
         """return list of passive servers"""
-        servers = self.run_command('ismaster').get('passives', [])
-        return [member for member in self.members() if member['host'] in servers]
+        snapshot = snapshot or self.snapshot()
+        servers = snapshot.primary_hello().get('passives', [])
+        return [member for member in self.members(snapshot)
+                if member['host'] in servers]
 
-    def servers(self):
+    def servers(self, snapshot=None):
         """return list of servers (not hidden nodes)"""
-        servers = self.run_command('ismaster').get('hosts', [])
-        return [member for member in self.members() if member['host'] in servers]
+        snapshot = snapshot or self.snapshot()
+        servers = snapshot.primary_hello().get('hosts', [])
+        return [member for member in self.members(snapshot)
+                if member['host'] in servers]
 
     def wait_while_reachable(self, servers, timeout=60):
         """wait while all servers be reachable
         Args:
             servers - list of servers
         """
-        t_start = time.time()
-        while True:
+        def reachable():
             try:
                 for server in servers:
                     # TODO: use state code to check if server is reachable
@@ -536,21 +757,17 @@ class ReplicaSet(BaseModel):
                         hostname=server, timeout=5).admin.command('ismaster')
                     logger.debug("server_info: {server_info}".format(server_info=server_info))
                     if int(server_info['ok']) != 1:
-                        raise pymongo.errors.OperationFailure("{server} is not reachable".format(**locals))
+                        raise pymongo.errors.OperationFailure("{server} is not reachable".format(**locals()))
                 return True
             except (KeyError, AttributeError, pymongo.errors.AutoReconnect, pymongo.errors.OperationFailure):
-                if time.time() - t_start > timeout:
-                    return False
-                time.sleep(0.1)
+                return False
+
+        return wait_until(reachable, timeout, self._topology_listener)
 
     def waiting_member_state(self, timeout=300):
         """Wait for all RS members to be in an acceptable state."""
-        t_start = time.time()
-        while not self.check_member_state():
-            if time.time() - t_start > timeout:
-                return False
-            time.sleep(0.1)
-        return True
+        return wait_until(self.check_member_state, timeout,
+                          self._topology_listener)
 
     def waiting_config_state(self, timeout=300):
         """waiting while real state equal config state
@@ -559,12 +776,8 @@ class ReplicaSet(BaseModel):
 
         return True if operation success otherwise False
         """
-        t_start = time.time()
-        while not self.check_config_state():
-            if time.time() - t_start > timeout:
-                return False
-            time.sleep(0.1)
-        return True
+        return wait_until(self.check_config_state, timeout,
+                          self._topology_listener)
 
     def check_member_state(self):
         """Verify that all RS members have an acceptable state."""
@@ -583,32 +796,87 @@ class ReplicaSet(BaseModel):
 
     def check_config_state(self):
         """Return True if real state equal config state otherwise False."""
+        diff = self.config_state_diff()
+        if diff:
+            logger.debug("members not matching config: {diff}".format(diff=diff))
+            return False
+        return True
+
+    def config_state_diff(self):
+        """Compare the state of every member with the replica set config.
+
+        A single replSetGetConfig and replSetGetStatus on the primary are
+        enough: a member that reports the config version (and term) of the
+        primary has applied every setting of that config. A member the
+        primary can't reach (health 0) has not converged.
+
+        return dict {member_id: {field: (expected, actual)}} describing the
+        members and fields which do not match the config yet
+        """
         config = self.config
         self.update_server_map(config)
+        status = self.run_command('replSetGetStatus')
+        members_status = dict(
+            (member['_id'], member) for member in status['members'])
+        diff = {}
         for member in config['members']:
-            cfg_member_info = self.default_params.copy()
-            cfg_member_info.update(member)
-            # Remove attributes we can't check.
-            for attr in ('priority', 'votes', 'tags', 'buildIndexes'):
-                cfg_member_info.pop(attr, None)
-            cfg_member_info['host'] = cfg_member_info['host'].lower()
-
-            real_member_info = self.default_params.copy()
-            info = self.member_info(member["_id"])
-            real_member_info["_id"] = info['_id']
-            member_hostname = self._servers.hostname(info['server_id'])
-            real_member_info["host"] = member_hostname.lower()
-            real_member_info.update(info['rsInfo'])
-            # Rename slaveDelay->secondaryDelaySecs to match SERVER-52349.
-            if 'secondaryDelaySecs' in cfg_member_info:
-                cfg_member_info.pop('slaveDelay', None)
-                real_member_info['secondaryDelaySecs'] = real_member_info.pop('slaveDelay', None)
-            logger.debug("real_member_info({member_id}): {info}".format(member_id=member['_id'], info=info))
-            for key in cfg_member_info:
-                if cfg_member_info[key] != real_member_info.get(key, None):
-                    logger.debug("{key}: {value1} ! = {value2}".format(key=key, value1=cfg_member_info[key], value2=real_member_info.get(key, None)))
-                    return False
-        return True
+            real = members_status.get(member['_id'])
+            if real is None:
+                diff[member['_id']] = {'_id': (member['_id'], None)}
+                continue
+            if 'configVersion' not in real:
+                # Servers before 3.2 don't report configVersion.
+                member_diff = self._member_config_diff(member)
+            else:
+                member_diff = self._member_status_diff(
+                    member, real, config.get('version'), config.get('term'))
+            if member_diff:
+                diff[member['_id']] = member_diff
+        return diff
+
+    def _member_status_diff(self, member, real, version, term):
+        """Compare one member's replSetGetStatus entry with its config."""
+        if real.get('health', 1) == 0:
+            # The primary reports the last state it saw from a member it
+            # can't reach, which says nothing about the current config.
+            return {'health': (1, 0)}
+        result = {}
+        expected = (member['host'].lower(), version,
+                    bool(member.get('arbiterOnly', False)))
+        actual = (real['name'].lower(), real['configVersion'],
+                  real['state'] == ARBITER_STATE)
+        for key, value1, value2 in zip(
+                ('host', 'configVersion', 'arbiterOnly'), expected, actual):
+            if value1 != value2:
+                result[key] = (value1, value2)
+        if term is not None and 'configTerm' in real and real['configTerm'] != term:
+            result['configTerm'] = (term, real['configTerm'])
+        return result
+
+    def _member_config_diff(self, member):
+        """Compare a member's serverStatus with its config."""
+        cfg_member_info = self.default_params.copy()
+        cfg_member_info.update(member)
+        # Remove attributes we can't check.
+        for attr in ('priority', 'votes', 'tags', 'buildIndexes'):
+            cfg_member_info.pop(attr, None)
+        cfg_member_info['host'] = cfg_member_info['host'].lower()
+
+        real_member_info = self.default_params.copy()
+        info = self.member_info(member["_id"])
+        real_member_info["_id"] = info['_id']
+        member_hostname = self._servers.hostname(info['server_id'])
+        real_member_info["host"] = member_hostname.lower()
+        real_member_info.update(info['rsInfo'])
+        # Rename slaveDelay->secondaryDelaySecs to match SERVER-52349.
+        if 'secondaryDelaySecs' in cfg_member_info:
+            cfg_member_info.pop('slaveDelay', None)
+            real_member_info['secondaryDelaySecs'] = real_member_info.pop('slaveDelay', None)
+        logger.debug("real_member_info({member_id}): {info}".format(member_id=member['_id'], info=info))
+        return dict(
+            (key, (cfg_member_info[key], real_member_info.get(key, None)))
+            for key in cfg_member_info
+            if cfg_member_info[key] != real_member_info.get(key, None))
 
     def server_instances(self):
         servers = []
@@ -619,11 +887,12 @@ class ReplicaSet(BaseModel):
 
     def restart(self, timeout=300, config_callback=None):
         """Restart each member of the replica set."""
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(s.restart, timeout, config_callback)
-                       for s in self.server_instances()]
-            for f in futures:
-                f.result()
+        self.invalidate()
+        tasks = [Scheduler().submit(SPAWN, s.restart, timeout, config_callback)
+                 for s in self.server_instances()]
+        for task in tasks:
+            task.result()
+        self.invalidate()
         self.waiting_member_state()
 
 
@@ -658,12 +927,13 @@ class ReplicaSets(Singleton, Container):
         self[repl.repl_id] = repl
         return repl.repl_id
 
-    def info(self, repl_id):
+    def info(self, repl_id, fields=None):
         """return information about replica set
         Args:
             repl_id - replica set identity
+            fields - projection of the info, None for all of it
         """
-        return self[repl_id].info()
+        return self[repl_id].info(fields)
 
     def primary(self, repl_id):
         """find and return primary hostname
@@ -674,14 +944,18 @@ class ReplicaSets(Singleton, Container):
         primary = repl.primary()
         return repl.member_info(repl.host2id(primary))
 
-    def remove(self, repl_id):
+    def remove(self, repl_id, fast=False):
         """remove replica set with kill members
         Args:
             repl_id - replica set identity
+            fast - kill all members at once instead of shutting them down
         return True if operation success otherwise False
         """
-        repl = self._storage.pop(repl_id)
-        repl.cleanup()
+        repl = self._storage[repl_id]
+        del self[repl_id]
+        hosts = list(repl.server_map.values())
+        repl.cleanup(fast)
+        ClientPool().invalidate(*hosts)
         del(repl)
 
     def members(self, repl_id):
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""One pool of worker threads for all the parallel work of the daemon.
+
+Tasks have a kind, and each kind has a limit on how many of its tasks run
+at once: starting processes is limited by the CPUs of the host, shutting
+them down and running commands less so. Limits only apply to tasks that
+don't submit tasks of their own, the others have no kind.
+
+Tasks run in a copy of the context of the thread that submitted them, so
+context variables like the current job follow the work to the workers.
+
+Waiting without a timeout for the result of a task that no worker started
+yet runs it in the waiting thread. A task that waits for its subtasks never needs another
+worker, so nested work (a sharded cluster creating replica sets creating
+servers) can't deadlock the pool.
+"""
+
+import concurrent.futures
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+# Kinds of tasks.
+SPAWN = 'spawn'  # start or restart a mongod/mongos
+SHUTDOWN = 'shutdown'  # stop a mongod/mongos
+COMMAND = 'command'  # run a command on a server
+
+_CPUS = os.cpu_count() or 1
+
+
+class Task(concurrent.futures.Future):
+    """A Future that runs in the thread waiting for it if it hasn't
+    started yet."""
+
+    def __init__(self, scheduler, kind, fn, args, kwargs):
+        super(Task, self).__init__()
+        self.kind = kind
+        self.submitted = time.time()
+        self._scheduler = scheduler
+        self._call = (fn, args, kwargs)
+        self._context = contextvars.copy_context()
+        self._claim_lock = threading.Lock()
+        self._claimed = False
+
+    def _claim(self):
+        with self._claim_lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def run(self, inline=False):
+        """Run the task unless some thread already did.
+        return True if it ran in this thread"""
+        if not self._claim():
+            return False
+        self._scheduler._execute(self, inline)
+        return True
+
+    def result(self, timeout=None):
+        """Run the task here if no worker started it yet, or wait for it.
+        With a timeout the task is left to the workers, so that the call
+        returns in time."""
+        if timeout is None:
+            self.run(inline=True)
+        return super(Task, self).result(timeout)
+
+    def exception(self, timeout=None):
+        if timeout is None:
+            self.run(inline=True)
+        return super(Task, self).exception(timeout)
+
+
+def as_completed(tasks):
+    """Yield tasks as they complete, running the ones no worker started
+    yet instead of waiting for them."""
+    pending = set(tasks)
+    while pending:
+        done = [task for task in pending if task.done()]
+        if not done:
+            for task in pending:
+                if task.run(inline=True):
+                    break
+            else:
+                concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            continue
+        for task in done:
+            pending.discard(task)
+            yield task
+
+
+class Scheduler(Singleton):
+    """Shared, bounded pool of worker threads."""
+
+    max_workers = 32
+    # Tasks of a kind that may run at once.
+    limits = {SPAWN: max(4, 2 * _CPUS),
+              SHUTDOWN: max(8, 4 * _CPUS),
+              COMMAND: max(16, 8 * _CPUS)}
+
+    _lock = threading.Lock()
+    _queue = queue.Queue()
+    _workers = 0
+    _idle = 0
+    _semaphores = {}
+    _stats = {}
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs).
+        Args:
+            kind - SPAWN, SHUTDOWN, COMMAND, or None for tasks that
+                   submit tasks themselves
+        return Task"""
+        task = Task(self, kind, fn, args, kwargs)
+        with self._lock:
+            stats = self.__stats(kind)
+            stats['submitted'] += 1
+            stats['queued'] += 1
+            start_worker = (self._idle < self._queue.qsize() + 1 and
+                            self._workers < self.max_workers)
+            if start_worker:
+                self._workers += 1
+        self._queue.put(task)
+        if start_worker:
+            thread = threading.Thread(target=self._work,
+                                      name='scheduler-worker')
+            thread.daemon = True
+            thread.start()
+        return task
+
+    def map(self, kind, fn, iterable):
+        """return the list of fn(item) for every item, computed in
+        parallel"""
+        tasks = [self.submit(kind, fn, item) for item in iterable]
+        return [task.result() for task in tasks]
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            task = self._queue.get()
+            with self._lock:
+                self._idle -= 1
+            task.run()
+
+    def __stats(self, kind):
+        # Called with the lock held.
+        key = kind or 'other'
+        if key not in self._stats:
+            self._stats[key] = {
+                'submitted': 0, 'completed': 0, 'failed': 0, 'stolen': 0,
+                'queued': 0, 'running': 0, 'wait_time': 0.0,
+                'max_wait_time': 0.0, 'run_time': 0.0}
+        return self._stats[key]
+
+    def _semaphore(self, kind):
+        limit = self.limits.get(kind)
+        if limit is None:
+            return None
+        with self._lock:
+            semaphore = self._semaphores.get(kind)
+            if semaphore is None or semaphore[0] != limit:
+                semaphore = (limit, threading.Semaphore(limit))
+                self._semaphores[kind] = semaphore
+        return semaphore[1]
+
+    def _execute(self, task, inline):
+        if not task.set_running_or_notify_cancel():
+            with self._lock:
+                self.__stats(task.kind)['queued'] -= 1
+            return
+        semaphore = self._semaphore(task.kind)
+        if semaphore is not None:
+            semaphore.acquire()
+        started = time.time()
+        wait_time = started - task.submitted
+        with self._lock:
+            stats = self.__stats(task.kind)
+            stats['queued'] -= 1
+            stats['running'] += 1
+            stats['stolen'] += int(inline)
+            stats['wait_time'] += wait_time
+            stats['max_wait_time'] = max(stats['max_wait_time'], wait_time)
+        fn, args, kwargs = task._call
+        failed = False
+        try:
+            result = task._context.run(fn, *args, **kwargs)
+        except BaseException as exc:
+            failed = True
+            task.set_exception(exc)
+        else:
+            task.set_result(result)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+            with self._lock:
+                stats = self.__stats(task.kind)
+                stats['running'] -= 1
+                stats['completed'] += 1
+                stats['failed'] += int(failed)
+                stats['run_time'] += time.time() - started
+            # Don't keep arguments and results alive through the queue.
+            task._call = task._context = None
+
+    def info(self):
+        with self._lock:
+            kinds = {}
+            for kind, stats in self._stats.items():
+                stats = dict(stats)
+                started = stats['completed'] + stats['running']
+                stats['avg_wait_time'] = (
+                    stats['wait_time'] / started if started else 0.0)
+                stats['avg_run_time'] = (
+                    stats['run_time'] / stats['completed']
+                    if stats['completed'] else 0.0)
+                stats['limit'] = self.limits.get(kind)
+                kinds[kind] = stats
+            return {'workers': self._workers,
+                    'idle': self._idle,
+                    'max_workers': self.max_workers,
+                    'queue_depth': sum(stats['queued']
+                                       for stats in self._stats.values()),
+                    'kinds': kinds}
@@ -2,6 +2,7 @@
 import argparse
 import json
 import logging
+import logging.handlers
 import os.path
 import signal
 import socket
@@ -12,12 +13,22 @@ import traceback
 from bson import SON
 
 from mongo_orchestration import __version__
+from mongo_orchestration.admission import Admission
+from mongo_orchestration.capacity import Capacity
 from mongo_orchestration.common import (
     BaseModel,
     DEFAULT_BIND, DEFAULT_PORT, DEFAULT_SERVER, DEFAULT_SOCKET_TIMEOUT,
-    PID_FILE, LOG_FILE, LOGGING_FORMAT)
+    PID_FILE, LOG_BACKUP_COUNT, LOG_FILE, LOG_MAX_BYTES, LOGGING_FORMAT,
+    STATE_FILE, TEMPLATES_DIR, VERSIONS_FILE)
 from mongo_orchestration.daemon import Daemon
-from mongo_orchestration.servers import Server
+from mongo_orchestration.orphans import Orphans
+from mongo_orchestration.placement import Placement
+from mongo_orchestration.process import PidRegistry
+from mongo_orchestration.servers import Server, Servers
+from mongo_orchestration.templates import DbpathTemplates
+from mongo_orchestration.versions import BinaryVersions
+from mongo_orchestration.trash import Trash
+from mongo_orchestration.warm_pool import WarmPool
 
 # How many times to attempt connecting to mongo-orchestration server.
 CONNECT_ATTEMPTS = 5
@@ -55,6 +66,26 @@ def read_env(argv=None):
                         type=int, default=DEFAULT_SOCKET_TIMEOUT)
     parser.add_argument('--pidfile', action='store', type=str, dest='pidfile',
                         default=PID_FILE)
+    parser.add_argument('--persist-state', action='store_true',
+                        dest='persist_state', default=False,
+                        help='journal running processes and re-adopt them '
+                             'when the daemon restarts')
+    parser.add_argument('--state-file', action='store', type=str,
+                        dest='state_file', default=STATE_FILE)
+    parser.add_argument('--dbpath-templates', action='store_true',
+                        dest='dbpath_templates', default=False,
+                        help='start replica sets from copies of captured '
+                             'dbpaths instead of initiating them')
+    parser.add_argument('--templates-dir', action='store', type=str,
+                        dest='templates_dir', default=TEMPLATES_DIR)
+    parser.add_argument('--placement', action='store_true',
+                        dest='placement', default=False,
+                        help='bind the processes of every cluster to a set '
+                             'of CPUs of their own')
+    parser.add_argument('--auth-bootstrap', action='store_true',
+                        dest='auth_bootstrap', default=False,
+                        help='start processes with auth and create the first '
+                             'user through the localhost exception')
 
     cli_args = parser.parse_args(argv)
 
@@ -76,6 +107,10 @@ def read_env(argv=None):
                   % (cli_args.env, cli_args.config))
             sys.exit(1)
         cli_args.releases = releases
+        cli_args.warm_pool = config.get('warm_pool', {})
+        cli_args.admission = config.get('admission', {})
+        cli_args.capacity = config.get('capacity', {})
+        cli_args.placement_config = config.get('placement', {})
         return cli_args
     except (IOError):
         print("config file not found")
@@ -85,10 +120,31 @@ def read_env(argv=None):
         sys.exit(1)
 
 
-def setup(releases, default_release):
+def setup(releases, default_release, state_file=None, warm_pool=None,
+          templates_dir=None, admission=None, capacity=None,
+          placement=None):
     """setup storages"""
-    from mongo_orchestration import set_releases, cleanup_storage
+    from mongo_orchestration import (
+        set_releases, cleanup_storage, restore_storage)
+    # Reuse binary versions resolved by previous runs.
+    BinaryVersions().load(VERSIONS_FILE)
     set_releases(releases, default_release)
+    if templates_dir:
+        DbpathTemplates().enable(templates_dir)
+    if state_file:
+        restore_storage(state_file)
+    # Terminate what a crashed run left behind and nobody re-adopted.
+    Orphans().reap(PidRegistry().open(Servers.pids_file))
+    if capacity:
+        Capacity().configure(capacity)
+    if placement:
+        Placement().configure(placement)
+    if admission:
+        Admission().configure(admission)
+    if warm_pool:
+        WarmPool().configure(warm_pool)
+    # Delete dbpaths a previous run left in the trash.
+    Trash().adopt()
     signal.signal(signal.SIGTERM, cleanup_storage)
     signal.signal(signal.SIGINT, cleanup_storage)
 
@@ -99,7 +155,8 @@ def get_app():
     default_app.push()
     for module in ("mongo_orchestration.apps.servers",
                    "mongo_orchestration.apps.replica_sets",
-                   "mongo_orchestration.apps.sharded_clusters"):
+                   "mongo_orchestration.apps.sharded_clusters",
+                   "mongo_orchestration.apps.jobs"):
         __import__(module)
     app = default_app.pop()
     return app
@@ -115,8 +172,18 @@ class MyDaemon(Daemon):
         log = logging.getLogger(__name__)
 
         from bottle import run
-        setup(getattr(self.args, 'releases', {}), self.args.env)
+        placement = getattr(self.args, 'placement_config', {})
+        if getattr(self.args, 'placement', False):
+            placement = dict(placement, enabled=True)
+        setup(getattr(self.args, 'releases', {}), self.args.env,
+              self.args.persist_state and self.args.state_file,
+              getattr(self.args, 'warm_pool', {}),
+              self.args.dbpath_templates and self.args.templates_dir,
+              getattr(self.args, 'admission', {}),
+              getattr(self.args, 'capacity', {}),
+              placement)
         BaseModel.socket_timeout = self.args.socket_timeout
+        BaseModel.auth_bootstrap = self.args.auth_bootstrap
         if self.args.command in ('start', 'restart'):
             print("Starting Mongo Orchestration on port %d..." % self.args.port)
             try:
@@ -150,8 +217,10 @@ def main(argv=None):
     args = read_env(argv)
     Server.enable_majority_read_concern = args.enable_majority_read_concern
     # Log both to STDOUT and the log file.
-    logging.basicConfig(level=logging.DEBUG, filename=LOG_FILE,
-                        format=LOGGING_FORMAT)
+    logging.basicConfig(
+        level=logging.DEBUG, format=LOGGING_FORMAT,
+        handlers=[logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)])
     log = logging.getLogger(__name__)
 
     daemon = MyDaemon(os.path.abspath(args.pidfile), timeout=5,
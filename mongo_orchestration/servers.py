@@ -18,9 +18,8 @@ import errno
 import logging
 import os
 import platform
-import re
-import subprocess
-import tempfile
+import threading
+import time
 
 from uuid import uuid4
 
@@ -28,14 +27,20 @@ import pymongo
 from pymongo.errors import ConnectionFailure, PyMongoError
 from pymongo.server_api import ServerApi
 
-from mongo_orchestration import process
+from mongo_orchestration import logs, process
+from mongo_orchestration.admission import Admission
+from mongo_orchestration.capacity import Capacity
 from mongo_orchestration.common import (
     BaseModel, DEFAULT_SUBJECT, DEFAULT_SSL_OPTIONS, connected, LOG_FILE,
-    orchestration_mkdtemp)
+    only_x509, orchestration_mkdtemp, PIDS_FILE)
 from mongo_orchestration.compat import reraise
-from mongo_orchestration.errors import ServersError, TimeoutError
+from mongo_orchestration.connections import ClientPool
+from mongo_orchestration.errors import (
+    ServersError, StartupError, TimeoutError)
+from mongo_orchestration.projection import wants
 from mongo_orchestration.singleton import Singleton
 from mongo_orchestration.container import Container
+from mongo_orchestration.versions import BinaryVersions, VERSION_PATTERN
 
 logger = logging.getLogger(__name__)
 
@@ -48,12 +53,15 @@ class Server(BaseModel):
 
     # default params for all mongo instances
     mongod_default = {"oplogSize": 100, "logappend": True, "verbose": "v"}
+    # How many times the first start may move to a new port when the one
+    # it was given turns out to be in use.
+    relaunch_attempts = 3
+    # How long info() reuses the statuses (primary, mongos) it read, in
+    # seconds. The buildinfo is kept as long as the process lives.
+    info_ttl = 1.0
 
     # regular expression matching MongoDB versions
-    version_patt = re.compile(
-        r'(?:db version v?|MongoS version v?|mongos db version v?)'
-        r'(?P<version>(\d+\.)+\d+)',
-        re.IGNORECASE)
+    version_patt = VERSION_PATTERN
 
     def __init_db(self, dbpath):
         if not dbpath:
@@ -108,6 +116,11 @@ class Server(BaseModel):
         cfg = self.mongod_default.copy()
         cfg.update(params)
 
+        # Share the host memory with the other mongods, before anything
+        # is created in case the budget is spent.
+        if self.version >= (3, 0):
+            Capacity().size_cache(cfg)
+
         # create db folder
         cfg['dbpath'] = self.__init_db(cfg.get('dbpath', None))
 
@@ -121,9 +134,9 @@ class Server(BaseModel):
             'logpath', os.path.join(cfg['dbpath'], 'mongod.log'))
         self.__init_logpath(logpath)
 
-        # find open port
+        # find open port, held by a placeholder until mongod binds it
         if 'port' not in cfg:
-            cfg['port'] = process.PortPool().port(check=True)
+            cfg['port'] = process.PortPool().port(check=True, reserve=True)
 
         self.__init_config_params(cfg)
 
@@ -161,14 +174,15 @@ class Server(BaseModel):
             cfg['keyFile'] = self.key_file
 
         if 'port' not in cfg:
-            cfg['port'] = process.PortPool().port(check=True)
+            cfg['port'] = process.PortPool().port(check=True, reserve=True)
 
         self.__init_config_params(cfg)
 
         return process.write_config(cfg), cfg
 
     def __init__(self, name, procParams, sslParams={}, auth_key=None,
-                 login='', password='', auth_source='admin', require_api_version=None):
+                 login='', password='', auth_source='admin', require_api_version=None,
+                 auth_bootstrap=None, process_group=None):
         """Args:
             name - name of process (mongod or mongos)
             procParams - dictionary with params for mongo process
@@ -177,6 +191,10 @@ class Server(BaseModel):
             password - password
             auth_source - the auth source database
             require_api_version - whether to require a stable api version
+            auth_bootstrap - start with auth and create the user through
+                             the localhost exception, None for the default
+            process_group - name of the process group shared with the
+                            other processes of a cluster
         """
         logger.debug("Server.__init__({name}, {procParams}, {sslParams}, {auth_key}, {login}, {password})".format(**locals()))
         self.name = name  # name of process
@@ -193,15 +211,22 @@ class Server(BaseModel):
         self.ssl_params = sslParams
         self.restart_required = self.login or self.auth_key
         self.require_api_version = require_api_version
+        self.process_group = process_group
         self.__version = None
+        self._init_info_cache()
 
         if self.ssl_params:
             self.kwargs.update(DEFAULT_SSL_OPTIONS)
 
         proc_name = os.path.split(name)[1].lower()
         procParams.update(sslParams)
+        # Ports we picked can change, ports from the caller can't.
+        self.port_movable = 'port' not in procParams
+        self.x509_extra_user = bool(login) and only_x509(procParams)
+        self.auth_bootstrap = self._auth_bootstrap_enabled(auth_bootstrap)
         if proc_name.startswith('mongod'):
-            self.config_path, self.cfg = self.__init_mongod(procParams)
+            self.config_path, self.cfg = self.__init_mongod(
+                procParams, add_auth=self.auth_bootstrap)
 
         elif proc_name.startswith('mongos'):
             self.is_mongos = True
@@ -212,6 +237,26 @@ class Server(BaseModel):
 
         self.port = self.cfg.get('port', None)  # connection port
 
+    _state_attrs = ('name', 'login', 'auth_source', 'password', 'auth_key',
+                    'pid', 'host', 'hostname', 'port', 'is_mongos', 'kwargs',
+                    'ssl_params', 'restart_required', 'x509_extra_user',
+                    'require_api_version', 'config_path', 'cfg',
+                    'auth_bootstrap', 'port_movable', 'process_group')
+
+    def _restore_state(self):
+        self.__version = None
+        self._init_info_cache()
+        self.proc = None
+        if process.pid_matches(self.pid, self.config_path):
+            logger.info("Adopting %s process with pid %d", self.name, self.pid)
+            self.proc = process.AdoptedProcess(self.pid)
+            process.ProcessWatcher().watch(self.proc)
+            process.ProcessGroups().adopt(self.process_group, self.pid)
+        else:
+            self.pid = None
+        if self.port:
+            process.PortPool().claim(self.port)
+
     @property
     def connection(self):
         """return authenticated connection"""
@@ -226,30 +271,27 @@ class Server(BaseModel):
                 kwargs["password"] = self.password
         if self.require_api_version:
             kwargs["server_api"] = ServerApi(self.require_api_version)
-        c = pymongo.MongoClient(
-            self.hostname, fsync=True, directConnection=True,
-            socketTimeoutMS=self.socket_timeout, **kwargs)
-        connected(c)
-        if self.require_api_version:
-            c.admin.command("setParameter", 1, requireApiVersion=int(self.require_api_version))
-        return c
+
+        def create_client():
+            c = pymongo.MongoClient(
+                self.hostname, fsync=True, directConnection=True,
+                socketTimeoutMS=self.socket_timeout, **kwargs)
+            try:
+                connected(c)
+                if self.require_api_version:
+                    c.admin.command("setParameter", 1, requireApiVersion=int(self.require_api_version))
+            except PyMongoError:
+                c.close()
+                raise
+            return c
+
+        return ClientPool().get(self.hostname, kwargs, create_client)
 
     @property
     def version(self):
         """Get the version of MongoDB that this Server runs as a tuple."""
         if not self.__version:
-            command = (self.name, '--version')
-            logger.debug(command)
-            stdout, _ = subprocess.Popen(
-                command, stdout=subprocess.PIPE).communicate()
-            version_output = str(stdout)
-            match = re.search(self.version_patt, version_output)
-            if match is None:
-                raise ServersError(
-                    'Could not determine version of %s from string: %s'
-                    % (self.name, version_output))
-            version_string = match.group('version')
-            self.__version = tuple(map(int, version_string.split('.')))
+            self.__version = BinaryVersions().version(self.name)
         return self.__version
 
     def freeze(self, timeout=60):
@@ -295,38 +337,106 @@ class Server(BaseModel):
     def is_alive(self):
         return process.proc_alive(self.proc)
 
-    def info(self):
-        """return info about server as dict object"""
+    def info(self, fields=None):
+        """return info about server as dict object
+        Args:
+            fields - projection of the info, None for all of it
+        """
         proc_info = {"name": self.name,
                      "params": self.cfg,
                      "alive": self.is_alive,
                      "optfile": self.config_path}
         if self.is_alive:
             proc_info['pid'] = self.proc.pid
+            placement = process.Placement().of(self.proc.pid)
+            if placement is not None:
+                proc_info['placement'] = placement
         logger.debug("proc_info: {proc_info}".format(**locals()))
         mongodb_uri = ''
         server_info = {}
         status_info = {}
-        if self.hostname and self.cfg.get('port', None):
-            try:
-                c = self.connection
-                server_info = c.server_info()
-                logger.debug("server_info: {server_info}".format(**locals()))
+        age = {}
+        if (self.hostname and self.cfg.get('port', None) and
+                wants(fields, 'mongodb_uri', 'statuses', 'serverInfo',
+                      'infoAge')):
+            server_info, status_info, age = self._connection_info()
+            if server_info:
                 mongodb_uri = 'mongodb://' + self.hostname
-                status_info = {"primary": c.is_primary, "mongos": c.is_mongos}
-                logger.debug("status_info: {status_info}".format(**locals()))
-            except (pymongo.errors.AutoReconnect, pymongo.errors.OperationFailure, pymongo.errors.ConnectionFailure):
-                server_info = {}
-                status_info = {}
 
         result = {"mongodb_uri": mongodb_uri, "statuses": status_info,
                   "serverInfo": server_info, "procInfo": proc_info,
-                  "orchestration": 'servers'}
+                  "orchestration": 'servers', "infoAge": age}
         if self.login:
             result['mongodb_auth_uri'] = self.mongodb_auth_uri(self.hostname)
         logger.debug("return {result}".format(result=result))
         return result
 
+    def _init_info_cache(self):
+        # Not part of the saved state, a restored server reads it again.
+        # The lock only guards the cache, never a call to the server.
+        self._info_lock = threading.Lock()
+        # tuple (pid, time, buildinfo)
+        self._cached_server_info = None
+        # tuple ((pid, alive), time, statuses), statuses is None when the
+        # server didn't answer
+        self._cached_statuses = None
+        # Bumped by invalidate_info(), a read started before is not cached.
+        self._info_generation = 0
+
+    def invalidate_info(self):
+        """Read the buildinfo and statuses again on the next info()."""
+        with self._info_lock:
+            self._cached_server_info = None
+            self._cached_statuses = None
+            self._info_generation += 1
+
+    def _connection_info(self):
+        """return tuple (buildinfo, statuses, ages in seconds) from the
+        cache, read from the server what is missing or too old"""
+        key = (self.pid, self.is_alive)
+        with self._info_lock:
+            server_info = self._cached_server_info
+            if server_info is not None and server_info[0] != key[0]:
+                server_info = None
+            statuses = self._cached_statuses
+            if statuses is not None and (
+                    statuses[0] != key or
+                    time.time() - statuses[1] >= self.info_ttl):
+                statuses = None
+            generation = self._info_generation
+        if statuses is None:
+            server_info, statuses = self._read_info(key, server_info)
+            with self._info_lock:
+                if generation == self._info_generation:
+                    self._cached_statuses = statuses
+                    if statuses[2] is not None:
+                        self._cached_server_info = server_info
+        if statuses[2] is None:
+            return {}, {}, {}
+        now = time.time()
+        return (server_info[2], statuses[2],
+                {"serverInfo": round(now - server_info[1], 3),
+                 "statuses": round(now - statuses[1], 3)})
+
+    def _read_info(self, key, server_info):
+        """return tuple (buildinfo, statuses) read from the server,
+        server_info is read only if it is None"""
+        now = time.time()
+        try:
+            c = self.connection
+            if server_info is None:
+                server_info = (key[0], now, c.server_info())
+                logger.debug("server_info: %s", server_info[2])
+            statuses = (key, now, {"primary": c.is_primary,
+                                   "mongos": c.is_mongos})
+            logger.debug("status_info: %s", statuses[2])
+        except (pymongo.errors.AutoReconnect,
+                pymongo.errors.OperationFailure,
+                pymongo.errors.ConnectionFailure):
+            # Don't ask a server that is down again right away.
+            statuses = (key, now, None)
+        return server_info, statuses
+
     @property
     def _is_locked(self):
         lock_file = os.path.join(self.cfg['dbpath'], 'mongod.lock')
@@ -347,6 +457,7 @@ class Server(BaseModel):
         return True of False"""
         if self.is_alive:
             return True
+        self.invalidate_info()
         try:
             dbpath = self.cfg.get('dbpath')
             if dbpath and self._is_locked:
@@ -354,13 +465,28 @@ class Server(BaseModel):
                 logger.info("Performing repair on locked dbpath %s", dbpath)
                 process.repair_mongo(self.name, self.cfg['dbpath'])
 
-            self.proc, self.hostname = process.mprocess(
-                self.name, self.config_path, self.cfg.get('port', None),
-                timeout)
+            for attempt in range(self.relaunch_attempts):
+                try:
+                    self.proc, self.hostname = process.mprocess(
+                        self.name, self.config_path,
+                        self.cfg.get('port', None), timeout,
+                        self.cfg.get('logpath'), self.process_group)
+                    break
+                except StartupError as exc:
+                    # Nobody knows the host of a server that never started.
+                    if not (exc.address_in_use and self.hostname is None and
+                            self.port_movable and
+                            attempt + 1 < self.relaunch_attempts):
+                        raise
+                    self.__move_port()
             self.pid = self.proc.pid
+            # mongod has bound the port, drop our placeholder, if any.
+            process.PortPool().release_placeholder(self.port)
             logger.debug("pid={pid}, hostname={hostname}".format(pid=self.pid, hostname=self.hostname))
             self.host = self.hostname.split(':')[0]
             self.port = int(self.hostname.split(':')[1])
+            # Record the new pid and options file.
+            Servers().save_server_state(self)
 
             # Wait for Server to respond to isMaster.
             # Only try 6 times, each ConnectionFailure is 30 seconds.
@@ -375,7 +501,7 @@ class Server(BaseModel):
                 raise TimeoutError(
                     "Server did not respond to 'isMaster' after %d attempts."
                     % max_attempts)
-        except (OSError, TimeoutError):
+        except (OSError, StartupError, TimeoutError):
             logpath = self.cfg.get('logpath')
             if logpath and not os.path.exists(logpath):
                  logger.exception(
@@ -387,10 +513,11 @@ class Server(BaseModel):
             if logpath:
                 # Copy the server logs into the mongo-orchestration logs.
                 logger.error(
-                    "Could not start Server. Please find server log below.\n"
-                    "=====================================================")
-                with open(logpath) as lp:
-                    logger.error(lp.read())
+                    "Could not start Server. Please find the last %d lines "
+                    "of the server log below.\n"
+                    "=====================================================",
+                    logs.FAILURE_TAIL_LINES)
+                logger.error(logs.tail(logpath))
             else:
                 logger.exception(
                     'Could not start Server, and no logpath was provided!')
@@ -404,6 +531,11 @@ class Server(BaseModel):
             if self.login:
                 # Add users to the appropriate database.
                 self._add_users()
+            if self.auth_bootstrap:
+                # Auth is already on, the users were added through the
+                # localhost exception.
+                self.restart_required = False
+                return True
             self.stop()
 
             # Restart with keyfile and auth.
@@ -418,6 +550,16 @@ class Server(BaseModel):
 
         return True
 
+    def __move_port(self):
+        """Give this server, which never started, a new port."""
+        old_port = self.cfg['port']
+        process.PortPool().mark_closed(old_port)
+        self.cfg['port'] = self.port = process.PortPool().port(
+            check=True, reserve=True)
+        logger.warning("Port %d is in use, relaunching %s on port %d",
+                       old_port, self.name, self.port)
+        process.write_config(self.cfg, self.config_path)
+
     def shutdown(self):
         """Send shutdown command and wait for the process to exit."""
         # Return early if this server has already exited.
@@ -459,6 +601,18 @@ class Server(BaseModel):
             logger.info("Killing %s with signal, shutdown command failed: %r",
                         self.name, exc)
             return process.kill_mprocess(self.proc)
+        finally:
+            # Cached clients can't outlive the process they are talking to.
+            ClientPool().invalidate(self.hostname)
+            self.invalidate_info()
+
+    def kill(self):
+        """kill server with SIGKILL, without a clean shutdown"""
+        try:
+            return process.kill_mprocess(self.proc, fast=True)
+        finally:
+            ClientPool().invalidate(self.hostname)
+            self.invalidate_info()
 
     def restart(self, timeout=300, config_callback=None):
         """restart server: stop() and start()
@@ -473,20 +627,14 @@ class Server(BaseModel):
     def reset(self):
         """Ensure Server has started and responds to isMaster."""
         self.start()
+        self.invalidate_info()
         return self.info()
 
     def _add_users(self):
         try:
-            # Determine authentication mechanisms.
-            set_params = self.cfg.get('setParameter', {})
-            auth_mechs = set_params.get(
-                'authenticationMechanisms', '').split(',')
-
             # We need to add an additional user if MONGODB-X509 is the only auth
             # mechanism.
-            self.x509_extra_user = False
-            if len(auth_mechs) == 1 and auth_mechs[0] == 'MONGODB-X509':
-                self.x509_extra_user = True
+            self.x509_extra_user = only_x509(self.cfg)
 
             super(Server, self)._add_users(self.connection[self.auth_source],
                                            self.version)
@@ -498,14 +646,19 @@ class Server(BaseModel):
     def cleanup(self):
         """remove server data"""
         process.cleanup_mprocess(self.config_path, self.cfg)
+        if self.cfg.get('port'):
+            process.PortPool().release_port(self.cfg['port'])
 
 
 class Servers(Singleton, Container):
     """ Servers is a dict-like collection for Server objects"""
     _name = 'servers'
     _obj_type = Server
+    # process_group is the cluster a server belongs to.
+    _indexed_attrs = ('hostname', 'port', 'pid', 'process_group')
     releases = {}
-    pids_file = tempfile.mktemp(prefix="mongo-")
+    # Registry of the processes we started, see process.PidRegistry.
+    pids_file = PIDS_FILE
 
     def __getitem__(self, key):
         return self.info(key)
@@ -518,7 +671,8 @@ class Servers(Singleton, Container):
     def create(self, name, procParams, sslParams={},
                auth_key=None, login=None, password=None,
                auth_source='admin', timeout=300, autostart=True,
-               server_id=None, version=None, require_api_version=None):
+               server_id=None, version=None, require_api_version=None,
+               auth_bootstrap=None, process_group=None):
         """create new server
         Args:
            name - process name or path
@@ -531,6 +685,9 @@ class Servers(Singleton, Container):
            server_id - the server_id to use, defaults to a new uuid
            version - the version of the server to use use
            require_api_version - the stable api version to require
+           auth_bootstrap - create the user through the localhost exception
+                            instead of restarting with auth
+           process_group - name of the process group of the server's cluster
         Return server_id
            where server_id - id which can use to take the server from servers collection
         """
@@ -542,28 +699,48 @@ class Servers(Singleton, Container):
 
         bin_path = self.bin_path(version)
         server = Server(os.path.join(bin_path, name), procParams, sslParams,
-                        auth_key, login, password, auth_source, require_api_version=require_api_version)
+                        auth_key, login, password, auth_source,
+                        require_api_version=require_api_version,
+                        auth_bootstrap=auth_bootstrap,
+                        process_group=process_group)
         if autostart:
-            server.start(timeout)
+            try:
+                server.start(timeout)
+            except Exception:
+                # Give back the port and the data of a server that didn't
+                # start.
+                server.kill()
+                server.cleanup()
+                raise
         self[server_id] = server
+        Admission().started(server_id, server)
         return server_id
 
     def restart(self, server_id, timeout=300, config_callback=None):
-        self._storage[server_id].restart(timeout, config_callback)
+        try:
+            self._storage[server_id].restart(timeout, config_callback)
+        finally:
+            self.reindex(server_id)
 
-    def remove(self, server_id):
+    def remove(self, server_id, fast=False):
         """remove server and data stuff
         Args:
             server_id - server identity
+            fast - kill the process instead of shutting it down
         """
-        server = self._storage.pop(server_id)
-        server.stop()
+        server = self._storage[server_id]
+        del self[server_id]
+        if fast:
+            server.kill()
+        else:
+            server.stop()
         server.cleanup()
+        ClientPool().invalidate(server.hostname)
 
     def db_command(self, server_id, command, arg=None, is_eval=False):
         server = self._storage[server_id]
         result = server.run_command(command, arg, is_eval)
-        self._storage[server_id] = server
+        self[server_id] = server
         return result
 
     def command(self, server_id, command, *args):
@@ -581,15 +758,16 @@ class Servers(Singleton, Container):
         except AttributeError:
             raise ValueError("Cannot issue the command %r to server %s"
                              % (command, server_id))
-        self._storage[server_id] = server
+        self[server_id] = server
         return result
 
-    def info(self, server_id):
+    def info(self, server_id, fields=None):
         """return dicionary object with info about server
         Args:
             server_id - server identity
+            fields - projection of the info, None for all of it
         """
-        result = self._storage[server_id].info()
+        result = self._storage[server_id].info(fields)
         result['id'] = server_id
         return result
 
@@ -600,13 +778,37 @@ class Servers(Singleton, Container):
         """
         return self._storage[server_id].version
 
+    def save_server_state(self, server):
+        """Record a Server whose process was (re)started."""
+        server_id = self.key_of(server)
+        if server_id is not None:
+            self.reindex(server_id)
+            self.save_state(server_id)
+
     def hostname(self, server_id):
         return self._storage[server_id].hostname
 
+    def logpath(self, server_id):
+        return self._storage[server_id].cfg.get('logpath')
+
+    def output(self, server_id):
+        """return the last lines the process wrote to stdout/stderr"""
+        output = getattr(self._storage[server_id].proc, 'output', None)
+        return output.text() if output is not None else ''
+
     def host_to_server_id(self, hostname):
-        for server_id in self._storage:
-            if self._storage[server_id].hostname == hostname:
-                return server_id
+        return self.find_one('hostname', hostname)
+
+    def port_to_server_id(self, port):
+        return self.find_one('port', port)
+
+    def pid_to_server_id(self, pid):
+        return self.find_one('pid', pid)
+
+    def cluster_server_ids(self, cluster_id):
+        """return the ids of the servers of a replica set or sharded
+        cluster"""
+        return sorted(self.find('process_group', cluster_id))
 
     def is_alive(self, server_id):
         return self._storage[server_id].is_alive
@@ -20,17 +20,24 @@ import tempfile
 
 from uuid import uuid4
 
-from concurrent.futures import ThreadPoolExecutor
-
 from mongo_orchestration import common
 from mongo_orchestration.common import (
-    BaseModel, connected, create_user, DEFAULT_SUBJECT, DEFAULT_SSL_OPTIONS)
+    BaseModel, connected, create_user, DEFAULT_SUBJECT, DEFAULT_SSL_OPTIONS,
+    only_x509)
+from mongo_orchestration.connections import ClientPool
 from mongo_orchestration.container import Container
 from mongo_orchestration.errors import ShardedClusterError
-from mongo_orchestration.servers import Servers, Server
+from mongo_orchestration.jobs import report_phase
+from mongo_orchestration.process import ProcessGroups
+from mongo_orchestration.projection import wants
+from mongo_orchestration.servers import Servers
 from mongo_orchestration.replica_sets import ReplicaSet, ReplicaSets
+from mongo_orchestration.scheduler import (
+    as_completed, Scheduler, COMMAND, SHUTDOWN, SPAWN)
 from mongo_orchestration.singleton import Singleton
+from mongo_orchestration.versions import BinaryVersions
 from pymongo import MongoClient, write_concern
+from pymongo.errors import PyMongoError
 from pymongo.server_api import ServerApi
 
 logger = logging.getLogger(__name__)
@@ -39,6 +46,18 @@ logger = logging.getLogger(__name__)
 class ShardedCluster(BaseModel):
     """class represents Sharding configuration"""
 
+    _state_attrs = ('id', 'admin_added', 'login', 'password', 'auth_key',
+                    'auth_source', '_version', '_require_api_version',
+                    '_configsvrs', '_routers', '_shards', 'tags', 'sslParams',
+                    'kwargs', 'restart_required', 'x509_extra_user',
+                    'enable_ipv6', 'mongos_version', 'uses_rs_configdb',
+                    'auth_bootstrap')
+
+    def _restore_state(self):
+        self.mongos_version = tuple(self.mongos_version)
+        self.configdb_singleton = (
+            ReplicaSets() if self.uses_rs_configdb else Servers())
+
     def __init__(self, params):
         """init configuration acording params"""
         self.id = params.get('id', None) or str(uuid4())
@@ -57,52 +76,112 @@ class ShardedCluster(BaseModel):
         self.sslParams = params.get('sslParams', {})
         self.kwargs = {}
         self.restart_required = self.login or self.auth_key
-        self.x509_extra_user = False
 
         if self.sslParams:
             self.kwargs.update(DEFAULT_SSL_OPTIONS)
 
+        configsvr_configs = params.get('configsvrs', [{}])
+        shard_configs = [s.get('shardParams', {}).get('procParams', {})
+                         for s in params.get('shards', [])]
+        # Do we need to add an extra x509 user?
+        rs_shard_configs = [
+            m.get('procParams', {})
+            for s in params.get('shards', [])
+            for m in s.get('shardParams', {}).get('members', [])
+        ]
+        router_configs = params.get('routers', [])
+        self.x509_extra_user = bool(self.login) and any(
+            only_x509(config)
+            for configs in (configsvr_configs, shard_configs,
+                            rs_shard_configs, router_configs)
+            for config in configs)
+        # Processes started with auth need the keyFile for internal auth.
+        self.auth_bootstrap = bool(self.auth_key) and (
+            self._auth_bootstrap_enabled(params.get('authBootstrap')))
+
         self.enable_ipv6 = common.ipv6_enabled_sharded(params)
         # Determine what to do with config servers via mongos version.
         mongos_name = os.path.join(Servers().bin_path(self._version), 'mongos')
-        mongos = Server(name=mongos_name, procParams={})
-        self.mongos_version = mongos.version
-        mongos.cleanup()
-        configsvr_configs = params.get('configsvrs', [{}])
+        self.mongos_version = BinaryVersions().version(mongos_name)
         self.uses_rs_configdb = (self.mongos_version >= (3, 1, 2) and
                                  len(configsvr_configs) == 1)
         self.configdb_singleton = (
             ReplicaSets() if self.uses_rs_configdb else Servers())
+        if not self.uses_rs_configdb:
+            if self.mongos_version >= (3, 3, 2):
+                raise ShardedClusterError(
+                    'mongos >= 3.3.2 requires the config database to be '
+                    'backed by a replica set.')
+            elif (self.mongos_version >= (3, 1, 2) and
+                    len(configsvr_configs) != 3):
+                raise ShardedClusterError(
+                    "mongos >= 3.1.2 needs a config replica set or 3 "
+                    "old-style config servers.")
+
+        shard_tasks = {}
+        router_tasks = []
+        try:
+            self.__start(params, configsvr_configs, shard_configs,
+                         shard_tasks, router_tasks)
+        except Exception:
+            self.__abort(shard_tasks, router_tasks)
+            raise
+
+    def __start(self, params, configsvr_configs, shard_configs, shard_tasks,
+                router_tasks):
+        """Start the processes of the cluster and put it together.
+        Args:
+            shard_tasks - dict {task: shard id} the shard tasks are added to
+            router_tasks - list the router tasks are added to
+        """
+        # Bring-up order only follows real dependencies: shards don't need
+        # the config servers, routers do, and addShard needs one router.
+        shard_tags = {}
+        for cfg in params.get('shards', []):
+            shard_params = cfg.get('shardParams', {})
+            member_id = cfg.get('id', None) or str(uuid4())
+            shard_tags[member_id] = shard_params.pop('tags', None)
+            # A replica set shard starts its members as tasks of their own.
+            kind = None if 'members' in shard_params else SPAWN
+            shard_tasks[Scheduler().submit(
+                kind, self._shard_create, shard_params)] = member_id
+
         if self.uses_rs_configdb:
             self.__init_configrs(configsvr_configs[0])
-        elif self.mongos_version >= (3, 3, 2):
-            raise ShardedClusterError(
-                'mongos >= 3.3.2 requires the config database to be backed by '
-                'a replica set.')
-        elif self.mongos_version >= (3, 1, 2) and len(configsvr_configs) != 3:
-            raise ShardedClusterError(
-                "mongos >= 3.1.2 needs a config replica set or 3 old-style "
-                "config servers.")
         else:
             self.__init_configsvrs(configsvr_configs)
+        report_phase('config servers started')
+
+        configdb = self._configdb()
+        router_tasks.extend(
+            Scheduler().submit(SPAWN, self.router_add, r, configdb)
+            for r in params.get('routers', [{}]))
+        for task in as_completed(router_tasks):
+            task.result()
+            break
+        report_phase('router started')
+
+        if self.auth_bootstrap and self.login:
+            # addShard needs the user, create it through the localhost
+            # exception of the router. The users live on the config
+            # servers, which now need the credentials too.
+            self._add_cluster_users()
+            self.restart_required = False
+            for config_id in self._configsvrs:
+                self._set_credentials(
+                    self.configdb_singleton._storage[config_id])
+            report_phase('cluster users added')
 
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(self.router_add, r)
-                       for r in params.get('routers', [{}])]
-            for f in futures:
-                f.result()
-
-            def add_shard(cfg):
-                shard_params = cfg.get('shardParams', {})
-                shard_tags = shard_params.pop('tags', None)
-                info = self.member_add(cfg.get('id', None), shard_params)
-                if shard_tags:
-                    self.tags[info['id']] = shard_tags
+        for task in as_completed(shard_tasks):
+            member_id = shard_tasks[task]
+            info = self._shard_register(member_id, *task.result())
+            if info and shard_tags[member_id]:
+                self.tags[info['id']] = shard_tags[member_id]
+        report_phase('shards added')
 
-            futures = [executor.submit(add_shard, cfg)
-                       for cfg in params.get('shards', [])]
-            for f in futures:
-                f.result()
+        for task in router_tasks:
+            task.result()
+        report_phase('routers started')
 
         # SERVER-37631 changed 3.6 sharded cluster setup so that it's required
         # to run refreshLogicalSessionCacheNow on the config server followed by
@@ -114,8 +193,11 @@ class ShardedCluster(BaseModel):
             if 'logicalSessionTimeoutMinutes' not in is_master:
                 self.config_connection().admin.command(
                     'refreshLogicalSessionCacheNow')
-                for client in router_clients:
-                    client.admin.command('refreshLogicalSessionCacheNow')
+                Scheduler().map(
+                    COMMAND,
+                    lambda client: client.admin.command(
+                        'refreshLogicalSessionCacheNow'),
+                    router_clients)
 
         if self.tags:
             for sh_id in self.tags:
@@ -127,40 +209,14 @@ class ShardedCluster(BaseModel):
                     {'_id': sh_id},
                     {'$addToSet': {'tags': {'$each': self.tags[sh_id]}}})
 
-        shard_configs = [s.get('shardParams', {}).get('procParams', {})
-                         for s in params.get('shards', [])]
         if self.login:
-            # Do we need to add an extra x509 user?
-            def only_x509(config):
-                set_params = config.get('setParameter', {})
-                auth_mechs = set_params.get('authenticationMechanisms', '')
-                auth_mechs = auth_mechs.split(',')
-                if len(auth_mechs) == 1 and auth_mechs[0] == 'MONGODB-X509':
-                    return True
-                return False
-
-            any_only_x509 = lambda l: any(map(only_x509, l))
-            rs_shard_configs = [
-                m.get('procParams', {})
-                for s in params.get('shards', [])
-                for m in s.get('shardParams', {}).get('members', [])
-            ]
-            router_configs = params.get('routers', [])
-
-            self.x509_extra_user = (any_only_x509(configsvr_configs) or
-                                    any_only_x509(shard_configs) or
-                                    any_only_x509(rs_shard_configs) or
-                                    any_only_x509(router_configs))
-
-            self._add_users(
-                self.connection().get_database(
-                    self.auth_source, write_concern=write_concern.WriteConcern(
-                        fsync=True)), self.mongos_version)
+            if not self.auth_bootstrap:
+                self._add_cluster_users()
 
             # Create the user on all the shards.
             roles = self._user_roles(self.connection())
-            for shard_id, config in zip(self._shards, shard_configs):
-                shard = self._shards[shard_id]
+
+            def add_shard_users(shard):
                 instance_id = shard['_id']
                 if shard.get('isServer'):
                     client = Servers()._storage[instance_id].connection
@@ -173,7 +229,15 @@ class ShardedCluster(BaseModel):
                 create_user(db, self.mongos_version, self.login, self.password,
                             roles)
 
-        if self.restart_required:
+            Scheduler().map(COMMAND, add_shard_users, self._shards.values())
+            report_phase('users added')
+
+        if self.auth_bootstrap:
+            # Every process runs with auth since it started.
+            for server_or_rs in self._auth_components():
+                self._set_credentials(server_or_rs)
+            self.restart_required = False
+        elif self.restart_required:
             # Do we need to add clusterAuthMode back?
             cluster_auth_mode = None
             for cfg in shard_configs:
@@ -183,12 +247,7 @@ class ShardedCluster(BaseModel):
                     break
 
             def restart_with_auth(server_or_rs):
-                server_or_rs.x509_extra_user = self.x509_extra_user
-                server_or_rs.auth_source = self.auth_source
-                server_or_rs.ssl_params = self.sslParams
-                server_or_rs.login = self.login
-                server_or_rs.password = self.password
-                server_or_rs.auth_key = self.auth_key
+                self._set_credentials(server_or_rs)
 
                 def add_auth(cfg):
                     if self.auth_key:
@@ -204,54 +263,117 @@ class ShardedCluster(BaseModel):
                     server_or_rs.restart(config_callback=add_auth)
                 server_or_rs.restart_required = False
 
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                servers = []
-
-                for config_id in self._configsvrs:
-                    servers.append(self.configdb_singleton._storage[config_id])
-
-                for server_id in self._routers:
-                    server = Servers()._storage[server_id]
-                    servers.append(server)
+            # Replica sets restart their members as tasks of their own.
+            tasks = [Scheduler().submit(
+                None if isinstance(s, ReplicaSet) else SPAWN,
+                restart_with_auth, s) for s in self._auth_components()]
+            for task in tasks:
+                task.result()
 
-                for shard_id in self._shards:
-                    shard = self._shards[shard_id]
-                    instance_id = shard['_id']
-                    klass = ReplicaSets if shard.get('isReplicaSet') else Servers
-                    server_or_rs = klass()._storage[instance_id]
-                    servers.append(server_or_rs)
-
-                futures = [executor.submit(restart_with_auth, s) for s in servers]
-                for f in futures:
-                    f.result()
-
-                self.restart_required = False
+            self.restart_required = False
+            report_phase('auth restart')
 
         if self._require_api_version:
             for router in self.routers:
                 client = self.create_connection(router['hostname'])
                 client[self.auth_source].command("setParameter", 1, requireApiVersion=int(self._require_api_version))
 
+    def __abort(self, shard_tasks, router_tasks):
+        """Remove what a failed start created, once its tasks are over."""
+        for task in list(shard_tasks) + router_tasks:
+            # Tasks that didn't start yet never will.
+            task.cancel()
+        registered = set(shard['_id'] for shard in self._shards.values())
+        for task, member_id in shard_tasks.items():
+            try:
+                _, shard = task.result()
+            except Exception:
+                continue
+            if shard['_id'] not in registered:
+                self._shards[member_id] = shard
+        for task in router_tasks:
+            # Routers register themselves in _routers.
+            try:
+                task.result()
+            except Exception:
+                pass
+        try:
+            self.cleanup()
+        except Exception:
+            logger.exception("Could not clean up sharded cluster %s",
+                             self.id)
+
+    def _add_cluster_users(self):
+        """Add the users through a router."""
+        self._add_users(
+            self.connection().get_database(
+                self.auth_source, write_concern=write_concern.WriteConcern(
+                    fsync=True)), self.mongos_version)
+
+    def _auth_components(self):
+        """return the config servers, routers and shards: Server or
+        ReplicaSet objects"""
+        servers = []
+        for config_id in self._configsvrs:
+            servers.append(self.configdb_singleton._storage[config_id])
+
+        for server_id in self._routers:
+            servers.append(Servers()._storage[server_id])
+
+        for shard in self._shards.values():
+            klass = ReplicaSets if shard.get('isReplicaSet') else Servers
+            servers.append(klass()._storage[shard['_id']])
+        return servers
+
+    def _set_credentials(self, server_or_rs):
+        """Make a config server, router or shard connect with the user."""
+        server_or_rs.x509_extra_user = self.x509_extra_user
+        server_or_rs.auth_source = self.auth_source
+        server_or_rs.ssl_params = self.sslParams
+        server_or_rs.login = self.login
+        server_or_rs.password = self.password
+        server_or_rs.auth_key = self.auth_key
+        if isinstance(server_or_rs, ReplicaSet):
+            server_or_rs.set_credentials()
+        server_or_rs.restart_required = False
+
+    def _startup_auth(self, proc_params):
+        """return proc_params for a process started before the users exist"""
+        if not self.auth_bootstrap:
+            # Remove flags that turn on auth.
+            return self._strip_auth(proc_params)
+        return proc_params.copy()
+
+    def _startup_auth_rs(self, rs_params):
+        """Prepare rs_params of a replica set started before the users
+        exist."""
+        if self.auth_bootstrap:
+            rs_params.update(auth_key=self.auth_key, authBootstrap=True)
+        else:
+            rs_params['members'] = [
+                self._strip_auth(member) for member in rs_params['members']]
+
     def __init_configrs(self, rs_cfg):
         """Create and start a config replica set."""
         # Use 'rs_id' to set the id for consistency, but need to rename
         # to 'id' to use with ReplicaSets.create()
         rs_cfg['id'] = rs_cfg.pop('rs_id', None)
         for member in rs_cfg.setdefault('members', [{}]):
-            member['procParams'] = self._strip_auth(
+            member['procParams'] = self._startup_auth(
                 member.get('procParams', {}))
             member['procParams']['configsvr'] = True
             if self.enable_ipv6:
                 common.enable_ipv6_single(member['procParams'])
         rs_cfg['sslParams'] = self.sslParams
+        rs_cfg['processGroup'] = self.id
+        self._startup_auth_rs(rs_cfg)
         self._configsvrs.append(ReplicaSets().create(rs_cfg))
 
     def __init_configsvrs(self, params):
         """create and start config servers"""
         self._configsvrs = []
         for cfg in params:
-            # Remove flags that turn on auth.
-            cfg = self._strip_auth(cfg)
+            cfg = self._startup_auth(cfg)
             server_id = cfg.pop('server_id', None)
             version = cfg.pop('version', self._version)
             cfg.update({'configsvr': True})
@@ -259,7 +381,8 @@ class ShardedCluster(BaseModel):
                 common.enable_ipv6_single(cfg)
             self._configsvrs.append(Servers().create(
                 'mongod', cfg, sslParams=self.sslParams, autostart=True,
-                version=version, server_id=server_id))
+                version=version, server_id=server_id, process_group=self.id,
+                **self._startup_auth_kwargs()))
 
     def __len__(self):
         return len(self._shards)
@@ -293,7 +416,24 @@ class ShardedCluster(BaseModel):
             if info['procInfo'].get('alive', False):
                 return {'id': server, 'hostname': Servers().hostname(server)}
 
-    def router_add(self, params):
+    def _configdb(self):
+        """return the configdb option of routers"""
+        if self.uses_rs_configdb:
+            # Replica set configdb.
+            rs_id = self._configsvrs[0]
+            config_members = ReplicaSets().members(rs_id)
+            return '%s/%s' % (
+                rs_id, ','.join(m['host'] for m in config_members))
+        return ','.join(Servers().hostname(item)
+                        for item in self._configsvrs)
+
+    def _startup_auth_kwargs(self):
+        """return Servers().create keyword arguments for auth bootstrap"""
+        if self.auth_bootstrap:
+            return {'auth_key': self.auth_key, 'auth_bootstrap': True}
+        return {}
+
+    def router_add(self, params, configdb=None):
         """add new router (mongos) into existing configuration"""
         # featureFlagLoadBalancer was added in 5.0.7 (SERVER-60679) and
         # removed in 6.1.0 (SERVER-64205).
@@ -301,27 +441,20 @@ class ShardedCluster(BaseModel):
             set_params = params.get('setParameter', {})
             if 'loadBalancerPort' in set_params:
                 set_params.setdefault('featureFlagLoadBalancer', True)
-        if self.uses_rs_configdb:
-            # Replica set configdb.
-            rs_id = self._configsvrs[0]
-            config_members = ReplicaSets().members(rs_id)
-            configdb = '%s/%s' % (
-                rs_id, ','.join(m['host'] for m in config_members))
-        else:
-            configdb = ','.join(Servers().hostname(item)
-                                for item in self._configsvrs)
         server_id = params.pop('server_id', None)
         version = params.pop('version', self._version)
-        params.update({'configdb': configdb})
+        params.update({'configdb': configdb or self._configdb()})
 
         if self.enable_ipv6:
             common.enable_ipv6_single(params)
-        # Remove flags that turn auth on.
-        params = self._strip_auth(params)
+        params = self._startup_auth(params)
+        # keyFile turns auth on for mongos, it has no 'auth' option.
+        params.pop('auth', None)
 
         server_id = Servers().create(
             'mongos', params, sslParams=self.sslParams, autostart=True,
-            version=version, server_id=server_id)
+            version=version, server_id=server_id, process_group=self.id,
+            **self._startup_auth_kwargs())
         self._routers.append(server_id)
         return {'id': server_id, 'hostname': Servers().hostname(server_id)}
 
@@ -333,11 +466,18 @@ class ShardedCluster(BaseModel):
             kwargs["password"] = self.password
         if self._require_api_version:
             kwargs["server_api"] = ServerApi(self._require_api_version)
-        c = MongoClient(
-            host, w='majority', fsync=True,
-            socketTimeoutMS=self.socket_timeout, **kwargs)
-        connected(c)
-        return c
+        kwargs.update(w='majority', fsync=True,
+                      socketTimeoutMS=self.socket_timeout)
+
+        def create_client():
+            c = MongoClient(host, **kwargs)
+            try:
+                return connected(c)
+            except PyMongoError:
+                c.close()
+                raise
+
+        return ClientPool().get(host, kwargs, create_client)
 
     def connection(self):
         return self.create_connection(self.router['hostname'])
@@ -388,6 +528,11 @@ class ShardedCluster(BaseModel):
     def member_add(self, member_id=None, params=None):
         """add new member into existing configuration"""
         member_id = member_id or str(uuid4())
+        return self._shard_register(member_id, *self._shard_create(params))
+
+    def _shard_create(self, params):
+        """start the processes of a new shard
+        return tuple (shard uri, shard record)"""
         if self.enable_ipv6:
             common.enable_ipv6_repl(params)
         if 'members' in params:
@@ -398,34 +543,38 @@ class ShardedCluster(BaseModel):
             rs_params = params.copy()
             # Turn 'rs_id' -> 'id', to be consistent with 'server_id' below.
             rs_params['id'] = rs_params.pop('rs_id', None)
-            rs_params.update({'sslParams': self.sslParams})
+            rs_params.update({'sslParams': self.sslParams,
+                              'processGroup': self.id})
 
             rs_params['version'] = params.pop('version', self._version)
-            rs_params['members'] = [
-                self._strip_auth(params) for params in rs_params['members']]
+            self._startup_auth_rs(rs_params)
             rs_id = ReplicaSets().create(rs_params)
             members = ReplicaSets().members(rs_id)
             cfgs = rs_id + r"/" + ','.join([item['host'] for item in members])
-            result = self._add(cfgs, member_id)
-            if result.get('ok', 0) == 1:
-                self._shards[result['shardAdded']] = {'isReplicaSet': True, '_id': rs_id}
-                # return self._shards[result['shardAdded']].copy()
-                return self.member_info(member_id)
+            return cfgs, {'isReplicaSet': True, '_id': rs_id}
 
         else:
             # is single server
             params.setdefault('procParams', {})['shardsvr'] = True
-            params.update({'autostart': True, 'sslParams': self.sslParams})
+            params.update({'autostart': True, 'sslParams': self.sslParams,
+                           'process_group': self.id})
             params = params.copy()
-            params['procParams'] = self._strip_auth(
+            params['procParams'] = self._startup_auth(
                 params.get('procParams', {}))
+            params.update(self._startup_auth_kwargs())
             params.setdefault('version', self._version)
             logger.debug("servers create params: {params}".format(**locals()))
             server_id = Servers().create('mongod', **params)
-            result = self._add(Servers().hostname(server_id), member_id)
-            if result.get('ok', 0) == 1:
-                self._shards[result['shardAdded']] = {'isServer': True, '_id': server_id}
-                return self.member_info(member_id)
+            return Servers().hostname(server_id), {'isServer': True,
+                                                   '_id': server_id}
+
+    def _shard_register(self, member_id, shard_uri, shard):
+        """run addShard for a shard started by _shard_create
+        return info about the new member"""
+        result = self._add(shard_uri, member_id)
+        if result.get('ok', 0) == 1:
+            self._shards[result['shardAdded']] = shard
+            return self.member_info(member_id)
 
     def member_info(self, member_id):
         """return info about member"""
@@ -466,42 +615,56 @@ class ShardedCluster(BaseModel):
             Servers().command(router_id, 'reset')
         return self.info()
 
-    def info(self):
-        """return info about configuration"""
+    def info(self, fields=None):
+        """return info about configuration
+        Args:
+            fields - projection of the info, None for all of it
+        """
         uri = ','.join(x['hostname'] for x in self.routers)
         mongodb_uri = 'mongodb://' + uri
         result = {'id': self.id,
-                  'shards': self.members,
-                  'configsvrs': self.configsvrs,
                   'routers': self.routers,
                   'mongodb_uri': mongodb_uri,
                   'orchestration': 'sharded_clusters'}
+        # Shards and config servers may be replica sets to ask.
+        if wants(fields, 'shards'):
+            result['shards'] = self.members
+        if wants(fields, 'configsvrs'):
+            result['configsvrs'] = self.configsvrs
         if self.login:
             result['mongodb_auth_uri'] = self.mongodb_auth_uri(uri)
         return result
 
-    def cleanup(self):
-        """cleanup configuration: stop and remove all servers"""
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = []
-            for _id, shard in self._shards.items():
-                if shard.get('isServer', False):
-                    futures.append(executor.submit(
-                        Servers().remove, shard['_id']))
-                if shard.get('isReplicaSet', False):
-                    futures.append(executor.submit(
-                        ReplicaSets().remove, shard['_id']))
-
-            for mongos in self._routers:
-                futures.append(executor.submit(Servers().remove, mongos))
+    def cleanup(self, fast=False):
+        """cleanup configuration: stop and remove all servers
+        Args:
+            fast - kill all processes at once instead of shutting them down
+        """
+        if fast:
+            ProcessGroups().kill(self.id)
+        # Replica sets stop their members as tasks of their own.
+        tasks = []
+        for _id, shard in self._shards.items():
+            if shard.get('isServer', False):
+                tasks.append(Scheduler().submit(
+                    SHUTDOWN, Servers().remove, shard['_id'], fast))
+            if shard.get('isReplicaSet', False):
+                tasks.append(Scheduler().submit(
+                    None, ReplicaSets().remove, shard['_id'], fast))
 
-            for config_id in self._configsvrs:
-                futures.append(executor.submit(
-                    self.configdb_singleton.remove, config_id))
+        for mongos in self._routers:
+            tasks.append(Scheduler().submit(
+                SHUTDOWN, Servers().remove, mongos, fast))
 
-            for f in futures:
-                f.result()
+        config_kind = None if self.uses_rs_configdb else SHUTDOWN
+        for config_id in self._configsvrs:
+            tasks.append(Scheduler().submit(
+                config_kind, self.configdb_singleton.remove, config_id, fast))
+
+        for task in tasks:
+            task.result()
 
+        ProcessGroups().forget(self.id)
         self._configsvrs = []
         self._routers = []
         self._shards = {}
@@ -543,20 +706,23 @@ class ShardedClusters(Singleton, Container):
         self[cluster.id] = cluster
         return cluster.id
 
-    def remove(self, cluster_id):
+    def remove(self, cluster_id, fast=False):
         """remove cluster and data stuff
         Args:
             cluster_id - cluster identity
+            fast - kill all processes at once instead of shutting them down
         """
-        cluster = self._storage.pop(cluster_id)
-        cluster.cleanup()
+        cluster = self._storage[cluster_id]
+        del self[cluster_id]
+        cluster.cleanup(fast)
 
-    def info(self, cluster_id):
+    def info(self, cluster_id, fields=None):
         """return dictionary object with info about cluster
         Args:
             cluster_id - cluster identity
+            fields - projection of the info, None for all of it
         """
-        return self._storage[cluster_id].info()
+        return self._storage[cluster_id].info(fields)
 
     def configsvrs(self, cluster_id):
         """return list of config servers"""
@@ -570,14 +736,14 @@ class ShardedClusters(Singleton, Container):
         """add new router"""
         cluster = self._storage[cluster_id]
         result = cluster.router_add(params)
-        self._storage[cluster_id] = cluster
+        self[cluster_id] = cluster
         return result
 
     def router_del(self, cluster_id, router_id):
         """remove router from the ShardedCluster"""
         cluster = self._storage[cluster_id]
         result = cluster.router_remove(router_id)
-        self._storage[cluster_id] = cluster
+        self[cluster_id] = cluster
         return result
 
     def members(self, cluster_id):
@@ -602,12 +768,12 @@ class ShardedClusters(Singleton, Container):
         """remove member from cluster cluster"""
         cluster = self._storage[cluster_id]
         result = cluster.member_remove(member_id)
-        self._storage[cluster_id] = cluster
+        self[cluster_id] = cluster
         return result
 
     def member_add(self, cluster_id, params):
         """add new member into configuration"""
         cluster = self._storage[cluster_id]
         result = cluster.member_add(params.get('id', None), params.get('shardParams', {}))
-        self._storage[cluster_id] = cluster
+        self[cluster_id] = cluster
         return result
\ No newline at end of file
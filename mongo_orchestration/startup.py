@@ -0,0 +1,252 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Follow the log of a starting mongod/mongos.
+
+A StartupMonitor reads the lines a process appends to its logpath and
+moves it through spawned -> listening -> ready, or to failed, as soon as
+the corresponding log line appears, instead of polling its port.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import platform
+import select
+import time
+
+logger = logging.getLogger(__name__)
+
+# Startup states.
+SPAWNED = 'spawned'
+LISTENING = 'listening'
+READY = 'ready'
+FAILED = 'failed'
+
+# Structured log ids (MongoDB >= 4.4).
+LISTENING_ID = 23015  # "Listening on"
+READY_ID = 23016  # "Waiting for connections"
+
+# Text log markers (MongoDB < 4.4).
+READY_MARKER = 'waiting for connections on port'
+FATAL_MARKERS = ('exception in initAndListen', 'Fatal Assertion',
+                 'Fatal assertion')
+ADDRESS_IN_USE_MARKER = 'Address already in use'
+# mongod/mongos exit code when they cannot listen (EXIT_NET_ERROR).
+EXIT_NET_ERROR = 48
+
+# inotify(7) constants.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# How often to look at the log and the process without inotify.
+POLL_INTERVAL = 0.05
+# How often to check that the process is alive while waiting for inotify.
+EXIT_CHECK_INTERVAL = 0.5
+
+
+def parse_line(line):
+    """return tuple (log id, severity, text) of a log line
+    id and severity are None for text logs"""
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            doc = json.loads(line)
+        except ValueError:
+            return None, None, line
+        return doc.get('id'), doc.get('s'), line
+    return None, None, line
+
+
+class LogTail(object):
+    """Read the lines appended to a file since this object was created."""
+
+    def __init__(self, path):
+        self.path = path
+        self._offset = 0
+        self._inode = None
+        self._partial = ''
+        try:
+            stat = os.stat(path)
+            self._offset, self._inode = stat.st_size, stat.st_ino
+        except OSError:
+            pass
+
+    def read_lines(self):
+        """return the complete lines appended since the last call"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return []
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # The log was rotated or replaced (logappend=false).
+            self._inode = stat.st_ino
+            self._offset = 0
+            self._partial = ''
+        if stat.st_size == self._offset:
+            return []
+        with open(self.path, 'rb') as fd:
+            fd.seek(self._offset)
+            data = fd.read()
+        self._offset += len(data)
+        lines = (self._partial + data.decode('utf-8', 'replace')).split('\n')
+        self._partial = lines.pop()
+        return lines
+
+
+class _Inotify(object):
+    """Wake up when files in a directory change, through inotify(7)."""
+
+    _libc = None
+
+    def __init__(self, directory):
+        if _Inotify._libc is None:
+            _Inotify._libc = ctypes.CDLL(
+                ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc = _Inotify._libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(
+                self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch failed')
+
+    def wait(self, timeout):
+        readable, _, _ = select.select(
+            [self.fd], [], [], min(timeout, EXIT_CHECK_INTERVAL))
+        if readable:
+            try:
+                # Drain the events, the log is read from the last offset.
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Poller(object):
+    """Wake up periodically, where inotify is not available."""
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, POLL_INTERVAL))
+
+    def close(self):
+        pass
+
+
+def watch(directory):
+    """return an object whose wait(timeout) returns after files in
+    directory change, or after some time"""
+    if platform.system() == 'Linux':
+        try:
+            return _Inotify(directory)
+        except (OSError, AttributeError):
+            logger.debug("inotify is not available, polling %s", directory)
+    return _Poller()
+
+
+class StartupMonitor(object):
+    """Follow the startup of a process through its log file.
+
+    Create the monitor before starting the process, so that only lines
+    written by this start are taken into account.
+    """
+
+    def __init__(self, logpath):
+        self.logpath = logpath
+        self.state = SPAWNED
+        self.reason = None
+        self.address_in_use = False
+        # Has the log said anything, and in the structured format?
+        self.lines = 0
+        self.structured = False
+        self._tail = LogTail(logpath)
+
+    def feed(self, line):
+        """Update the state from a log line."""
+        log_id, severity, text = parse_line(line)
+        self.lines += 1
+        self.structured = self.structured or log_id is not None
+        if ADDRESS_IN_USE_MARKER in text:
+            self.address_in_use = True
+            self._fail(text)
+        elif severity == 'F' or any(marker in text
+                                    for marker in FATAL_MARKERS):
+            self._fail(text)
+        elif log_id == READY_ID or (log_id is None and READY_MARKER in text):
+            self.state = READY
+        elif log_id == LISTENING_ID and self.state == SPAWNED:
+            self.state = LISTENING
+
+    def _fail(self, reason):
+        self.state = FAILED
+        self.reason = reason
+
+    @property
+    def done(self):
+        return self.state in (READY, FAILED)
+
+    def _read(self):
+        for line in self._tail.read_lines():
+            if line.strip():
+                self.feed(line)
+            if self.done:
+                break
+
+    def wait(self, proc, timeout, ready=None):
+        """Follow the log until proc is ready, failed or timeout expires.
+        Args:
+            proc - Popen object
+            timeout - seconds to wait
+            ready - optional callable, proc is ready when it returns True,
+                    for text logs in a format we don't know
+        return the state"""
+        deadline = time.time() + timeout
+        watcher = watch(os.path.dirname(os.path.abspath(self.logpath)))
+        try:
+            while True:
+                self._read()
+                if (not self.done and self.lines and not self.structured and
+                        ready is not None and ready()):
+                    self.state = READY
+                if self.done:
+                    break
+                exit_code = proc.poll()
+                if exit_code is not None:
+                    # Catch the lines written right before exiting.
+                    self._read()
+                    if self.state != FAILED:
+                        self.address_in_use = exit_code == EXIT_NET_ERROR
+                        self._fail("process exited with code %d" % exit_code)
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                watcher.wait(remaining)
+        finally:
+            watcher.close()
+        logger.debug("%s: %s", self.logpath, self.state)
+        return self.state
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import threading
+
+from bson import json_util
+
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(Singleton):
+    """Append-only JSON-lines journal of Servers, ReplicaSets and
+    ShardedClusters, used to re-adopt running processes after a restart.
+
+    Every line is either {"kind": ..., "id": ..., "state": {...}} or
+    {"kind": ..., "id": ..., "deleted": true}; the last line for an id wins.
+    The journal is compacted to one line per live object when opened and
+    whenever it grows past 'compact_every' lines.
+    """
+
+    _lock = threading.Lock()
+    path = None
+    compact_every = 1000
+    _lines = 0
+    _snapshot = {}
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def open(self, path):
+        """Start journaling to path.
+        return the recorded state as {kind: {id: state}}"""
+        with self._lock:
+            self.path = path
+            self._snapshot = self._replay(path)
+            self._compact()
+            return dict((kind, dict(states))
+                        for kind, states in self._snapshot.items())
+
+    def close(self):
+        with self._lock:
+            self.path = None
+            self._snapshot = {}
+            self._lines = 0
+
+    def save(self, kind, obj_id, state):
+        """Record the current state of an object."""
+        self._append({'kind': kind, 'id': obj_id, 'state': state})
+
+    def delete(self, kind, obj_id):
+        """Record that an object was removed."""
+        self._append({'kind': kind, 'id': obj_id, 'deleted': True})
+
+    @staticmethod
+    def _replay(path):
+        snapshot = {}
+        try:
+            fd = open(path, 'r')
+        except (IOError, OSError):
+            return snapshot
+        with fd:
+            for line in fd:
+                try:
+                    record = json_util.loads(line)
+                except ValueError:
+                    # A torn write at the end of the journal.
+                    logger.warning("Skipping corrupt line in %s", path)
+                    continue
+                states = snapshot.setdefault(record['kind'], {})
+                if record.get('deleted'):
+                    states.pop(record['id'], None)
+                else:
+                    states[record['id']] = record['state']
+        return snapshot
+
+    def _apply(self, record):
+        states = self._snapshot.setdefault(record['kind'], {})
+        if record.get('deleted'):
+            states.pop(record['id'], None)
+        else:
+            states[record['id']] = record['state']
+
+    def _append(self, record):
+        with self._lock:
+            if self.path is None:
+                return
+            self._apply(record)
+            try:
+                with open(self.path, 'a') as fd:
+                    fd.write(json_util.dumps(record) + '\n')
+                    fd.flush()
+                    os.fsync(fd.fileno())
+            except (IOError, OSError):
+                logger.exception("Could not write to state journal %s",
+                                 self.path)
+                return
+            self._lines += 1
+            if self._lines >= self.compact_every:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with a single line per live object."""
+        tmp_path = self.path + '.tmp'
+        lines = 0
+        try:
+            with open(tmp_path, 'w') as fd:
+                for kind, states in self._snapshot.items():
+                    for obj_id, state in states.items():
+                        fd.write(json_util.dumps(
+                            {'kind': kind, 'id': obj_id, 'state': state}))
+                        fd.write('\n')
+                        lines += 1
+                fd.flush()
+                os.fsync(fd.fileno())
+            os.replace(tmp_path, self.path)
+        except (IOError, OSError):
+            logger.exception("Could not compact state journal %s", self.path)
+            return
+        self._lines = lines
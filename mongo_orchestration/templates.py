@@ -0,0 +1,235 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Golden dbpaths of freshly initiated replica sets.
+
+A template is the dbpath of the primary of a replica set captured right
+after it was initiated. A new replica set with the same parameters is
+started from copies of it: the replica set config stored in the 'local'
+database is rewritten with the new set name and hosts, so neither
+replSetInitiate nor initial sync is needed.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import threading
+
+import bson
+import pymongo
+
+from mongo_orchestration import process
+from mongo_orchestration.common import DEFAULT_BIND
+from mongo_orchestration.singleton import Singleton
+from mongo_orchestration.versions import binary_key
+
+logger = logging.getLogger(__name__)
+
+# Files in a dbpath that must not be part of a template.
+IGNORED_FILES = ('mongod.lock', 'mongod.log', 'diagnostic.data')
+
+
+def copy_dbpath(src, dst):
+    """Copy the contents of directory src into dst.
+
+    Uses 'cp --reflink=auto' where available, so that copy-on-write
+    filesystems (btrfs, XFS, ...) share blocks instead of copying them.
+    """
+    if not os.path.exists(dst):
+        os.makedirs(dst)
+    if platform.system() == 'Linux' and shutil.which('cp'):
+        try:
+            subprocess.check_call(
+                ['cp', '-a', '--reflink=auto', os.path.join(src, '.'), dst])
+        except (OSError, subprocess.CalledProcessError):
+            logger.exception("cp failed, falling back to shutil.copytree")
+        else:
+            return
+    shutil.copytree(src, dst, dirs_exist_ok=True)
+
+
+def strip_dbpath(dbpath):
+    """Remove files that must not be copied along with a dbpath."""
+    for name in IGNORED_FILES:
+        process.remove_path(os.path.join(dbpath, name))
+
+
+def template_host(port):
+    """Return the host a member started on port will be reachable at."""
+    return '%s:%d' % (DEFAULT_BIND, port)
+
+
+def templatable(rs_params):
+    """Can a replica set created with rs_params use a template?
+
+    Auth and TLS need keys and certificates baked into the processes, and
+    explicit ports or paths would be copied into every clone.
+    """
+    if (rs_params.get('login') or rs_params.get('auth_key') or
+            rs_params.get('sslParams')):
+        return False
+    for member in rs_params.get('members', []):
+        proc_params = member.get('procParams', {})
+        if any(key in proc_params
+               for key in ('port', 'dbpath', 'logpath', 'keyFile', 'auth')):
+            return False
+        if proc_params.get('storageEngine') == 'inMemory':
+            return False
+        if 'version' in member:
+            return False
+    return bool(rs_params.get('members'))
+
+
+def clone_replset_config(old_config, repl_id, members):
+    """Return the replica set config of a clone of a template.
+
+    Args:
+        old_config - the config stored in local.system.replset
+        repl_id - name of the new replica set
+        members - members of the new replica set, with their hosts
+
+    Every clone gets its own replicaSetId, drivers and members use it to
+    tell replica sets apart.
+    """
+    new_config = dict(old_config)
+    new_config['_id'] = repl_id
+    hosts = dict((m['_id'], m['host']) for m in members)
+    new_config['members'] = [dict(m, host=hosts[m['_id']])
+                             for m in old_config['members']]
+    settings = dict(old_config.get('settings', {}))
+    settings['replicaSetId'] = bson.ObjectId()
+    new_config['settings'] = settings
+    return new_config
+
+
+class DbpathTemplates(Singleton):
+    """Captures and clones replica set dbpath templates."""
+
+    _lock = threading.Lock()
+    # Where templates are stored, None disables templates.
+    directory = None
+    # Oldest version known to support renaming a set through system.replset
+    # and replSetStepUp.
+    min_version = (4, 0)
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def enable(self, directory):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.directory = directory
+
+    def key(self, mongod, rs_params):
+        """Return the template key for rs_params started by binary mongod."""
+        # The cache size doesn't change what is in a dbpath, and the size
+        # Capacity gives depends on how many mongods are running.
+        members = [{'procParams': dict(
+                        (name, value)
+                        for name, value in m.get('procParams', {}).items()
+                        if name != 'wiredTigerCacheSizeGB'),
+                    'rsParams': m.get('rsParams', {})}
+                   for m in rs_params.get('members', [])]
+        identity = {'binary': binary_key(mongod), 'members': members,
+                    'rsSettings': rs_params.get('rsSettings')}
+        return hashlib.sha1(
+            json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """return the template dbpath for key, or None"""
+        if not self.enabled:
+            return None
+        path = self.path(key)
+        if os.path.isdir(path):
+            return path
+        return None
+
+    def capture(self, key, server):
+        """Save the dbpath of server, the primary of a new replica set."""
+        path = self.path(key)
+        tmp_path = path + '.%d.tmp' % threading.get_ident()
+        client = server.connection
+        client.admin.command('fsync', lock=True)
+        try:
+            copy_dbpath(server.cfg['dbpath'], tmp_path)
+        finally:
+            client.admin.command('fsyncUnlock')
+        strip_dbpath(tmp_path)
+        try:
+            os.rename(tmp_path, path)
+            logger.info("Captured dbpath template %s", path)
+        except OSError:
+            # Another replica set captured the same template first.
+            process.remove_path(tmp_path)
+
+    def clone(self, template, repl_id, config, servers, timeout=300):
+        """Fill the dbpaths of servers from template.
+
+        Args:
+            template - template dbpath
+            repl_id - name of the new replica set
+            config - replica set config with the new hosts
+            servers - Server of every member of config, not started yet
+        """
+        data_bearing = [server for member, server in zip(config['members'],
+                                                         servers)
+                        if not member.get('arbiterOnly')]
+        seed = data_bearing[0]
+        copy_dbpath(template, seed.cfg['dbpath'])
+        self.__rewrite_config(seed, repl_id, config, timeout)
+        strip_dbpath(seed.cfg['dbpath'])
+        for server in data_bearing[1:]:
+            copy_dbpath(seed.cfg['dbpath'], server.cfg['dbpath'])
+        # Arbiters start empty and receive the config from the primary.
+
+    def __rewrite_config(self, server, repl_id, config, timeout):
+        """Start server as a standalone and store the new config."""
+        cfg = server.cfg.copy()
+        cfg.pop('replSet', None)
+        config_path = process.write_config(cfg)
+        proc = None
+        try:
+            proc, host = process.mprocess(
+                server.name, config_path, cfg['port'], timeout)
+            client = pymongo.MongoClient(host, directConnection=True)
+            try:
+                local = client.local
+                old_config = local.system.replset.find_one()
+                new_config = clone_replset_config(
+                    old_config, repl_id, config['members'])
+                # _id is immutable, replace the whole document.
+                local.system.replset.delete_many({})
+                local.system.replset.insert_one(new_config)
+                # Every member must generate its own identity.
+                local.drop_collection('me')
+                try:
+                    client.admin.command('shutdown', force=True)
+                except pymongo.errors.ConnectionFailure:
+                    pass
+            finally:
+                client.close()
+            process.wait_mprocess(proc, timeout)
+        finally:
+            if proc is not None:
+                process.kill_mprocess(proc)
+            process.remove_path(config_path)
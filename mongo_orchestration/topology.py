@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Snapshots of the state of a replica set.
+
+All the views of a replica set (members, secondaries, arbiters, ...) are
+derived from one snapshot of the status, config and hello of its members,
+taken in a single parallel sweep. A snapshot is reused until it gets old,
+PyMongo sees the topology change (a new config version, an election...) or
+a lifecycle action invalidates it.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot(object):
+    """Status, config and hello of the members of a replica set."""
+
+    def __init__(self, version, key, status, config, hellos):
+        self.version = version
+        self.key = key
+        self.status = status
+        self.config = config
+        # host -> hello reply, None if the member didn't answer
+        self.hellos = hellos
+        self.taken = time.time()
+
+    @property
+    def age(self):
+        return time.time() - self.taken
+
+    def members(self):
+        """return the members in replSetGetStatus"""
+        return self.status.get('members', [])
+
+    def in_state(self, state):
+        """return the hosts of the members in state"""
+        return [member['name'] for member in self.members()
+                if member['state'] == state]
+
+    def config_members(self):
+        return self.config.get('members', [])
+
+    def hello(self, host):
+        """return the hello reply of host, empty if it didn't answer"""
+        return self.hellos.get(host) or {}
+
+    def primary_hello(self):
+        """return the hello reply of the primary, empty if there's none"""
+        for hello in self.hellos.values():
+            if hello and (hello.get('isWritablePrimary') or
+                          hello.get('ismaster')):
+                return hello
+        return {}
+
+    def info(self):
+        return {'version': self.version,
+                'age': round(self.age, 3),
+                'configVersion': self.config.get('version'),
+                'term': self.config.get('term')}
+
+
+class SnapshotCache(object):
+    """The last Snapshot of a replica set, taken again when it is older
+    than ttl, the topology changed or invalidate() was called."""
+
+    # How long a snapshot stays valid when nothing changes, in seconds.
+    ttl = 1.0
+
+    def __init__(self, take, listener=None):
+        """Args:
+            take - callable returning tuple (status, config, hellos)
+            listener - TopologyListener of the replica set's clients
+        """
+        self._take = take
+        self._listener = listener
+        # One sweep at a time, concurrent readers share its result.
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._generation = 0
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __key(self):
+        return (self._generation,
+                self._listener.generation if self._listener else None)
+
+    def __fresh(self, snapshot):
+        return (snapshot is not None and snapshot.key == self.__key() and
+                snapshot.age < self.ttl)
+
+    def invalidate(self):
+        """Take a new snapshot on the next get()."""
+        self._generation += 1
+
+    def get(self):
+        """return a fresh Snapshot"""
+        snapshot = self._snapshot
+        if self.__fresh(snapshot):
+            self.hits += 1
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if self.__fresh(snapshot):
+                self.hits += 1
+                return snapshot
+            key = self.__key()
+            status, config, hellos = self._take()
+            self._version += 1
+            self.misses += 1
+            self._snapshot = Snapshot(self._version, key, status, config,
+                                      hellos)
+            return self._snapshot
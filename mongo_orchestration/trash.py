@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Deferred removal of directories.
+
+Removing a directory is a rename into a trash directory on the same
+filesystem, which is instant. A background thread deletes what is in the
+trash afterwards, at a limited rate.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from uuid import uuid4
+
+from mongo_orchestration.common import TMP_DIR
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIR_NAME = '.mongo-orchestration-trash'
+
+
+def trash_dir(path):
+    """return the trash directory for path, on the same filesystem"""
+    return os.path.join(os.path.dirname(os.path.abspath(path)),
+                        TRASH_DIR_NAME)
+
+
+def _ignore_missing(remove, path):
+    # The reaper thread and a shutdown may empty the trash at the same time.
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Trash(Singleton):
+    """Moves directories to the trash and deletes them in the background."""
+
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _thread = None
+    # Trash directories to reap.
+    _directories = set()
+    # Deletion rate limit, in bytes of file data per second.
+    max_bytes_per_second = 256 * 1024 * 1024
+    # Counters for info().
+    _trashed = 0
+    _reclaimed = 0
+    _reclaimed_bytes = 0
+    _failed = 0
+
+    def put(self, path):
+        """Remove directory path: move it to the trash, or delete it now if
+        it can't be moved."""
+        if path is None or not os.path.exists(path):
+            return
+        if not os.path.isdir(path):
+            self._remove(path)
+            return
+        directory = trash_dir(path)
+        target = os.path.join(
+            directory, '%s-%s' % (os.path.basename(path), uuid4().hex))
+        try:
+            if not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            os.rename(path, target)
+        except OSError:
+            # Different filesystems, open files on Windows, permissions...
+            logger.debug("Could not move %s to the trash", path,
+                         exc_info=True)
+            self._remove(path)
+            return
+        with self._lock:
+            self._directories.add(directory)
+            self._trashed += 1
+        self._start()
+
+    def _remove(self, path):
+        # Avoid a circular import, process uses the trash.
+        from mongo_orchestration.process import remove_path
+        remove_path(path)
+
+    def adopt(self, directory=None):
+        """Reap what a previous run left in directory, the trash of the
+        temporary directory by default."""
+        if directory is None:
+            directory = os.path.join(TMP_DIR or tempfile.gettempdir(),
+                                     TRASH_DIR_NAME)
+        if os.path.isdir(directory):
+            with self._lock:
+                self._directories.add(directory)
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='trash-reaper')
+                self._thread.daemon = True
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.reap()
+            except Exception:
+                logger.exception("Could not empty the trash")
+
+    def _pending(self):
+        with self._lock:
+            directories = list(self._directories)
+        entries = []
+        for directory in directories:
+            try:
+                entries.extend(os.path.join(directory, name)
+                               for name in os.listdir(directory))
+            except OSError:
+                continue
+        return entries
+
+    def reap(self, throttle=True):
+        """Delete everything in the trash.
+        Args:
+            throttle - limit the deletion rate to max_bytes_per_second
+        """
+        for entry in self._pending():
+            try:
+                size = self.__delete_tree(entry, throttle)
+            except OSError:
+                logger.exception("Could not delete %s", entry)
+                with self._lock:
+                    self._failed += 1
+                continue
+            with self._lock:
+                self._reclaimed += 1
+                self._reclaimed_bytes += size
+
+    def __delete_tree(self, path, throttle):
+        """Delete path bottom-up, sleeping to keep the rate limit.
+        return the number of bytes of file data deleted"""
+        deleted = 0
+        t_start = time.time()
+        for root, dirs, files in os.walk(path, topdown=False):
+            for name in files:
+                file_path = os.path.join(root, name)
+                try:
+                    deleted += os.lstat(file_path).st_size
+                except OSError:
+                    pass
+                _ignore_missing(os.remove, file_path)
+                if throttle and self.max_bytes_per_second:
+                    ahead = (deleted / float(self.max_bytes_per_second) -
+                             (time.time() - t_start))
+                    if ahead > 0:
+                        time.sleep(ahead)
+            for name in dirs:
+                dir_path = os.path.join(root, name)
+                if os.path.islink(dir_path):
+                    _ignore_missing(os.remove, dir_path)
+                else:
+                    _ignore_missing(os.rmdir, dir_path)
+        if os.path.isdir(path):
+            _ignore_missing(os.rmdir, path)
+        else:
+            _ignore_missing(os.remove, path)
+        return deleted
+
+    def info(self):
+        pending = self._pending()
+        with self._lock:
+            return {'directories': sorted(self._directories),
+                    'pending': len(pending),
+                    'trashed': self._trashed,
+                    'reclaimed': self._reclaimed,
+                    'reclaimed_bytes': self._reclaimed_bytes,
+                    'failed': self._failed,
+                    'max_bytes_per_second': self.max_bytes_per_second}
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+from mongo_orchestration.errors import ServersError
+from mongo_orchestration.scheduler import Scheduler, SPAWN
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+# regular expression matching MongoDB versions
+VERSION_PATTERN = re.compile(
+    r'(?:db version v?|MongoS version v?|mongos db version v?)'
+    r'(?P<version>(\d+\.)+\d+)',
+    re.IGNORECASE)
+
+
+def binary_key(name):
+    """Return the cache key of a binary: its resolved path, mtime and inode.
+
+    Replacing the binary in place changes its mtime or inode, so a stale
+    version is never returned.
+    """
+    path = os.path.abspath(shutil.which(name) or name)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return '%s:%d:%d' % (path, st.st_mtime_ns, st.st_ino)
+
+
+class BinaryVersions(Singleton):
+    """Process-wide cache of 'mongod --version' / 'mongos --version'."""
+
+    _versions = {}
+    _lock = threading.Lock()
+    # Where the cache is persisted, set by the daemon at startup.
+    cache_file = None
+
+    def load(self, cache_file):
+        """Read cached versions from and persist new ones to 'cache_file'."""
+        self.cache_file = cache_file
+        try:
+            with open(cache_file, 'r') as fd:
+                versions = json.load(fd)
+        except (IOError, OSError, ValueError):
+            return
+        with self._lock:
+            for key, version in versions.items():
+                self._versions.setdefault(key, tuple(version))
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        with self._lock:
+            versions = dict((key, list(version))
+                            for key, version in self._versions.items())
+        tmp_file = self.cache_file + '.tmp'
+        try:
+            with open(tmp_file, 'w') as fd:
+                json.dump(versions, fd)
+            os.replace(tmp_file, self.cache_file)
+        except (IOError, OSError):
+            logger.exception("Could not save version cache to %s",
+                             self.cache_file)
+
+    def version(self, name):
+        """Get the version of the MongoDB binary 'name' as a tuple."""
+        key = binary_key(name)
+        with self._lock:
+            version = self._versions.get(key)
+        if version is not None:
+            return version
+        version = self._run_version(name)
+        if key is not None:
+            with self._lock:
+                self._versions[key] = version
+            self._save()
+        return version
+
+    def _run_version(self, name):
+        command = (name, '--version')
+        logger.debug(command)
+        stdout, _ = subprocess.Popen(
+            command, stdout=subprocess.PIPE).communicate()
+        version_output = str(stdout)
+        match = re.search(VERSION_PATTERN, version_output)
+        if match is None:
+            raise ServersError(
+                'Could not determine version of %s from string: %s'
+                % (name, version_output))
+        version_string = match.group('version')
+        return tuple(map(int, version_string.split('.')))
+
+    def prefetch(self, releases=None):
+        """Resolve the version of mongod and mongos of every release."""
+        bin_paths = list((releases or {}).values()) or ['']
+        names = [os.path.join(bin_path, binary)
+                 for bin_path in bin_paths for binary in ('mongod', 'mongos')]
+
+        def fetch(name):
+            try:
+                return self.version(name)
+            except (OSError, ServersError):
+                logger.info("Could not determine version of %s", name)
+
+        Scheduler().map(SPAWN, fetch, names)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
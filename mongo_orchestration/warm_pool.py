@@ -0,0 +1,270 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import copy
+import json
+import logging
+import threading
+import time
+from uuid import uuid4
+
+from mongo_orchestration.common import preset_merge
+from mongo_orchestration.replica_sets import ReplicaSet, ReplicaSets
+from mongo_orchestration.sharded_clusters import ShardedCluster, ShardedClusters
+from mongo_orchestration.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+# cluster type -> (model class, container class, id attribute)
+CLUSTER_TYPES = {
+    'replica_sets': (ReplicaSet, ReplicaSets, 'repl_id'),
+    'sharded_clusters': (ShardedCluster, ShardedClusters, 'id')
+}
+
+
+def pool_key(cluster_type, params):
+    """Return the key identifying a request body for cluster_type."""
+    return cluster_type, json.dumps(params, sort_keys=True)
+
+
+class PresetPool(object):
+    """Bookkeeping for the warm clusters of a single preset.
+
+    The pool aims to keep 'target' clusters ready. 'target' starts at
+    'min_size', grows by one (up to 'max_size') on every claim, and shrinks
+    back towards 'min_size' as clusters stay unclaimed for 'idle_timeout'
+    seconds and get evicted.
+    """
+
+    def __init__(self, create, destroy, min_size=1, max_size=None,
+                 idle_timeout=600):
+        self.create = create
+        self.destroy = destroy
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size or min_size)
+        self.idle_timeout = idle_timeout
+        self.target = min_size
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        # Don't retry building before this time after a failure.
+        self.retry_after = 0
+        self._ready = collections.deque()  # (ready since, cluster)
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a ready cluster, or return None."""
+        with self._lock:
+            self.target = min(self.max_size, self.target + 1)
+            if not self._ready:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._ready.pop()[1]
+
+    def put(self, cluster):
+        with self._lock:
+            self.pending -= 1
+            self._ready.append((time.time(), cluster))
+
+    def failed(self, retry_delay=60):
+        with self._lock:
+            self.pending -= 1
+            self.retry_after = time.time() + retry_delay
+
+    def builds_needed(self):
+        """Return how many clusters to start building, and count them as
+        pending."""
+        with self._lock:
+            if time.time() < self.retry_after:
+                return 0
+            count = max(0, self.target - len(self._ready) - self.pending)
+            self.pending += count
+            return count
+
+    def evict_idle(self):
+        """Remove clusters idle for longer than idle_timeout, keeping at
+        least min_size ready. return the evicted clusters"""
+        evicted = []
+        now = time.time()
+        with self._lock:
+            while (len(self._ready) > self.min_size and
+                   now - self._ready[0][0] > self.idle_timeout):
+                evicted.append(self._ready.popleft()[1])
+                self.target = max(self.min_size, self.target - 1)
+        return evicted
+
+    def drain(self):
+        """Remove and return all ready clusters."""
+        with self._lock:
+            clusters = [cluster for _, cluster in self._ready]
+            self._ready.clear()
+            self.target = 0
+        return clusters
+
+    def info(self):
+        with self._lock:
+            return {'ready': len(self._ready), 'pending': self.pending,
+                    'target': self.target, 'min': self.min_size,
+                    'max': self.max_size, 'idle_timeout': self.idle_timeout,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class WarmPool(Singleton):
+    """Keeps pre-initialized replica sets and sharded clusters for presets.
+
+    Configured with the "warm_pool" section of the config file::
+
+        "warm_pool": {
+            "replica_sets/basic.json": {"min": 1, "max": 3,
+                                        "idle_timeout": 600}
+        }
+
+    A POST without an id whose body, after merging its preset, equals the
+    preset alone is served from the pool. Until then the servers of pooled
+    clusters are neither listed nor counted in the budgets.
+    """
+
+    _pools = {}
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _thread = None
+    # Seconds between two maintenance rounds.
+    interval = 10
+
+    def configure(self, config):
+        """Create pools described by config and start maintaining them."""
+        with self._lock:
+            for name, options in config.items():
+                cluster_type, preset = name.split('/', 1)
+                if cluster_type not in CLUSTER_TYPES:
+                    logger.warning("Cannot pool %s: unknown cluster type %r",
+                                   name, cluster_type)
+                    continue
+                params = preset_merge({'preset': preset}, cluster_type)
+                self._pools[pool_key(cluster_type, params)] = PresetPool(
+                    self._creator(cluster_type, params),
+                    self._destroy,
+                    min_size=options.get('min', 1),
+                    max_size=options.get('max'),
+                    idle_timeout=options.get('idle_timeout', 600))
+            if self._pools and self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='warm-pool')
+                self._thread.daemon = True
+                self._thread.start()
+        self._wakeup.set()
+
+    @staticmethod
+    def _creator(cluster_type, params):
+        klass, container, _ = CLUSTER_TYPES[cluster_type]
+
+        def create():
+            cluster_params = copy.deepcopy(params)
+            # Hide the servers from the moment they start.
+            cluster_params['id'] = str(uuid4())
+            container().set_pooled(cluster_params['id'])
+            try:
+                return klass(cluster_params)
+            except Exception:
+                container().set_pooled(cluster_params['id'], False)
+                raise
+        return create
+
+    @staticmethod
+    def _group(cluster):
+        return getattr(cluster, 'repl_id', None) or cluster.id
+
+    @staticmethod
+    def _destroy(cluster):
+        try:
+            # Nobody ever used a pooled cluster, no need to shut it down.
+            cluster.cleanup(fast=True)
+        except Exception:
+            logger.exception("Could not clean up pooled cluster")
+        finally:
+            ReplicaSets().set_pooled(WarmPool._group(cluster), False)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.maintain()
+            except Exception:
+                logger.exception("Warm pool maintenance failed")
+
+    def maintain(self):
+        """Evict idle clusters and start building missing ones."""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            for cluster in pool.evict_idle():
+                self._destroy(cluster)
+            for _ in range(pool.builds_needed()):
+                thread = threading.Thread(target=self._build, args=(pool,))
+                thread.daemon = True
+                thread.start()
+
+    def _build(self, pool):
+        try:
+            cluster = pool.create()
+        except Exception:
+            logger.exception("Could not build a pooled cluster")
+            pool.failed()
+        else:
+            pool.put(cluster)
+
+    def claim(self, cluster_type, params):
+        """Register a ready cluster matching params.
+        return its id, or None if there is none"""
+        if params.get('id') is not None:
+            return None
+        pool = self._pools.get(pool_key(cluster_type, params))
+        if pool is None:
+            return None
+        cluster = pool.take()
+        # Replace what was taken, and grow the pool under demand.
+        self._wakeup.set()
+        if cluster is None:
+            return None
+        try:
+            # Make sure every process is still up.
+            cluster.reset()
+        except Exception:
+            logger.exception("Discarding unhealthy pooled cluster")
+            self._destroy(cluster)
+            return None
+        _, container, id_attr = CLUSTER_TYPES[cluster_type]
+        cluster_id = getattr(cluster, id_attr)
+        container().set_pooled(self._group(cluster), False)
+        container()[cluster_id] = cluster
+        return cluster_id
+
+    def info(self):
+        with self._lock:
+            return dict(('%s/%s' % (key[0], json.loads(key[1]).get('preset')),
+                         pool.info()) for key, pool in self._pools.items())
+
+    def drain(self):
+        """Destroy all ready clusters and stop refilling the pools."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            for cluster in pool.drain():
+                self._destroy(cluster)
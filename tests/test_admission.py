@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import sys
+import threading
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.admission import Admission, member_params
+from mongo_orchestration.errors import AdmissionRejected
+from tests import unittest
+
+
+def rs_params(members):
+    return {'members': [{} for _ in range(members)]}
+
+
+class MemberParamsTestCase(unittest.TestCase):
+
+    def test_servers(self):
+        self.assertEqual([{'port': 1}],
+                         member_params('servers', {'procParams': {'port': 1}}))
+
+    def test_replica_sets(self):
+        self.assertEqual(3, len(member_params('replica_sets', rs_params(3))))
+
+    def test_sharded_clusters(self):
+        params = {'shards': [{'shardParams': rs_params(3)},
+                             {'shardParams': {'procParams': {}}}],
+                  'routers': [{}, {}]}
+        # 3 + 1 shard members, one config server, 2 routers.
+        self.assertEqual(7, len(member_params('sharded_clusters', params)))
+
+
+class AdmissionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.admission = Admission()
+        self.admission._queues = collections.OrderedDict()
+        self.admission._holding = set()
+        self.admission.configure({'max_starting': 4, 'max_processes': 10,
+                                  'max_memory_mb': None, 'max_queue': 3})
+
+    def tearDown(self):
+        for attr in ('_queues', '_holding', 'max_starting', 'max_processes',
+                     'max_memory_mb', 'max_queue', '_managed'):
+            self.admission.__dict__.pop(attr, None)
+
+    def test_admit(self):
+        ticket = self.admission.enter('a', 'replica_sets', rs_params(3))
+        self.assertIsNotNone(ticket.admitted)
+        self.assertEqual(3, self.admission.info()['starting'])
+        self.admission.release(ticket)
+        self.assertEqual(0, self.admission.info()['starting'])
+
+    def test_queue(self):
+        first = self.admission.enter('a', 'replica_sets', rs_params(3))
+        second = self.admission.enter('a', 'replica_sets', rs_params(3))
+        self.assertIsNone(second.admitted)
+        self.assertEqual(0, self.admission.position(second))
+        self.admission.release(first)
+        self.assertIsNotNone(second.admitted)
+
+    def test_clients_in_turn(self):
+        first = self.admission.enter('a', 'replica_sets', rs_params(3))
+        a1 = self.admission.enter('a', 'replica_sets', rs_params(3))
+        a2 = self.admission.enter('a', 'replica_sets', rs_params(3))
+        b1 = self.admission.enter('b', 'replica_sets', rs_params(3))
+        self.assertEqual([0, 2, 1], [self.admission.position(t)
+                                     for t in (a1, a2, b1)])
+        self.admission.release(first)
+        self.admission.release(a1)
+        self.assertIsNotNone(b1.admitted)
+        self.assertIsNone(a2.admitted)
+
+    def test_queue_full(self):
+        self.admission.enter('a', 'replica_sets', rs_params(3))
+        for _ in range(3):
+            self.admission.enter('a', 'replica_sets', rs_params(3))
+        with self.assertRaises(AdmissionRejected) as ctx:
+            self.admission.enter('b', 'replica_sets', rs_params(3))
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+    def test_too_large(self):
+        self.assertRaises(AdmissionRejected, self.admission.enter,
+                          'a', 'replica_sets', rs_params(11))
+
+    def test_timeout(self):
+        self.admission.enter('a', 'replica_sets', rs_params(3))
+        ticket = self.admission.enter('b', 'replica_sets', rs_params(3),
+                                      timeout=0.1)
+        self.assertRaises(AdmissionRejected, self.admission.run,
+                          ticket, lambda: None)
+        self.assertEqual([], self.admission.info()['queue'])
+
+    def test_run(self):
+        first = self.admission.enter('a', 'replica_sets', rs_params(3))
+        second = self.admission.enter('b', 'replica_sets', rs_params(3))
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(
+                self.admission.run(second, lambda: 'done')))
+        thread.start()
+        self.admission.release(first)
+        thread.join(5)
+        self.assertEqual(['done'], result)
+        self.assertEqual(0, self.admission.info()['starting'])
+
+    def test_memory(self):
+        self.admission.configure({'max_memory_mb': 2000})
+        params = {'members': [{'procParams': {'wiredTigerCacheSizeGB': 0.5}}
+                              for _ in range(2)]}
+        first = self.admission.enter('a', 'replica_sets', params)
+        self.assertEqual(2 * (512 + 256), first.memory_mb)
+        second = self.admission.enter('b', 'replica_sets', params)
+        self.assertIsNone(second.admitted)
+        self.admission.release(first)
+        self.assertIsNotNone(second.admitted)
+
+    def test_started_counted_once(self):
+        self.admission.configure({'max_memory_mb': 10000})
+        servers = {}
+        self.admission._managed = lambda: (
+            len(servers), sum(self.admission.memory_estimate(server.cfg)
+                              for server in servers.values()))
+        params = {'members': [{'procParams': {'wiredTigerCacheSizeGB': 0.5}}
+                              for _ in range(3)]}
+        ticket = self.admission.enter('a', 'replica_sets', params)
+        second = self.admission.enter('b', 'replica_sets', rs_params(2))
+        self.assertIsNone(second.admitted)
+
+        def create():
+            for i in range(2):
+                server = FakeServer({'wiredTigerCacheSizeGB': 0.5})
+                servers[i] = server
+                self.admission.started(i, server)
+            return self.admission.info()
+
+        info = self.admission.run(ticket, create)
+        # Two members are managed, the third and the second ticket are
+        # starting.
+        self.assertEqual(1 + 2, info['starting'])
+        self.assertEqual(3 + 2, info['processes'])
+        self.assertEqual(3 * (512 + 256) + 2 * 1024, info['memory_mb'])
+        # The second ticket got in once the members were started.
+        self.assertIsNotNone(second.admitted)
+
+    def test_started_outside_ticket(self):
+        self.admission.started('s', FakeServer({}))
+        self.assertEqual(0, self.admission.info()['starting'])
+
+
+class FakeServer(object):
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.is_mongos = False
+
+
+if __name__ == '__main__':
+    unittest.main()
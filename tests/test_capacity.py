@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.admission import Admission
+from mongo_orchestration.capacity import (
+    Capacity, host_cpus, host_memory_mb, topology_processes)
+from mongo_orchestration.errors import AdmissionRejected
+from tests import unittest
+
+
+class TopologyProcessesTestCase(unittest.TestCase):
+
+    def test_servers(self):
+        params = {'name': 'mongos'}
+        self.assertEqual([('mongos', {})],
+                         topology_processes('servers', params))
+        self.assertEqual({}, params['procParams'])
+
+    def test_sharded_clusters(self):
+        params = {'shards': [{'shardParams': {'members': [{}, {}]}},
+                             {'shardParams': {}}],
+                  'routers': [{}, {}]}
+        names = [name for name, _ in
+                 topology_processes('sharded_clusters', params)]
+        self.assertEqual(['mongod'] * 4 + ['mongos'] * 2, names)
+
+
+class CapacityTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.capacity = Capacity()
+        # A host with 16GB, 8GB for the caches of two mongods.
+        self.capacity.configure({'memory_mb': 16 * 1024,
+                                 'expected_mongods': 2})
+        self.capacity.managed = lambda: (0, 0.0, 0)
+
+    def tearDown(self):
+        for attr in ('memory_mb', 'enabled', 'max_cache_gb', 'managed',
+                     'expected_mongods'):
+            self.capacity.__dict__.pop(attr, None)
+
+    def test_host(self):
+        self.assertGreater(host_memory_mb(), 0)
+        self.assertGreater(host_cpus(), 0)
+
+    def test_cache_size(self):
+        # A share for one of the two expected mongods.
+        self.assertEqual(4.0, self.capacity.cache_size_gb(1))
+        self.assertEqual(2.66, self.capacity.cache_size_gb(3))
+        self.assertEqual(0.25, self.capacity.cache_size_gb(32))
+        self.assertRaises(AdmissionRejected,
+                          self.capacity.cache_size_gb, 100)
+        self.capacity.configure({'max_cache_gb': 1})
+        self.assertEqual(1, self.capacity.cache_size_gb(3))
+
+    def test_sequence_within_budget(self):
+        self.capacity.configure({'expected_mongods': 8})
+        caches = []
+        self.capacity.managed = lambda: (len(caches), sum(caches), 0)
+        # The first topology takes its share, not the whole budget.
+        self.assertEqual(
+            [1.0] * 3, [size for _, _, size in self.capacity.apply(
+                'replica_sets', {'members': [{}, {}, {}]})])
+        # Servers created one after another.
+        for _ in range(8):
+            proc_params = {}
+            self.capacity.size_cache(proc_params)
+            caches.append(proc_params['wiredTigerCacheSizeGB'])
+        self.assertEqual([1.0] * 8, caches)
+        self.assertLessEqual(sum(caches), self.capacity.budget_gb())
+        # The budget is spent, the next one is rejected.
+        self.assertRaises(AdmissionRejected, self.capacity.size_cache, {})
+        self.assertFalse(
+            self.capacity.plan('servers', {})['budget']['fits'])
+        self.assertEqual(0.0, self.capacity.info()['next_cache_gb'])
+
+    def test_remaining_budget(self):
+        self.capacity.managed = lambda: (1, 6.0, 0)
+        self.assertEqual(1.0, self.capacity.cache_size_gb(2))
+        # Not enough left for the smallest caches.
+        self.capacity.managed = lambda: (1, 7.5, 0)
+        self.assertEqual(0.25, self.capacity.cache_size_gb(2))
+        self.assertRaises(AdmissionRejected, self.capacity.cache_size_gb, 3)
+
+    def test_expected_mongods(self):
+        self.capacity.configure({'expected_mongods': None})
+        # Admission allows no more than 4 processes.
+        admission = Admission()
+        admission.max_processes = 4
+        try:
+            self.assertEqual(2.0, self.capacity.cache_size_gb(1))
+        finally:
+            admission.__dict__.pop('max_processes', None)
+        self.assertEqual(0.5, self.capacity.cache_size_gb(1))
+
+    def test_apply(self):
+        params = {'members': [{}, {'procParams': {'port': 1}},
+                              {'procParams': {'wiredTigerCacheSizeGB': 1}},
+                              {'procParams': {'storageEngine': 'inMemory'}}]}
+        sizes = [size for _, _, size in
+                 self.capacity.apply('replica_sets', params)]
+        self.assertEqual([4.0, 4.0, 1, None], sizes)
+        self.assertEqual(4.0, params['members'][1]['procParams'][
+            'wiredTigerCacheSizeGB'])
+
+    def test_disabled(self):
+        self.capacity.configure({'enabled': False})
+        proc_params = {}
+        self.assertIsNone(self.capacity.size_cache(proc_params))
+        self.assertEqual({}, proc_params)
+
+    def test_plan(self):
+        params = {'members': [{}, {}]}
+        plan = self.capacity.plan('replica_sets', params)
+        # Nothing changes.
+        self.assertEqual({'members': [{}, {}]}, params)
+        self.assertEqual(2, plan['mongod'])
+        self.assertEqual(8.0, plan['cache_gb'])
+        self.assertEqual(2 * (4 * 1024 + 256), plan['memory_mb'])
+        self.assertTrue(plan['budget']['fits'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+import time
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.apps import writes
+from mongo_orchestration.coalescing import Coalescer
+from tests import unittest
+
+
+class CoalescerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.coalescer = Coalescer()
+        self.coalescer._flights = {}
+        self.coalescer._generation = 0
+        self.coalescer._stats = dict.fromkeys(
+            ('requests', 'computed', 'merged', 'failed'), 0)
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def tearDown(self):
+        for attr in ('_flights', '_stats', '_generation'):
+            self.coalescer.__dict__.pop(attr, None)
+
+    def compute(self, value):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(10)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def run_concurrently(self, key, value, followers=4):
+        results = []
+
+        def call():
+            try:
+                results.append(self.coalescer.run(key, self.compute, value))
+            except Exception as exc:
+                results.append(exc)
+        leader = threading.Thread(target=call)
+        leader.start()
+        self.assertTrue(self.started.wait(10))
+        threads = [threading.Thread(target=call) for _ in range(followers)]
+        for thread in threads:
+            thread.start()
+        # Every follower waits for the leader.
+        while self.coalescer.info()['requests'] < followers + 1:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in [leader] + threads:
+            thread.join()
+        return results
+
+    def test_merge(self):
+        results = self.run_concurrently('a', 'body')
+        self.assertEqual(['body'] * 5, results)
+        self.assertEqual(1, self.calls)
+        info = self.coalescer.info()
+        self.assertEqual(1, info['computed'])
+        self.assertEqual(4, info['merged'])
+        self.assertEqual(0, info['in_flight'])
+        self.assertEqual(0.8, info['merge_ratio'])
+
+    def test_error_shared(self):
+        results = self.run_concurrently('a', ValueError('boom'), followers=2)
+        self.assertEqual(3, len(results))
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(1, self.coalescer.info()['failed'])
+
+    def test_not_kept(self):
+        self.release.set()
+        self.coalescer.run('a', self.compute, 1)
+        self.assertEqual(2, self.coalescer.run('a', self.compute, 2))
+        self.assertEqual(2, self.calls)
+
+    def test_other_keys(self):
+        self.release.set()
+        self.coalescer.run('a', self.compute, 1)
+        self.coalescer.run('b', self.compute, 1)
+        self.assertEqual(0, self.coalescer.info()['merged'])
+
+    def test_read_your_writes(self):
+        results = {}
+
+        def call(value):
+            results[value] = self.coalescer.run('a', self.compute, value)
+        leader = threading.Thread(target=call, args=('before',))
+        leader.start()
+        self.assertTrue(self.started.wait(10))
+        # A write finishes while the read that started before it runs,
+        # the next read doesn't join it.
+        writes(lambda: None)()
+        reader = threading.Thread(target=call, args=('after',))
+        reader.start()
+        deadline = time.time() + 10
+        while self.calls < 2 and time.time() < deadline:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in (leader, reader):
+            thread.join()
+        self.assertEqual({'before': 'before', 'after': 'after'}, results)
+        self.assertEqual(0, self.coalescer.info()['merged'])
+        self.assertEqual(1, self.coalescer.info()['generation'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+
+import pymongo
+
+from pymongo.server_api import ServerApi
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.connections import (
+    ClientPool, client_key, split_hosts)
+from mongo_orchestration.servers import Server, Servers
+from tests import unittest
+
+
+class ClientKeyTestCase(unittest.TestCase):
+
+    def test_split_hosts(self):
+        self.assertEqual(['a:1'], split_hosts('a:1'))
+        self.assertEqual(['a:1', 'b:2'], split_hosts('A:1,b:2'))
+        self.assertEqual(
+            ['a:1', 'b:2'],
+            split_hosts('mongodb://user:pwd@a:1,b:2/?replicaSet=rs'))
+
+    def test_client_key(self):
+        key = client_key('a:1', {'username': 'luke', 'w': 2})
+        self.assertEqual(key, client_key('a:1', {'w': 2, 'username': 'luke'}))
+        self.assertNotEqual(key, client_key('a:1', {'w': 2}))
+        self.assertNotEqual(key, client_key('a:2', {'username': 'luke', 'w': 2}))
+        self.assertEqual(
+            client_key('a:1', {'server_api': ServerApi('1')}),
+            client_key('a:1', {'server_api': ServerApi('1')}))
+        self.assertNotEqual(
+            client_key('a:1', {
+                'read_preference': pymongo.ReadPreference.PRIMARY}),
+            client_key('a:1', {
+                'read_preference': pymongo.ReadPreference.SECONDARY}))
+
+    def test_client_key_hides_password(self):
+        key = client_key('mongodb://luke:secret@a:1',
+                         {'username': 'luke', 'password': 'secret'})
+        self.assertNotIn('secret', repr(key))
+        self.assertNotEqual(key, client_key(
+            'mongodb://luke:secret@a:1',
+            {'username': 'luke', 'password': 'other'}))
+
+
+class ClientPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ClientPool()
+        self.pool.clear()
+        self.mongod = os.path.join(Servers().bin_path(), 'mongod')
+        self.server = Server(self.mongod, {})
+        self.server.start(30)
+
+    def tearDown(self):
+        self.pool.__dict__.pop('check_interval', None)
+        self.server.stop()
+        self.server.cleanup()
+        self.pool.clear()
+
+    def test_singleton(self):
+        self.assertEqual(id(self.pool), id(ClientPool()))
+
+    def test_reuse(self):
+        client = self.server.connection
+        self.assertIs(client, self.server.connection)
+        self.assertEqual(1, len(self.pool))
+
+    def test_invalidate(self):
+        client = self.server.connection
+        self.pool.invalidate(self.server.hostname)
+        self.assertEqual(0, len(self.pool))
+        self.assertIsNot(client, self.server.connection)
+
+    def test_unhealthy_client_replaced(self):
+        self.pool.check_interval = 0
+        client = self.server.connection
+        client.close()
+        replacement = self.server.connection
+        self.assertIsNot(client, replacement)
+        self.assertTrue(replacement.admin.command('ping')['ok'])
+
+    def test_stop_invalidates(self):
+        self.server.connection
+        self.server.stop()
+        self.assertEqual(0, len(self.pool))
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.healthy = True
+        self.checks = 0
+        self.closed = False
+        self.admin = self
+
+    def command(self, name):
+        self.checks += 1
+        if not self.healthy:
+            raise pymongo.errors.AutoReconnect('down')
+        return {'ok': 1}
+
+    def close(self):
+        self.closed = True
+
+
+class ClientPoolHealthCheckTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ClientPool()
+        self.pool.clear()
+        self.created = []
+
+    def tearDown(self):
+        self.pool.__dict__.pop('check_interval', None)
+        self.pool.clear()
+
+    def factory(self):
+        self.created.append(FakeClient())
+        return self.created[-1]
+
+    def test_checked_at_most_every_interval(self):
+        client = self.pool.get('a:1', {}, self.factory)
+        self.assertIs(client, self.pool.get('a:1', {}, self.factory))
+        self.assertEqual(0, client.checks)
+        self.pool.check_interval = 0
+        self.assertIs(client, self.pool.get('a:1', {}, self.factory))
+        self.assertEqual(1, client.checks)
+
+    def test_unhealthy_client_replaced(self):
+        self.pool.check_interval = 0
+        client = self.pool.get('a:1', {}, self.factory)
+        client.healthy = False
+        replacement = self.pool.get('a:1', {}, self.factory)
+        self.assertIsNot(client, replacement)
+        self.assertTrue(client.closed)
+        self.assertEqual(1, len(self.pool))
+
+
+if __name__ == '__main__':
+    unittest.main()
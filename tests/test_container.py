@@ -115,5 +115,58 @@ class ContainerTestCase(unittest.TestCase):
         self.assertRaises(NotImplementedError, self.container.remove)
         self.assertRaises(NotImplementedError, self.container.info)
 
+
+class Item(object):
+    def __init__(self, name, group=None):
+        self.name = name
+        self.group = group
+
+
+class IndexedContainer(Container):
+    _obj_type = Item
+    _indexed_attrs = ('name', 'group')
+
+
+class IndexedContainerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.container = IndexedContainer()
+        self.container.set_settings()
+
+    def tearDown(self):
+        self.container.cleanup()
+
+    def test_find(self):
+        a, b = Item('a', 'g'), Item('b', 'g')
+        self.container['1'] = a
+        self.container['2'] = b
+        self.container['3'] = Item('c')
+        self.assertEqual('1', self.container.find_one('name', 'a'))
+        self.assertEqual({'1', '2'}, self.container.find('group', 'g'))
+        self.assertIsNone(self.container.find_one('name', 'd'))
+        self.assertEqual('2', self.container.key_of(b))
+
+    def test_reindex(self):
+        a = Item('a')
+        self.container['1'] = a
+        a.name = 'b'
+        self.assertEqual('1', self.container.find_one('name', 'a'))
+        self.container.reindex('1')
+        self.assertIsNone(self.container.find_one('name', 'a'))
+        self.assertEqual('1', self.container.find_one('name', 'b'))
+
+    def test_delitem(self):
+        a = Item('a', 'g')
+        self.container['1'] = a
+        del self.container['1']
+        self.assertEqual(set(), self.container.find('group', 'g'))
+        self.assertIsNone(self.container.key_of(a))
+        self.assertEqual({}, self.container._indexes['name'])
+
+    def test_cleanup(self):
+        self.container['1'] = Item('a')
+        self.container.cleanup()
+        self.assertIsNone(self.container.find_one('name', 'a'))
+
+
 if __name__ == '__main__':
     unittest.main()
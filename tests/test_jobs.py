@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.jobs import Job, Jobs, current_job, report_phase
+from mongo_orchestration.scheduler import Scheduler
+from tests import unittest
+
+
+class JobsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.jobs = Jobs()
+
+    def tearDown(self):
+        self.jobs.clear()
+
+    def test_singleton(self):
+        self.assertEqual(id(self.jobs), id(Jobs()))
+
+    def test_submit(self):
+        def create(params):
+            report_phase('ports allocated')
+            report_phase('processes spawned')
+            return {'id': params['id']}
+
+        job = self.jobs.submit('replica_sets', create, {'id': 'rs'})
+        self.assertIn(job.id, self.jobs)
+        self.assertTrue(job.wait(10))
+        info = job.info()
+        self.assertEqual(Job.DONE, info['state'])
+        self.assertEqual({'id': 'rs'}, info['result'])
+        self.assertEqual(['ports allocated', 'processes spawned'],
+                         [p['phase'] for p in info['phases']])
+
+    def test_failure(self):
+        def create():
+            raise RuntimeError('boom')
+
+        job = self.jobs.submit('sharded_clusters', create)
+        self.assertTrue(job.wait(10))
+        info = job.info()
+        self.assertEqual(Job.FAILED, info['state'])
+        self.assertIn('boom', info['error'])
+        self.assertNotIn('result', info)
+
+    def test_wait_timeout(self):
+        event = threading.Event()
+        job = self.jobs.submit('replica_sets', event.wait, 10)
+        self.assertFalse(job.wait(0.1))
+        self.assertEqual(Job.RUNNING, job.info()['state'])
+        event.set()
+        self.assertTrue(job.wait(10))
+
+    def test_report_phase_from_task(self):
+        def create():
+            report_phase('submitted')
+            Scheduler().submit(None, report_phase, 'inline').result()
+            # Run by a worker thread.
+            started = threading.Event()
+            task = Scheduler().submit(
+                None, lambda: started.set() or report_phase('worker'))
+            started.wait(10)
+            task.result()
+
+        job = self.jobs.submit('sharded_clusters', create)
+        self.assertTrue(job.wait(10))
+        self.assertEqual(['submitted', 'inline', 'worker'],
+                         [p['phase'] for p in job.info()['phases']])
+
+    def test_report_phase_outside_job(self):
+        self.assertIsNone(current_job())
+        report_phase('ignored')
+
+    def test_evict_finished(self):
+        max_finished = Jobs.max_finished
+        Jobs.max_finished = 2
+        try:
+            jobs = [self.jobs.submit('replica_sets', lambda: None)
+                    for _ in range(3)]
+            for job in jobs:
+                job.wait(10)
+            self.jobs.submit('replica_sets', lambda: None).wait(10)
+            self.assertNotIn(jobs[0].id, self.jobs)
+            self.assertIn(jobs[2].id, self.jobs)
+        finally:
+            Jobs.max_finished = max_finished
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration import process
+from mongo_orchestration.liveness import ProcessWatcher
+from tests import unittest
+
+SLEEP = [sys.executable, '-c', 'import time; time.sleep(60)']
+
+
+def wait_dead(proc, timeout=5):
+    deadline = time.time() + timeout
+    while process.proc_alive(proc) and time.time() < deadline:
+        time.sleep(0.01)
+    return not process.proc_alive(proc)
+
+
+class ProcessWatcherTestCase(unittest.TestCase):
+
+    def test_exit(self):
+        proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+        ProcessWatcher().watch(proc)
+        self.assertTrue(wait_dead(proc))
+        self.assertIsNotNone(proc.returncode)
+        self.assertNotIn(proc.pid, ProcessWatcher().pids())
+
+    def test_kill(self):
+        proc = subprocess.Popen(SLEEP)
+        ProcessWatcher().watch(proc)
+        self.assertTrue(process.proc_alive(proc))
+        self.assertIn(proc.pid, ProcessWatcher().pids())
+        proc.kill()
+        self.assertTrue(wait_dead(proc))
+
+    def test_waited_elsewhere(self):
+        proc = subprocess.Popen(SLEEP)
+        ProcessWatcher().watch(proc)
+        proc.terminate()
+        proc.wait()
+        self.assertFalse(process.proc_alive(proc))
+
+    def test_not_watched(self):
+        proc = subprocess.Popen(SLEEP)
+        self.assertIsNone(ProcessWatcher().alive(proc))
+        self.assertTrue(process.proc_alive(proc))
+        proc.kill()
+        proc.wait()
+        self.assertFalse(process.proc_alive(proc))
+
+
+class PollingWatcher(ProcessWatcher):
+    """A watcher without select.poll, like on Windows."""
+    use_poll = False
+    interval = 0.05
+
+    _lock = threading.Lock()
+    _thread = None
+    _watched = {}
+
+
+class PollingWatcherTestCase(unittest.TestCase):
+
+    def test_exit(self):
+        watcher = PollingWatcher()
+        proc = subprocess.Popen(SLEEP)
+        watcher.watch(proc)
+        self.assertTrue(watcher.alive(proc))
+        self.assertIsNone(watcher._wakeup_fds)
+        proc.kill()
+        deadline = time.time() + 5
+        while proc.pid in watcher.pids() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertNotIn(proc.pid, watcher.pids())
+        self.assertFalse(watcher.alive(proc))
+
+
+@unittest.skipIf(platform.system() == 'Windows', 'no process groups')
+class ProcessGroupsTestCase(unittest.TestCase):
+
+    def spawn(self, group):
+        proc = process.ProcessGroups().popen(SLEEP, group)
+        ProcessWatcher().watch(proc)
+        self.procs.append(proc)
+        return proc
+
+    def setUp(self):
+        self.procs = []
+
+    def tearDown(self):
+        for proc in self.procs:
+            process.kill_mprocess(proc, fast=True)
+
+    def test_shared_group(self):
+        first = self.spawn('cluster-a')
+        second = self.spawn('cluster-a')
+        other = self.spawn('cluster-b')
+        self.assertEqual(first.pid, os.getpgid(first.pid))
+        self.assertEqual(first.pid, os.getpgid(second.pid))
+        self.assertEqual(other.pid, os.getpgid(other.pid))
+        self.assertNotEqual(os.getpgid(0), os.getpgid(first.pid))
+        self.assertEqual(1, process.ProcessGroups().kill('cluster-a'))
+        self.assertTrue(wait_dead(first))
+        self.assertTrue(wait_dead(second))
+        self.assertTrue(process.proc_alive(other))
+        process.ProcessGroups().forget('cluster-b')
+
+    def test_fast_teardown(self):
+        groups = ['teardown-%d' % i for i in range(20)]
+        for group in groups:
+            for _ in range(3):
+                self.spawn(group)
+        t_start = time.time()
+        for group in groups:
+            process.ProcessGroups().kill(group)
+        for proc in self.procs:
+            process.kill_mprocess(proc, fast=True)
+        self.assertLess(time.time() - t_start, 1)
+        for proc in self.procs:
+            self.assertFalse(process.proc_alive(proc))
+
+    def test_kill_forgotten_group(self):
+        proc = self.spawn('forgotten')
+        process.ProcessGroups().forget('forgotten')
+        self.assertEqual(0, process.ProcessGroups().kill('forgotten'))
+        self.assertTrue(process.proc_alive(proc))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from bottle import request, response
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration import logs
+from mongo_orchestration.apps.servers import host_log
+from mongo_orchestration.servers import Servers
+from tests import unittest
+
+
+class LogsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, data):
+        with open(self.path, 'w') as fd:
+            fd.write(data)
+
+    def test_tail(self):
+        self.write(''.join('line %d\n' % i for i in range(1000)))
+        self.assertEqual('line 998\nline 999\n', logs.tail(self.path, 2))
+        self.assertEqual('', logs.tail(self.path, 0))
+
+    def test_tail_without_trailing_newline(self):
+        self.write('a\nb\nc')
+        self.assertEqual('b\nc', logs.tail(self.path, 2))
+        self.assertEqual('a\nb\nc', logs.tail(self.path, 10))
+
+    def test_tail_max_bytes(self):
+        self.write('x' * 100 + '\n')
+        self.assertEqual('x' * 9 + '\n', logs.tail(self.path, 1, max_bytes=10))
+
+    def test_iter_range(self):
+        self.write('0123456789')
+        self.assertEqual(b'2345', b''.join(logs.iter_range(self.path, 2, 6)))
+
+    def test_output_buffer(self):
+        read_fd, write_fd = os.pipe()
+        proc = subprocess.Popen(
+            [sys.executable, '-c', 'for i in range(10): print(i)'],
+            stdout=write_fd)
+        os.close(write_fd)
+        output = logs.OutputBuffer(os.fdopen(read_fd, 'rb'), maxlen=3)
+        proc.wait()
+        output.wait(10)
+        self.assertEqual('7\n8\n9\n', output.text())
+
+
+class HostLogParamsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        Servers()._storage['log-params'] = None
+
+    def tearDown(self):
+        Servers()._storage.pop('log-params', None)
+
+    def get(self, query):
+        request.bind({'REQUEST_METHOD': 'GET', 'QUERY_STRING': query})
+        response.bind()
+        return host_log('log-params'), response.status_code
+
+    def test_invalid(self):
+        for query in ('tail=-1', 'tail=x', 'since=-5', 'tail=1.5'):
+            body, status = self.get(query)
+            self.assertEqual(400, status, query)
+            self.assertIn('tail' if 'tail' in query else 'since', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
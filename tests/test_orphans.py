@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration import process
+from mongo_orchestration.liveness import ProcessWatcher
+from mongo_orchestration.orphans import Orphans
+from tests import unittest, SkipTest
+
+
+class OrphansTestCase(unittest.TestCase):
+
+    def setUp(self):
+        if not os.path.exists('/proc/self/cmdline'):
+            raise SkipTest('needs /proc')
+        self.procs = []
+        fd, self.pids_file = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(self.pids_file)
+
+    def tearDown(self):
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        process.PidRegistry().path = None
+        for path in (self.pids_file, self.pids_file + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def spawn(self):
+        """start a process that looks like a mongod started by us"""
+        dbpath = tempfile.mkdtemp()
+        cfg = {'dbpath': dbpath, 'port': 1999}
+        config_path = process.write_config(cfg)
+        proc = subprocess.Popen(
+            [sys.executable, '-c', 'import time; time.sleep(60)',
+             '--config', config_path])
+        self.procs.append(proc)
+        # Our children stay zombies until someone waits for them.
+        threading.Thread(target=proc.wait).start()
+        return proc, config_path, dbpath
+
+    def test_reap(self):
+        proc, config_path, dbpath = self.spawn()
+        process.PidRegistry().open(self.pids_file)
+        process.PidRegistry().add(proc.pid, config_path)
+        process.PortPool().claim(1999)
+
+        recorded = process.PidRegistry().open(self.pids_file)
+        self.assertEqual({proc.pid: config_path}, recorded)
+        report = Orphans().reap(recorded)
+        self.assertEqual([proc.pid], report['processes'])
+        self.assertEqual([dbpath], report['dbpaths'])
+        self.assertEqual([1999], report['ports'])
+        self.assertIsNotNone(proc.wait(5))
+        self.assertFalse(os.path.exists(dbpath))
+        self.assertFalse(os.path.exists(config_path))
+        self.assertEqual({}, process.PidRegistry().open(self.pids_file))
+        self.assertEqual([proc.pid], Orphans().info()['processes'])
+
+    def test_skip_adopted(self):
+        proc, config_path, dbpath = self.spawn()
+        ProcessWatcher().watch(proc)
+        report = Orphans().reap({proc.pid: config_path})
+        self.assertEqual([], report['processes'])
+        self.assertIsNone(proc.poll())
+        process.cleanup_mprocess(config_path, {'dbpath': dbpath})
+
+    def test_skip_other_process(self):
+        proc, config_path, dbpath = self.spawn()
+        other = process.write_config({})
+        report = Orphans().reap({proc.pid: other})
+        self.assertEqual([], report['processes'])
+        self.assertIsNone(proc.poll())
+        process.cleanup_mprocess(config_path, {'dbpath': dbpath})
+        process.remove_path(other)
+
+
+if __name__ == '__main__':
+    unittest.main()
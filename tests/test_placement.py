@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.placement import (
+    ioprio_value, numa_nodes, parse_cpulist, Placement, Slot)
+from tests import unittest, SkipTest
+
+
+class PlacementTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.placement = Placement()
+        self.placement._slots = {}
+        self.placement._users = collections.Counter()
+        self.placement._nodes = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+        self.placement.enabled = True
+        self.placement.cpus_per_cluster = 2
+
+    def tearDown(self):
+        for attr in ('_slots', '_users', '_nodes', 'enabled',
+                     'cpus_per_cluster'):
+            self.placement.__dict__.pop(attr, None)
+
+    def test_parse_cpulist(self):
+        self.assertEqual([0, 1, 2, 3, 8, 10, 11],
+                         parse_cpulist('0-3,8,10-11\n'))
+
+    def test_numa_nodes(self):
+        nodes = numa_nodes()
+        self.assertTrue(nodes)
+        self.assertTrue(all(nodes.values()))
+
+    def test_ioprio_value(self):
+        self.assertEqual((2 << 13) | 7,
+                         ioprio_value({'class': 'best-effort', 'level': 7}))
+        self.assertEqual(3 << 13, ioprio_value({'class': 'idle'}))
+
+    def test_disabled(self):
+        self.placement.enabled = False
+        self.assertIsNone(self.placement.place('a'))
+
+    def test_place(self):
+        a = self.placement.place('a')
+        self.assertIs(a, self.placement.place('a'))
+        b = self.placement.place('b')
+        c = self.placement.place('c')
+        self.assertEqual([[0, 1], [2, 3], [4, 5]], [a.cpus, b.cpus, c.cpus])
+        self.assertEqual([0, 0, 1], [a.node, b.node, c.node])
+        self.placement.release('a')
+        self.assertEqual([0, 1], self.placement.place('d').cpus)
+
+    def test_shared_when_full(self):
+        self.placement.cpus_per_cluster = 4
+        self.placement.place('a')
+        self.placement.place('b')
+        c = self.placement.place('c')
+        # Every CPU is used once, c shares a whole node.
+        self.assertEqual([0, 1, 2, 3], c.cpus)
+
+    def test_larger_than_a_node(self):
+        self.placement.cpus_per_cluster = 6
+        slot = self.placement.place('a')
+        self.assertEqual(6, len(slot.cpus))
+        self.assertIsNone(slot.node)
+
+    def test_of(self):
+        slot = self.placement.place('a')
+        self.placement.started(slot, 12345)
+        self.assertEqual([0, 1], self.placement.of(12345)['cpus'])
+        self.assertIsNone(self.placement.of(54321))
+
+    def test_apply(self):
+        if not hasattr(os, 'sched_setaffinity'):
+            raise SkipTest('no sched_setaffinity')
+        cpu = min(os.sched_getaffinity(0))
+        slot = Slot('a', [cpu], 0, {'class': 'best-effort', 'level': 7},
+                    {'core': [0, 0]})
+        proc = subprocess.Popen(
+            [sys.executable, '-c',
+             'import os, resource, sys; sys.stdin.readline(); '
+             'print(sorted(os.sched_getaffinity(0)), '
+             'resource.getrlimit(resource.RLIMIT_CORE))'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # Bound from the parent once it runs.
+        slot.apply(proc.pid)
+        output = proc.communicate(b'\n')[0]
+        self.assertEqual('[%d] (0, 0)' % cpu, output.decode().strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
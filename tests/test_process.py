@@ -21,6 +21,7 @@ import socket
 import subprocess
 import sys
 import tempfile
+import threading
 
 sys.path.insert(0, '../')
 
@@ -132,6 +133,63 @@ class PortPoolTestCase(unittest.TestCase):
         ports = self.pp._PortPool__closed.union(self.pp._PortPool__ports)
         self.assertTrue(ports == random_ports)
 
+    def test_ports_contiguous(self):
+        self.pp.change_range(min_port=1100, max_port=1200)
+        ports = self.pp.ports(3, check=True)
+        self.assertEqual(list(range(ports[0], ports[0] + 3)), ports)
+        for port in ports:
+            self.assertIn(port, self.pp._PortPool__closed)
+
+    def test_ports_skip_busy(self):
+        self.pp.change_range(min_port=1100, max_port=1200)
+        first = self.pp.port(check=True)
+        self.pp.release_port(first)
+        self.listen_port(first + 1)
+        ports = self.pp.ports(3, check=True)
+        self.assertNotIn(first + 1, ports)
+        self.assertEqual(list(range(ports[0], ports[0] + 3)), ports)
+
+    def test_port_thread_safety(self):
+        self.pp.change_range(min_port=1100, max_port=1300)
+        ports = []
+
+        def allocate():
+            for _ in range(20):
+                ports.append(self.pp.port())
+
+        threads = [threading.Thread(target=allocate) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(200, len(set(ports)))
+
+    def test_reserve(self):
+        if platform.system() != 'Linux':
+            raise SkipTest("placeholders are only used on Linux")
+        self.pp.change_range(min_port=1100, max_port=1200)
+        port = self.pp.port(check=True, reserve=True)
+        self.assertRaises(socket.error, self.listen_port, port)
+        self.pp.release_placeholder(port)
+        self.listen_port(port)
+
+    def test_reserve_reuseaddr(self):
+        if platform.system() != 'Linux':
+            raise SkipTest("placeholders are only used on Linux")
+        self.pp.change_range(min_port=1100, max_port=1200)
+        ports = self.pp.ports(2, check=True, reserve=True)
+        # mongod sets SO_REUSEADDR, it binds the ports the placeholders hold.
+        for port in ports:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((process.DEFAULT_BIND, port))
+            s.listen(0)
+            s.close()
+        self.pp.release_port(ports[0])
+        self.listen_port(ports[0])
+        self.assertRaises(socket.error, self.listen_port, ports[1])
+        self.pp.release_port(ports[1])
+
 
 class ProcessTestCase(unittest.TestCase):
     def setUp(self):
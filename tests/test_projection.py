@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.apps import gather_info
+from mongo_orchestration.projection import parse_fields, project, wants
+from tests import unittest
+
+INFO = {'id': 'rs', 'mongodb_uri': 'mongodb://h:1',
+        'members': [{'_id': 0, 'host': 'h:1', 'state': 1},
+                    {'_id': 1, 'host': 'h:2', 'state': 2}],
+        'snapshot': {'version': 1, 'age': 0.1}}
+
+
+class FakeContainer(object):
+
+    def __init__(self, infos, listed=None):
+        self.infos = infos
+        self.listed_ids = listed or sorted(infos)
+        self.fields = []
+
+    def listed(self):
+        return list(self.listed_ids)
+
+    def info(self, resource_id, fields=None):
+        self.fields.append(fields)
+        return dict(self.infos[resource_id])
+
+
+class ProjectionTestCase(unittest.TestCase):
+
+    def test_parse_fields(self):
+        self.assertIsNone(parse_fields(None))
+        self.assertIsNone(parse_fields(''))
+        self.assertEqual({'mongodb_uri': None, 'members': {'state': None}},
+                         parse_fields('mongodb_uri, members.state'))
+        # The whole field wins over a part of it.
+        self.assertEqual({'members': None},
+                         parse_fields('members.state,members'))
+        self.assertEqual({'members': None},
+                         parse_fields('members,members.state'))
+
+    def test_wants(self):
+        self.assertTrue(wants(None, 'members'))
+        self.assertTrue(wants({'members': None}, 'id', 'members'))
+        self.assertFalse(wants({'id': None}, 'members'))
+
+    def test_project(self):
+        self.assertIs(INFO, project(INFO, None))
+        self.assertEqual(
+            {'mongodb_uri': 'mongodb://h:1',
+             'members': [{'state': 1}, {'state': 2}]},
+            project(INFO, parse_fields('mongodb_uri,members.state,missing')))
+        self.assertEqual({'snapshot': INFO['snapshot']},
+                         project(INFO, parse_fields('snapshot')))
+
+    def test_gather_info(self):
+        servers = FakeContainer({'a': {'id': 'a', 'port': 1},
+                                 'b': {'id': 'b', 'port': 2}})
+        replica_sets = FakeContainer({'rs': INFO})
+        fields = parse_fields('port,members.host')
+        infos = gather_info({'servers': servers,
+                             'replica_sets': replica_sets}, fields)
+        self.assertEqual({'a': {'port': 1}, 'b': {'port': 2}},
+                         infos['servers'])
+        self.assertEqual({'rs': {'members': [{'host': 'h:1'},
+                                             {'host': 'h:2'}]}},
+                         infos['replica_sets'])
+        # The info methods see the projection.
+        self.assertEqual([fields], replica_sets.fields)
+
+    def test_gather_info_removed(self):
+        # 'gone' is listed, then removed before its info is read.
+        servers = FakeContainer({'a': {'id': 'a'}}, listed=['a', 'gone'])
+        self.assertEqual({'a': {'id': 'a'}},
+                         gather_info({'servers': servers})['servers'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+import time
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.readiness import (
+    Backoff, TopologyListener, wait_until)
+from tests import unittest
+
+
+class BackoffTestCase(unittest.TestCase):
+
+    def test_next(self):
+        backoff = Backoff(initial=0.1, maximum=0.5)
+        self.assertEqual([0.1, 0.2, 0.4, 0.5, 0.5],
+                         [backoff.next() for _ in range(5)])
+
+
+class WaitUntilTestCase(unittest.TestCase):
+
+    def test_condition_met(self):
+        calls = []
+
+        def predicate():
+            calls.append(1)
+            return len(calls) == 3
+
+        self.assertTrue(wait_until(predicate, 10, backoff=Backoff(0.01)))
+        self.assertEqual(3, len(calls))
+
+    def test_timeout(self):
+        t_start = time.time()
+        self.assertFalse(wait_until(lambda: False, 0.5))
+        self.assertLess(time.time() - t_start, 2)
+
+    def test_wakes_on_event(self):
+        listener = TopologyListener()
+        ready = []
+
+        def become_ready():
+            ready.append(True)
+            listener.notify()
+
+        timer = threading.Timer(0.2, become_ready)
+        timer.start()
+        t_start = time.time()
+        # The fallback backoff alone would not re-check for 30 seconds.
+        self.assertTrue(wait_until(lambda: ready, 60, listener,
+                                   Backoff(initial=30)))
+        self.assertLess(time.time() - t_start, 10)
+        timer.join()
+
+    def test_listener_generation(self):
+        listener = TopologyListener()
+        generation = listener.generation
+        self.assertFalse(listener.wait(generation, 0.1))
+        listener.notify()
+        self.assertTrue(listener.wait(generation, 0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
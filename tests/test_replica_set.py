@@ -27,7 +27,7 @@ from mongo_orchestration.replica_sets import ReplicaSet
 from mongo_orchestration.servers import Servers
 from mongo_orchestration.process import PortPool
 from tests import (
-    SkipTest, certificate, TEST_SUBJECT, unittest,
+    SkipTest, assert_eventually, certificate, TEST_SUBJECT, unittest,
     SERVER_VERSION, SSLTestCase, TEST_RELEASES)
 
 logging.basicConfig(level=logging.DEBUG)
@@ -270,6 +270,18 @@ class ReplicaSetTestCase(unittest.TestCase):
         self.repl.member_command(1, 'stop')
         self.assertFalse(self.repl.wait_while_reachable(servers, timeout=10))
 
+    def test_config_state_diff(self):
+        self.repl = ReplicaSet(self.repl_cfg)
+        self.assertEqual({}, self.repl.config_state_diff())
+        self.assertTrue(self.repl.check_config_state())
+        # A stopped member has not converged.
+        self.repl.member_command(1, 'stop')
+        assert_eventually(lambda: 1 in self.repl.config_state_diff(),
+                          'the stopped member is still reported healthy')
+        self.assertEqual({'health': (1, 0)},
+                         self.repl.config_state_diff()[1])
+        self.assertFalse(self.repl.check_config_state())
+
     def test_reset(self):
         self.repl_cfg = {'members': [{}, {}, {}]}
         self.repl = ReplicaSet(self.repl_cfg)
@@ -472,6 +484,17 @@ class ReplicaSetAuthTestCase(unittest.TestCase):
         if len(self.repl) > 0:
             self.repl.cleanup()
 
+    def test_auth_bootstrap(self):
+        self.repl.cleanup()
+        self.repl = ReplicaSet(dict(self.repl_cfg, authBootstrap=True))
+        self.assertTrue(self.repl.auth_bootstrap)
+        self.assertFalse(self.repl.restart_required)
+        for server in self.repl.server_instances():
+            self.assertIn('keyFile', server.cfg)
+        self.assertTrue(isinstance(self.repl.connection().admin.list_collection_names(), list))
+        c = pymongo.MongoClient(self.repl.primary(), replicaSet=self.repl.repl_id)
+        self.assertRaises(pymongo.errors.OperationFailure, c.admin.list_collection_names)
+
     def test_auth_connection(self):
         self.assertTrue(isinstance(self.repl.connection().admin.list_collection_names(), list))
         c = pymongo.MongoClient(self.repl.primary(), replicaSet=self.repl.repl_id)
@@ -365,5 +365,46 @@ class ReplicaSetsTestCase(unittest.TestCase):
         self.assertFalse(self.rs.member_info(repl_id, hidden['_id'])['rsInfo'].get('hidden', False))
 
 
+class FakeServers(object):
+
+    def __init__(self):
+        self.removed = []
+
+    def remove(self, server_id, fast=False):
+        self.removed.append(server_id)
+
+
+class MemberSpawnAbortTestCase(unittest.TestCase):
+
+    def setUp(self):
+        PortPool().change_range(min_port=1100, max_port=1200)
+        self.repl = ReplicaSet.__new__(ReplicaSet)
+        self.repl._servers = FakeServers()
+        self.ports = []
+        self.created = []
+
+    def tearDown(self):
+        PortPool().change_range()
+
+    def member_server(self, params, member_id, port=None, autostart=True):
+        self.ports.append(port)
+        if member_id == 1:
+            raise RuntimeError('boom')
+        server_id = 'member-%d' % member_id
+        self.created.append(server_id)
+        return {'_id': member_id}, server_id
+
+    def test_failed_start_gives_ports_back(self):
+        self.repl._member_server = self.member_server
+        self.assertRaises(RuntimeError, self.repl._spawn_members,
+                          [{}, {}, {}])
+        # Members that started are removed, the others never ran.
+        self.assertEqual(sorted(self.created),
+                         sorted(self.repl._servers.removed))
+        # The whole block is free again, placeholders included.
+        self.assertLessEqual(set(self.ports),
+                             set(PortPool().ports(3, check=True)))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import concurrent.futures
+import sys
+import threading
+import time
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.scheduler import (
+    as_completed, Scheduler, Task, COMMAND, SPAWN)
+from tests import unittest
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+
+    def test_map(self):
+        self.assertEqual([0, 2, 4, 6],
+                         self.scheduler.map(COMMAND, lambda x: x * 2,
+                                            range(4)))
+
+    def test_exception(self):
+        def fail():
+            raise ValueError('boom')
+        task = self.scheduler.submit(COMMAND, fail)
+        self.assertRaises(ValueError, task.result)
+        self.assertGreaterEqual(
+            self.scheduler.info()['kinds'][COMMAND]['failed'], 1)
+
+    def test_limit(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+
+        def spawn():
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+
+        limits = self.scheduler.limits
+        self.scheduler.limits = dict(limits, **{SPAWN: 2})
+        try:
+            tasks = [self.scheduler.submit(SPAWN, spawn) for _ in range(10)]
+            for task in tasks:
+                task.result()
+        finally:
+            self.scheduler.limits = limits
+        self.assertLessEqual(state['max'], 2)
+
+    def test_nested(self):
+        # More parents waiting for children than there are workers.
+        def parent(i):
+            children = [self.scheduler.submit(SPAWN, lambda j=j: i * 10 + j)
+                        for j in range(3)]
+            return sum(child.result() for child in children)
+
+        max_workers = self.scheduler.max_workers
+        self.scheduler.max_workers = 2
+        try:
+            tasks = [self.scheduler.submit(None, parent, i)
+                     for i in range(20)]
+            results = [task.result(timeout=30) for task in tasks]
+        finally:
+            self.scheduler.max_workers = max_workers
+        self.assertEqual([i * 30 + 3 for i in range(20)], results)
+
+    def test_as_completed(self):
+        started = threading.Event()
+        event = threading.Event()
+
+        def wait():
+            started.set()
+            return event.wait(10)
+        slow = self.scheduler.submit(COMMAND, wait)
+        # A worker runs slow, as_completed mustn't run it inline.
+        self.assertTrue(started.wait(10))
+        fast = self.scheduler.submit(COMMAND, lambda: 'fast')
+        completed = as_completed([slow, fast])
+        self.assertIs(fast, next(completed))
+        event.set()
+        self.assertIs(slow, next(completed))
+
+    def test_result_timeout(self):
+        ran = []
+        # Never picked up by a worker.
+        task = Task(self.scheduler, COMMAND, ran.append, (1,), {})
+        # A deadline doesn't run the task inline, it may take longer.
+        self.assertRaises(concurrent.futures.TimeoutError,
+                          task.result, 0.05)
+        self.assertRaises(concurrent.futures.TimeoutError,
+                          task.exception, 0.05)
+        self.assertEqual([], ran)
+        task.result()
+        self.assertEqual([1], ran)
+
+    def test_info(self):
+        self.scheduler.map(COMMAND, time.sleep, [0.01])
+        info = self.scheduler.info()
+        self.assertGreaterEqual(info['workers'], 1)
+        stats = info['kinds'][COMMAND]
+        self.assertGreaterEqual(stats['completed'], 1)
+        self.assertGreater(stats['avg_run_time'], 0)
+        self.assertEqual(self.scheduler.limits[COMMAND], stats['limit'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,6 +31,7 @@ from mongo_orchestration.common import (
     connected, DEFAULT_SUBJECT, DEFAULT_CLIENT_CERT)
 from mongo_orchestration.servers import Server, Servers
 from mongo_orchestration.process import PortPool
+from mongo_orchestration.versions import BinaryVersions, binary_key
 from tests import (
     SkipTest, certificate, unittest, TEST_SUBJECT, SSLTestCase, SERVER_VERSION,
     TEST_RELEASES)
@@ -74,6 +75,131 @@ build environment:
 """, "3.3.10")
 
 
+class BinaryVersionsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.versions = BinaryVersions()
+        self.mongod = os.path.join(Servers().bin_path(), 'mongod')
+        self.cache_file = tempfile.mktemp(prefix='mongo-versions-')
+
+    def tearDown(self):
+        self.versions.cache_file = None
+        if os.path.exists(self.cache_file):
+            os.remove(self.cache_file)
+
+    def test_version_cached(self):
+        version = self.versions.version(self.mongod)
+        self.assertEqual(SERVER_VERSION[:2], version[:2])
+        self.assertIn(binary_key(self.mongod), self.versions._versions)
+        self.assertEqual(version, Server(self.mongod, {}).version)
+
+    def test_persisted(self):
+        self.versions.clear()
+        self.versions.load(self.cache_file)
+        version = self.versions.version(self.mongod)
+        self.versions.clear()
+        self.versions.load(self.cache_file)
+        self.assertEqual(
+            version, self.versions._versions[binary_key(self.mongod)])
+
+    def test_prefetch(self):
+        self.versions.clear()
+        self.versions.prefetch(Servers().releases)
+        self.assertIn(binary_key(self.mongod), self.versions._versions)
+
+
+class FakeClient(object):
+    is_primary = True
+    is_mongos = False
+
+    def __init__(self):
+        self.calls = 0
+        self.down = False
+        self.hook = None
+
+    def server_info(self):
+        if self.hook is not None:
+            self.hook()
+        if self.down:
+            raise pymongo.errors.AutoReconnect('down')
+        self.calls += 1
+        return {'version': '7.0.0'}
+
+
+class CachedInfoServer(Server):
+    connection = property(lambda self: self.client)
+
+
+class ServerInfoCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = CachedInfoServer.__new__(CachedInfoServer)
+        self.server.__dict__.update(
+            name='mongod', cfg={'port': 1}, config_path=None, login='',
+            hostname='localhost:1', pid=1, proc=None, client=FakeClient())
+        self.server._init_info_cache()
+
+    def test_cached(self):
+        first = self.server.info()
+        self.assertEqual('7.0.0', first['serverInfo']['version'])
+        self.assertEqual({'primary': True, 'mongos': False},
+                         first['statuses'])
+        self.assertEqual(0, first['infoAge']['statuses'])
+        self.server.info()
+        self.assertEqual(1, self.server.client.calls)
+
+    def test_statuses_expire(self):
+        self.server.info_ttl = 0
+        self.server.info()
+        self.server.client.is_primary = False
+        self.assertFalse(self.server.info()['statuses']['primary'])
+        # The buildinfo lives as long as the process.
+        self.assertEqual(1, self.server.client.calls)
+
+    def test_new_process(self):
+        self.server.info()
+        self.server.pid = 2
+        self.server.info()
+        self.assertEqual(2, self.server.client.calls)
+
+    def test_invalidate(self):
+        self.server.info()
+        self.server.invalidate_info()
+        self.server.info()
+        self.assertEqual(2, self.server.client.calls)
+
+    def test_down(self):
+        self.server.client.down = True
+        info = self.server.info()
+        self.assertEqual({}, info['serverInfo'])
+        self.assertEqual('', info['mongodb_uri'])
+        self.server.client.down = False
+        self.server.invalidate_info()
+        self.assertTrue(self.server.info()['serverInfo'])
+
+    def test_unlocked_read(self):
+        locked = []
+
+        def hook():
+            # Another info() may use the cache while the server is read.
+            acquired = self.server._info_lock.acquire(False)
+            if acquired:
+                self.server._info_lock.release()
+            locked.append(not acquired)
+
+        self.server.client.hook = hook
+        self.server.info()
+        self.assertEqual([False], locked)
+
+    def test_invalidated_while_read(self):
+        self.server.client.hook = self.server.invalidate_info
+        self.assertEqual('7.0.0', self.server.info()['serverInfo']['version'])
+        # The read started before invalidate_info(), it isn't cached.
+        self.server.client.hook = None
+        self.server.info()
+        self.assertEqual(2, self.server.client.calls)
+
+
 class ServersTestCase(unittest.TestCase):
     def setUp(self):
         PortPool().change_range()
@@ -578,5 +704,30 @@ class ServerAuthTestCase(unittest.TestCase):
         self.assertTrue(isinstance(db.foo.find_one(), dict))
         c.close()
 
+
+class ServerAuthBootstrapTestCase(ServerAuthTestCase):
+    def setUp(self):
+        Server.mongod_default['nojournal'] = True
+        PortPool().change_range()
+        self.mongod = os.path.join(os.environ.get('MONGOBIN', ''), 'mongod')
+        self.server = Server(self.mongod, {}, auth_key='secret', login='admin',
+                             password='admin', auth_bootstrap=True)
+        self.server.start()
+
+    def test_single_start(self):
+        self.assertTrue(self.server.auth_bootstrap)
+        self.assertFalse(self.server.restart_required)
+        self.assertTrue(self.server.cfg['auth'])
+        self.assertIn('keyFile', self.server.cfg)
+
+    def test_x509_fallback(self):
+        server = Server(
+            self.mongod,
+            {'setParameter': {'authenticationMechanisms': 'MONGODB-X509'}},
+            login='admin', auth_bootstrap=True)
+        self.assertFalse(server.auth_bootstrap)
+        self.assertNotIn('auth', server.cfg)
+        server.cleanup()
+
 if __name__ == '__main__':
     unittest.main()
@@ -19,6 +19,7 @@ import operator
 import pymongo
 from pymongo.server_api import ServerApi
 import sys
+import threading
 import time
 
 sys.path.insert(0, '../')
@@ -29,6 +30,7 @@ from mongo_orchestration.sharded_clusters import ShardedCluster, ShardedClusters
 from mongo_orchestration.replica_sets import ReplicaSets
 from mongo_orchestration.servers import Servers
 from mongo_orchestration.process import PortPool
+from mongo_orchestration.scheduler import Scheduler, Task
 from tests import (
     certificate, unittest, SkipTest,
     HOSTNAME, TEST_SUBJECT, SERVER_VERSION, SSLTestCase)
@@ -46,6 +48,47 @@ def create_shard(i=0):
     }
 
 
+class ShardAbortTestCase(unittest.TestCase):
+
+    def test_abort_removes_started_shards(self):
+        cluster = ShardedCluster.__new__(ShardedCluster)
+        cluster.id = 'aborted'
+        cluster._shards = {}
+        cluster._routers = []
+        cluster._configsvrs = []
+        cleaned = []
+        cluster.cleanup = lambda: cleaned.append(dict(cluster._shards))
+        started = threading.Event()
+        finish = threading.Event()
+        ran = []
+
+        def slow():
+            started.set()
+            finish.wait(10)
+            return 'uri', {'isServer': True, '_id': 'slow'}
+
+        def fail():
+            raise RuntimeError('boom')
+
+        done = Scheduler().submit(
+            None, lambda: ('uri', {'isReplicaSet': True, '_id': 'done'}))
+        done.result()
+        running = Scheduler().submit(None, slow)
+        self.assertTrue(started.wait(10))
+        # Never picked up by a worker.
+        pending = Task(Scheduler(), None, ran.append, (1,), {})
+        failed = Scheduler().submit(None, fail)
+        threading.Timer(0.1, finish.set).start()
+        cluster._ShardedCluster__abort(
+            {done: 'sh-done', running: 'sh-slow', pending: 'sh-pending',
+             failed: 'sh-failed'}, [])
+        self.assertEqual(
+            [{'sh-done': {'isReplicaSet': True, '_id': 'done'},
+              'sh-slow': {'isServer': True, '_id': 'slow'}}], cleaned)
+        self.assertTrue(pending.cancelled())
+        self.assertEqual([], ran)
+
+
 class ShardsTestCase(unittest.TestCase):
     def setUp(self):
         self.sh = ShardedClusters()
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration import startup
+from mongo_orchestration.startup import LogTail, StartupMonitor
+from tests import unittest
+
+
+def log_line(log_id, msg, severity='I'):
+    return json.dumps({'s': severity, 'c': 'NETWORK', 'id': log_id,
+                       'msg': msg}) + '\n'
+
+
+class FakeProcess(object):
+
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+class StartupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.logpath = os.path.join(self.directory, 'mongod.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data):
+        with open(self.logpath, 'a') as fd:
+            fd.write(data)
+
+    def test_log_tail(self):
+        self.write('old line\n')
+        tail = LogTail(self.logpath)
+        self.assertEqual([], tail.read_lines())
+        self.write('new line\npartial')
+        self.assertEqual(['new line'], tail.read_lines())
+        self.write(' line\n')
+        self.assertEqual(['partial line'], tail.read_lines())
+        # logappend=false moves the old log away.
+        os.rename(self.logpath, self.logpath + '.old')
+        self.write('first\n')
+        self.assertEqual(['first'], tail.read_lines())
+
+    def test_states(self):
+        monitor = StartupMonitor(self.logpath)
+        self.assertEqual(startup.SPAWNED, monitor.state)
+        monitor.feed(log_line(startup.LISTENING_ID, 'Listening on'))
+        self.assertEqual(startup.LISTENING, monitor.state)
+        monitor.feed(log_line(startup.READY_ID, 'Waiting for connections'))
+        self.assertEqual(startup.READY, monitor.state)
+
+    def test_text_log(self):
+        monitor = StartupMonitor(self.logpath)
+        monitor.feed('[initandlisten] waiting for connections on port 1025')
+        self.assertEqual(startup.READY, monitor.state)
+
+    def test_address_in_use(self):
+        monitor = StartupMonitor(self.logpath)
+        monitor.feed(json.dumps({
+            's': 'E', 'id': 23024, 'msg': 'Failed to set up listener',
+            'attr': {'error': {'errmsg': 'Address already in use'}}}))
+        self.assertEqual(startup.FAILED, monitor.state)
+        self.assertTrue(monitor.address_in_use)
+
+    def test_fatal(self):
+        monitor = StartupMonitor(self.logpath)
+        monitor.feed(log_line(23091, 'Fatal assertion', severity='F'))
+        self.assertEqual(startup.FAILED, monitor.state)
+        self.assertFalse(monitor.address_in_use)
+
+    def test_wait_ready(self):
+        self.write(log_line(startup.READY_ID, 'Waiting for connections'))
+        monitor = StartupMonitor(self.logpath)
+
+        def start():
+            time.sleep(0.2)
+            self.write(log_line(startup.READY_ID, 'Waiting for connections'))
+
+        thread = threading.Thread(target=start)
+        thread.start()
+        t_start = time.time()
+        self.assertEqual(startup.READY, monitor.wait(FakeProcess(), 10))
+        self.assertLess(time.time() - t_start, 5)
+        thread.join()
+
+    def test_wait_exit(self):
+        monitor = StartupMonitor(self.logpath)
+        self.assertEqual(startup.FAILED,
+                         monitor.wait(FakeProcess(startup.EXIT_NET_ERROR), 10))
+        self.assertTrue(monitor.address_in_use)
+
+    def test_wait_timeout(self):
+        monitor = StartupMonitor(self.logpath)
+        self.assertEqual(startup.SPAWNED, monitor.wait(FakeProcess(), 0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
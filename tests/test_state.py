@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, '../')
+
+import mongo_orchestration.process as process
+
+from mongo_orchestration.readiness import wait_until
+from mongo_orchestration.state import StateStore
+from tests import unittest, SkipTest
+
+
+class StateStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mktemp(prefix='mo-state-')
+        self.store = StateStore()
+
+    def tearDown(self):
+        self.store.close()
+        for path in (self.path, self.path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_disabled(self):
+        self.assertFalse(self.store.enabled)
+        self.store.save('servers', 'a', {'pid': 1})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_replay(self):
+        self.assertEqual({}, self.store.open(self.path))
+        self.store.save('servers', 'a', {'pid': 1})
+        self.store.save('servers', 'b', {'pid': 2})
+        self.store.save('servers', 'a', {'pid': 3})
+        self.store.delete('servers', 'b')
+        self.store.save('rs', 'rs1', {'server_map': {'0': 'localhost:1'}})
+        self.store.close()
+        self.assertEqual({'servers': {'a': {'pid': 3}},
+                          'rs': {'rs1': {'server_map': {'0': 'localhost:1'}}}},
+                         self.store.open(self.path))
+
+    def test_compact(self):
+        self.store.open(self.path)
+        for pid in range(10):
+            self.store.save('servers', 'a', {'pid': pid})
+        self.store.close()
+        self.store.open(self.path)
+        with open(self.path) as fd:
+            self.assertEqual(1, len(fd.readlines()))
+
+    def test_corrupt_line(self):
+        self.store.open(self.path)
+        self.store.save('servers', 'a', {'pid': 1})
+        self.store.close()
+        with open(self.path, 'a') as fd:
+            fd.write('{"kind": "servers", "id"')
+        self.assertEqual({'servers': {'a': {'pid': 1}}},
+                         self.store.open(self.path))
+
+
+class AdoptedProcessTestCase(unittest.TestCase):
+
+    def setUp(self):
+        if platform.system() == 'Windows':
+            raise SkipTest("processes can't be adopted on Windows")
+        self.config_path = tempfile.mktemp(prefix='mongo-')
+        self.proc = subprocess.Popen(
+            [sys.executable, '-c', 'import time; time.sleep(60)',
+             self.config_path])
+        # Wait for exec() to replace the command line of the child.
+        wait_until(lambda: self.config_path in (
+            process.proc_cmdline(self.proc.pid) or [])
+            or not os.path.exists('/proc/self'), 10)
+
+    def tearDown(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+    def test_pid_matches(self):
+        self.assertTrue(process.pid_matches(self.proc.pid, self.config_path))
+        if os.path.exists('/proc/self'):
+            self.assertFalse(
+                process.pid_matches(self.proc.pid, self.config_path + 'x'))
+
+    def test_terminate(self):
+        adopted = process.AdoptedProcess(self.proc.pid)
+        self.assertTrue(process.proc_alive(adopted))
+        adopted.terminate()
+        # Reap our own child so that the pid goes away.
+        self.proc.wait()
+        self.assertEqual(0, adopted.wait(5))
+        self.assertFalse(process.proc_alive(adopted))
+        self.assertFalse(process.pid_matches(self.proc.pid, self.config_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
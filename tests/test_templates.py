@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import os
+import shutil
+import sys
+import tempfile
+
+import bson
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.process import PortPool
+from mongo_orchestration.replica_sets import ReplicaSet
+from mongo_orchestration.servers import Servers
+from mongo_orchestration.templates import (
+    DbpathTemplates, clone_replset_config, copy_dbpath, strip_dbpath,
+    templatable)
+from tests import unittest, SkipTest, SERVER_VERSION, TEST_RELEASES
+
+
+class TemplateHelpersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.src = tempfile.mkdtemp()
+        self.dst = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.src)
+        shutil.rmtree(self.dst)
+
+    def test_templatable(self):
+        self.assertTrue(templatable({'members': [{}, {}]}))
+        self.assertFalse(templatable({'members': []}))
+        self.assertFalse(templatable({'members': [{}], 'login': 'luke'}))
+        self.assertFalse(templatable({'members': [{}], 'auth_key': 'key'}))
+        self.assertFalse(templatable(
+            {'members': [{'procParams': {'port': 1234}}]}))
+        self.assertFalse(templatable(
+            {'members': [{'procParams': {'storageEngine': 'inMemory'}}]}))
+
+    def test_copy_and_strip(self):
+        os.makedirs(os.path.join(self.src, 'journal'))
+        for name in ('collection-0.wt', 'mongod.lock', 'mongod.log',
+                     os.path.join('journal', 'WiredTigerLog.1')):
+            with open(os.path.join(self.src, name), 'w') as fd:
+                fd.write(name)
+        copy_dbpath(self.src, self.dst)
+        strip_dbpath(self.dst)
+        self.assertEqual(['collection-0.wt', 'journal'],
+                         sorted(os.listdir(self.dst)))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.dst, 'journal', 'WiredTigerLog.1')))
+
+    def test_clone_replset_config(self):
+        replica_set_id = bson.ObjectId()
+        old_config = {
+            '_id': 'template', 'version': 1,
+            'members': [{'_id': 0, 'host': 'localhost:1', 'priority': 2},
+                        {'_id': 1, 'host': 'localhost:2'}],
+            'settings': {'replicaSetId': replica_set_id,
+                         'electionTimeoutMillis': 100}}
+        members = [{'_id': 0, 'host': 'localhost:3'},
+                   {'_id': 1, 'host': 'localhost:4'}]
+        first = clone_replset_config(old_config, 'rs1', members)
+        second = clone_replset_config(old_config, 'rs2', members)
+        self.assertEqual('rs1', first['_id'])
+        self.assertEqual(
+            [{'_id': 0, 'host': 'localhost:3', 'priority': 2},
+             {'_id': 1, 'host': 'localhost:4'}], first['members'])
+        self.assertEqual(100, first['settings']['electionTimeoutMillis'])
+        ids = set([replica_set_id, first['settings']['replicaSetId'],
+                   second['settings']['replicaSetId']])
+        self.assertEqual(3, len(ids))
+        # The template's config is left untouched.
+        self.assertEqual(replica_set_id,
+                         old_config['settings']['replicaSetId'])
+        self.assertEqual('localhost:1', old_config['members'][0]['host'])
+
+    def test_key(self):
+        templates = DbpathTemplates()
+        params = {'members': [{}, {'rsParams': {'arbiterOnly': True}}]}
+        key = templates.key('mongod', params)
+        self.assertEqual(key, templates.key('mongod', params))
+        self.assertNotEqual(key, templates.key('mongod', {'members': [{}, {}]}))
+        sized = {'members': [{'procParams': {'wiredTigerCacheSizeGB': 1.5}},
+                             {'rsParams': {'arbiterOnly': True}}]}
+        self.assertEqual(key, templates.key('mongod', sized))
+
+
+class TemplateCloneTestCase(unittest.TestCase):
+
+    def setUp(self):
+        if SERVER_VERSION < DbpathTemplates.min_version:
+            raise SkipTest("dbpath templates need MongoDB >= 4.0")
+        PortPool().change_range()
+        Servers().set_settings(*TEST_RELEASES)
+        self.directory = tempfile.mkdtemp()
+        DbpathTemplates().enable(self.directory)
+        self.repls = []
+
+    def tearDown(self):
+        DbpathTemplates().directory = None
+        for repl in self.repls:
+            repl.cleanup()
+        shutil.rmtree(self.directory)
+
+    def test_clone(self):
+        cfg = {'members': [{}, {}, {'rsParams': {'arbiterOnly': True}}]}
+        self.repls.append(ReplicaSet(copy.deepcopy(cfg)))
+        # The first replica set captured a template.
+        self.assertEqual(1, len(os.listdir(self.directory)))
+        repl = ReplicaSet(copy.deepcopy(cfg))
+        self.repls.append(repl)
+        config = repl.run_command('replSetGetConfig')['config']
+        self.assertEqual(repl.repl_id, config['_id'])
+        self.assertEqual(sorted(repl.server_map.values()),
+                         sorted(m['host'] for m in config['members']))
+        self.assertTrue(repl.primary())
+        self.assertEqual(1, len(repl.arbiters()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+import time
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.readiness import TopologyListener
+from mongo_orchestration.topology import Snapshot, SnapshotCache
+from tests import unittest
+
+STATUS = {'members': [{'_id': 0, 'name': 'h:1', 'state': 1},
+                      {'_id': 1, 'name': 'h:2', 'state': 2},
+                      {'_id': 2, 'name': 'h:3', 'state': 7}]}
+CONFIG = {'version': 3, 'term': 1,
+          'members': [{'_id': 0, 'host': 'h:1'}, {'_id': 1, 'host': 'h:2'},
+                      {'_id': 2, 'host': 'h:3', 'arbiterOnly': True}]}
+HELLOS = {'h:1': {'ismaster': True, 'hosts': ['h:1', 'h:2']},
+          'h:2': {'secondary': True}, 'h:3': None}
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def test_views(self):
+        snapshot = Snapshot(1, None, STATUS, CONFIG, HELLOS)
+        self.assertEqual(['h:2'], snapshot.in_state(2))
+        self.assertEqual(['h:1', 'h:2'], snapshot.primary_hello()['hosts'])
+        self.assertEqual({}, snapshot.hello('h:3'))
+        self.assertEqual(3, snapshot.info()['configVersion'])
+
+
+class SnapshotCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sweeps = 0
+        self.listener = TopologyListener()
+        self.cache = SnapshotCache(self.take, self.listener)
+
+    def take(self):
+        self.sweeps += 1
+        time.sleep(0.05)
+        return STATUS, CONFIG, HELLOS
+
+    def test_reuse(self):
+        first = self.cache.get()
+        self.assertIs(first, self.cache.get())
+        self.assertEqual(1, self.sweeps)
+        self.assertEqual(1, self.cache.hits)
+
+    def test_invalidate(self):
+        first = self.cache.get()
+        self.cache.invalidate()
+        second = self.cache.get()
+        self.assertEqual(first.version + 1, second.version)
+
+    def test_topology_change(self):
+        self.cache.get()
+        self.listener.notify()
+        self.cache.get()
+        self.assertEqual(2, self.sweeps)
+
+    def test_ttl(self):
+        self.cache.ttl = 0
+        self.cache.get()
+        self.cache.get()
+        self.assertEqual(2, self.sweeps)
+
+    def test_one_sweep(self):
+        threads = [threading.Thread(target=self.cache.get)
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, self.sweeps)
+
+
+if __name__ == '__main__':
+    unittest.main()
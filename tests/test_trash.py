@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.trash import Trash, trash_dir
+from tests import unittest
+
+
+class TrashTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.trash = Trash()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_dbpath(self, name='db', files=3):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.join(path, 'journal'))
+        for i in range(files):
+            with open(os.path.join(path, 'journal', str(i)), 'wb') as fd:
+                fd.write(b'x' * 1024)
+        return path
+
+    def wait_empty(self, directory, timeout=10):
+        deadline = time.time() + timeout
+        while os.listdir(directory) and time.time() < deadline:
+            time.sleep(0.05)
+        return not os.listdir(directory)
+
+    def test_put(self):
+        path = self.make_dbpath()
+        reclaimed = self.trash.info()['reclaimed_bytes']
+        self.trash.put(path)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(self.wait_empty(trash_dir(path)))
+        self.assertIn(trash_dir(path), self.trash.info()['directories'])
+        self.assertGreaterEqual(
+            self.trash.info()['reclaimed_bytes'] - reclaimed, 3 * 1024)
+
+    def test_put_file(self):
+        path = os.path.join(self.directory, 'file')
+        open(path, 'w').close()
+        self.trash.put(path)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(trash_dir(path)))
+        self.trash.put(None)
+        self.trash.put(path)
+
+    def test_adopt(self):
+        path = self.make_dbpath()
+        directory = trash_dir(path)
+        os.mkdir(directory)
+        os.rename(path, os.path.join(directory, 'left-behind'))
+        self.trash.adopt(directory)
+        self.assertTrue(self.wait_empty(directory))
+
+    def test_throttle(self):
+        path = self.make_dbpath(files=4)
+        directory = trash_dir(path)
+        os.mkdir(directory)
+        os.rename(path, os.path.join(directory, 'db'))
+        self.trash._directories.add(directory)
+        limit = self.trash.max_bytes_per_second
+        self.trash.max_bytes_per_second = 8 * 1024
+        try:
+            t_start = time.time()
+            self.trash.reap()
+            self.assertGreaterEqual(time.time() - t_start, 0.4)
+        finally:
+            self.trash.max_bytes_per_second = limit
+        self.assertEqual([], os.listdir(directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
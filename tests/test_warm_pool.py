@@ -0,0 +1,155 @@
+#!/usr/bin/python
+# coding=utf-8
+# Copyright 2012-2023 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import time
+
+sys.path.insert(0, '../')
+
+from mongo_orchestration.admission import Admission
+from mongo_orchestration.apps import create_sized
+from mongo_orchestration.capacity import Capacity
+from mongo_orchestration.common import preset_merge
+from mongo_orchestration.replica_sets import ReplicaSet, ReplicaSets
+from mongo_orchestration.servers import Servers
+from mongo_orchestration.warm_pool import PresetPool, WarmPool, pool_key
+from tests import unittest
+
+
+class PresetPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.destroyed = []
+        self.pool = PresetPool(object, self.destroyed.append,
+                               min_size=1, max_size=3, idle_timeout=0.1)
+
+    def fill(self):
+        for _ in range(self.pool.builds_needed()):
+            self.pool.put(self.pool.create())
+
+    def test_min_size(self):
+        self.assertEqual(1, self.pool.builds_needed())
+        self.assertEqual(0, self.pool.builds_needed())
+        self.pool.put(object())
+        self.assertEqual({'ready': 1, 'pending': 0},
+                         dict((k, self.pool.info()[k])
+                              for k in ('ready', 'pending')))
+
+    def test_take(self):
+        self.assertIsNone(self.pool.take())
+        self.fill()
+        self.assertIsNotNone(self.pool.take())
+        self.assertEqual(1, self.pool.info()['hits'])
+        self.assertEqual(1, self.pool.info()['misses'])
+
+    def test_grows_under_demand(self):
+        for _ in range(5):
+            self.pool.take()
+        self.assertEqual(3, self.pool.builds_needed())
+
+    def test_evict_idle(self):
+        self.pool.take()
+        self.pool.take()
+        self.fill()
+        self.assertEqual(3, self.pool.info()['ready'])
+        time.sleep(0.2)
+        self.assertEqual(2, len(self.pool.evict_idle()))
+        self.assertEqual(1, self.pool.info()['ready'])
+        self.assertEqual(0, self.pool.builds_needed())
+
+    def test_failed_build(self):
+        self.assertEqual(1, self.pool.builds_needed())
+        self.pool.failed(retry_delay=60)
+        self.assertEqual(0, self.pool.builds_needed())
+
+    def test_drain(self):
+        self.fill()
+        self.assertEqual(1, len(self.pool.drain()))
+        self.assertEqual(0, self.pool.builds_needed())
+
+    def test_pool_key(self):
+        params = preset_merge({'preset': 'basic.json'}, 'replica_sets')
+        self.assertEqual(
+            pool_key('replica_sets', params),
+            pool_key('replica_sets',
+                     preset_merge({'preset': 'basic.json'}, 'replica_sets')))
+        params['members'][0]['procParams']['journal'] = False
+        self.assertNotEqual(
+            pool_key('replica_sets', params),
+            pool_key('replica_sets',
+                     preset_merge({'preset': 'basic.json'}, 'replica_sets')))
+
+    def test_pool_key_after_sizing(self):
+        params = preset_merge({'preset': 'basic.json'}, 'replica_sets')
+        key = pool_key('replica_sets', params)
+        sized = create_sized('replica_sets', lambda p: p, params)
+        self.assertIn('wiredTigerCacheSizeGB',
+                      sized['members'][0]['procParams'])
+        # The request still matches its pool.
+        self.assertEqual(key, pool_key('replica_sets', params))
+
+
+class FakeServer(object):
+
+    def __init__(self, process_group):
+        self.process_group = process_group
+        self.cfg = {'wiredTigerCacheSizeGB': 1}
+        self.is_mongos = False
+
+
+class PooledClusterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        Servers()._storage['pooled-member'] = FakeServer('pooled-rs')
+        ReplicaSets().set_pooled('pooled-rs')
+
+    def tearDown(self):
+        Servers()._storage.pop('pooled-member', None)
+        ReplicaSets()._storage.pop('pooled-rs', None)
+        ReplicaSets().set_pooled('pooled-rs', False)
+        WarmPool().__dict__.pop('_pools', None)
+
+    def counts(self):
+        return (len(Servers().listed()), Capacity().managed()[:2],
+                Admission()._managed())
+
+    def test_hidden_until_claimed(self):
+        self.assertNotIn('pooled-member', Servers().listed())
+        hidden = self.counts()
+        ReplicaSets().set_pooled('pooled-rs', False)
+        self.assertIn('pooled-member', Servers().listed())
+        shown = self.counts()
+        self.assertEqual(hidden[0] + 1, shown[0])
+        self.assertEqual((hidden[1][0] + 1, hidden[1][1] + 1), shown[1])
+        self.assertEqual(hidden[2][0] + 1, shown[2][0])
+
+    def test_claim(self):
+        cluster = ReplicaSet.__new__(ReplicaSet)
+        cluster.repl_id = cluster.process_group = 'pooled-rs'
+        cluster.reset = lambda: None
+        params = {'members': [{}]}
+        pool = PresetPool(None, None)
+        pool.pending = 1
+        pool.put(cluster)
+        WarmPool()._pools = {pool_key('replica_sets', params): pool}
+        self.assertEqual('pooled-rs',
+                         WarmPool().claim('replica_sets', params))
+        self.assertIn('pooled-member', Servers().listed())
+        self.assertIn('pooled-rs', ReplicaSets().listed())
+
+
+if __name__ == '__main__':
+    unittest.main()